@@ -0,0 +1,29 @@
+"""
+Time taken by ``import mazepa`` in a fresh interpreter.
+
+Usage: ``python benchmarks/import_time.py [num_repeats]``
+"""
+import statistics
+import subprocess
+import sys
+
+CODE = "import time; t = time.perf_counter(); import mazepa; print(time.perf_counter() - t)"
+
+
+def measure(num_repeats: int) -> float:
+    results = []
+    for _ in range(num_repeats):
+        output = subprocess.run(
+            [sys.executable, "-c", CODE], capture_output=True, text=True, check=True
+        ).stdout
+        results.append(float(output))
+    return statistics.median(results)
+
+
+def main():
+    num_repeats = int(sys.argv[1]) if len(sys.argv) > 1 else 10
+    print(f"import mazepa: {measure(num_repeats) * 1000:7.1f} ms (median of {num_repeats})")
+
+
+if __name__ == "__main__":
+    main()
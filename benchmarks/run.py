@@ -0,0 +1,408 @@
+"""
+Benchmark suite for the executor, execution state, serialization and queues.
+
+Every benchmark processes a number of items, such as tasks or messages, scaled by
+``--scale``, and reports the best time over ``--repeats`` runs. Results can be saved
+as JSON and compared against a previously saved baseline, in which case benchmarks
+that became slower per item by more than ``--threshold`` are flagged and the script
+exits with a non-zero status.
+
+Usage::
+
+    python benchmarks/run.py --output baseline.json
+    python benchmarks/run.py --compare baseline.json --output new.json
+    python benchmarks/run.py --scale 0.01 --only wide deep
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+# pylint: disable=wrong-import-position,import-outside-toplevel
+import import_time
+import task_memory
+import typecheck_overhead
+
+import mazepa
+from mazepa import (
+    Dependency,
+    ExecutionMultiQueue,
+    LocalExecutionQueue,
+    TaskExecutionEnv,
+    TaskOutcome,
+    TaskStatus,
+    execute,
+    flow_type,
+    serialization,
+    task_factory,
+)
+
+# Number of items processed by every benchmark at ``--scale 1``
+BASE_SIZES = {
+    "wide": 1000000,
+    "deep": 10000,
+    "barrier": 10000,
+    "multi_queue": 200000,
+    "typecheck_overhead": 100000,
+    "make_tasks": 1000000,
+    "serialization": 20000,
+    "outcome_reports": 100000,
+    "sqs": 2000,
+    "sqs_outcomes": 2000,
+    "import_time": 1,
+}
+
+NUM_QUEUES = 4
+BARRIER_WIDTH = 10
+
+
+@task_factory
+def dummy_task(x: int) -> int:
+    return x
+
+
+@flow_type
+def wide_flow(num_tasks: int):
+    yield (dummy_task.make_task(x=i) for i in range(num_tasks))
+
+
+@flow_type
+def deep_flow(depth: int):
+    if depth > 1:
+        yield deep_flow(depth - 1)
+        yield Dependency()
+    yield dummy_task.make_task(x=depth)
+
+
+@flow_type
+def barrier_flow(num_tasks: int):
+    for i in range(0, num_tasks, BARRIER_WIDTH):
+        yield dummy_task.map(x=range(i, min(i + BARRIER_WIDTH, num_tasks)))
+        yield Dependency()
+
+
+@flow_type
+def multi_queue_flow(num_tasks: int):
+    yield dummy_task.map(x=range(num_tasks))
+
+
+def _time_execute(target: Any, **kwargs) -> float:
+    time_start = time.perf_counter()
+    execute(target, batch_gap_sleep_sec=0, **kwargs)
+    return time.perf_counter() - time_start
+
+
+def bench_wide(num_items: int) -> Dict[str, float]:
+    return {"secs": _time_execute(wide_flow(num_items))}
+
+
+def bench_deep(num_items: int) -> Dict[str, float]:
+    return {"secs": _time_execute(deep_flow(num_items))}
+
+
+def bench_barrier(num_items: int) -> Dict[str, float]:
+    return {"secs": _time_execute(barrier_flow(num_items))}
+
+
+def bench_multi_queue(num_items: int) -> Dict[str, float]:
+    queue = ExecutionMultiQueue(
+        [LocalExecutionQueue(name=f"local_q{i}") for i in range(NUM_QUEUES)]
+    )
+    # Environments of top level flows are applied to all tasks they yield
+    flows = [multi_queue_flow(num_items // NUM_QUEUES) for _ in range(NUM_QUEUES)]
+    for i, flow in enumerate(flows):
+        flow.task_execution_env = TaskExecutionEnv(tags={f"q{i}"})
+    return {"secs": _time_execute(flows, exec_queue=queue)}
+
+
+def bench_typecheck_overhead(num_items: int) -> Dict[str, float]:
+    debug = mazepa.is_debug()
+    try:
+        return {"secs": typecheck_overhead.measure(True, num_items)}
+    finally:
+        mazepa.configure(debug=debug)
+
+
+def bench_make_tasks(num_items: int) -> Dict[str, float]:
+    mem_bytes, elapsed, state_elapsed = task_memory.measure(
+        lambda n: dummy_task.map(x=range(n)), num_items
+    )
+    return {
+        "secs": elapsed,
+        "bytes_per_item": mem_bytes / num_items,
+        "state_secs": state_elapsed,
+    }
+
+
+def bench_serialization(num_items: int) -> Dict[str, float]:
+    tasks = dummy_task.map(x=range(num_items))
+    time_start = time.perf_counter()
+    sers = [serialization.serialize(e) for e in tasks]
+    ser_elapsed = time.perf_counter() - time_start
+    for e in sers:
+        serialization.deserialize(e)
+    return {
+        "secs": time.perf_counter() - time_start,
+        "serialize_secs": ser_elapsed,
+        "bytes_per_item": sum(len(e) for e in sers) / num_items,
+    }
+
+
+def bench_outcome_reports(num_items: int) -> Dict[str, float]:
+    """
+    Encode and decode reports of successful tasks, as sent by workers to executors.
+    """
+    from mazepa.remote_execution_queues.outcome_codec import (
+        OutcomeReport,
+        decode_outcome_reports,
+        encode_outcome_reports,
+    )
+
+    reports = [
+        OutcomeReport(
+            task_id=e.id_,
+            outcome=TaskOutcome(status=TaskStatus.SUCCEEDED, execution_secs=1.0),
+        )
+        for e in dummy_task.map(x=range(num_items))
+    ]
+    time_start = time.perf_counter()
+    bodies = [encode_outcome_reports([e]) for e in reports]
+    encode_elapsed = time.perf_counter() - time_start
+    for e in bodies:
+        decode_outcome_reports(e)
+    return {
+        "secs": time.perf_counter() - time_start,
+        "encode_secs": encode_elapsed,
+        "bytes_per_item": sum(len(e) for e in bodies) / num_items,
+    }
+
+
+def bench_sqs(num_items: int) -> Dict[str, float]:
+    """
+    Push, pull, execute and report outcomes of tasks through moto-backed SQS queues.
+    """
+    import boto3  # type: ignore
+    from moto import mock_sqs  # type: ignore
+
+    from mazepa import SQSExecutionQueue
+
+    with mock_sqs():
+        os.environ.setdefault("AWS_ACCESS_KEY_ID", "testing")
+        os.environ.setdefault("AWS_SECRET_ACCESS_KEY", "testing")
+        sqs = boto3.client("sqs", region_name="us-east-1")
+        sqs.create_queue(QueueName="work-queue")
+        sqs.create_queue(QueueName="outcome-queue")
+        queue = SQSExecutionQueue(
+            name="work-queue", region_name="us-east-1", outcome_queue_name="outcome-queue"
+        )
+        tasks = dummy_task.map(x=range(num_items))
+        time_start = time.perf_counter()
+        queue.push_tasks(tasks)
+        push_elapsed = time.perf_counter() - time_start
+        num_pulled = 0
+        while num_pulled < num_items:
+            pulled_tasks = queue.pull_tasks(max_num=num_items)
+            for e in pulled_tasks:
+                e()
+            num_pulled += sum(len(getattr(e, "tasks", [e])) for e in pulled_tasks)
+        num_outcomes = 0
+        while num_outcomes < num_items:
+            num_outcomes += len(queue.pull_task_outcomes(max_num=num_items))
+        return {"secs": time.perf_counter() - time_start, "push_secs": push_elapsed}
+
+
+def bench_sqs_outcomes(num_items: int) -> Dict[str, float]:
+    """
+    Pull outcome reports of bundles with return values from a moto-backed SQS queue,
+    decoding on the executor thread (``secs``), and with the next receive overlapped
+    and decoding spread over one process per core (``parallel_secs``).
+    """
+    import boto3
+    from moto import mock_sqs
+
+    from mazepa import SQSExecutionQueue
+    from mazepa.remote_execution_queues.outcome_codec import (
+        OutcomeReport,
+        encode_outcome_reports,
+    )
+
+    bundle_len = 10
+    return_value = {f"key_{i}": [float(i)] * 10 for i in range(100)}
+    bodies = [
+        encode_outcome_reports(
+            [
+                OutcomeReport(
+                    task_id=e.id_,
+                    outcome=TaskOutcome(
+                        status=TaskStatus.SUCCEEDED, execution_secs=1.0, return_value=return_value
+                    ),
+                )
+                for e in dummy_task.map(x=range(bundle_len))
+            ]
+        )
+        for _ in range(num_items)
+    ]
+    num_processes = os.cpu_count() or 1
+
+    def _time_pull(**kwargs) -> float:
+        sqs = boto3.client("sqs", region_name="us-east-1")
+        sqs.create_queue(QueueName="outcome-queue")
+        queue_url = sqs.get_queue_url(QueueName="outcome-queue")["QueueUrl"]
+        for i in range(0, len(bodies), 10):
+            sqs.send_message_batch(
+                QueueUrl=queue_url,
+                Entries=[
+                    {"Id": str(j), "MessageBody": e} for j, e in enumerate(bodies[i : i + 10])
+                ],
+            )
+        queue = SQSExecutionQueue(
+            name="outcome-queue",
+            region_name="us-east-1",
+            outcome_queue_name="outcome-queue",
+            **kwargs,
+        )
+        time_start = time.perf_counter()
+        num_outcomes = 0
+        while num_outcomes < num_items * bundle_len:
+            num_outcomes += len(queue.pull_task_outcomes(max_num=1000, max_time_sec=0.5))
+        elapsed = time.perf_counter() - time_start
+        queue.close()
+        sqs.delete_queue(QueueUrl=queue_url)
+        return elapsed
+
+    with mock_sqs():
+        os.environ.setdefault("AWS_ACCESS_KEY_ID", "testing")
+        os.environ.setdefault("AWS_SECRET_ACCESS_KEY", "testing")
+        serial_elapsed = _time_pull()
+        parallel_elapsed = _time_pull(
+            outcome_decode_processes=num_processes, prefetch_outcomes=True
+        )
+    return {
+        "secs": serial_elapsed,
+        "parallel_secs": parallel_elapsed,
+        "num_processes": num_processes,
+        "speedup": serial_elapsed / parallel_elapsed,
+    }
+
+
+def bench_import_time(num_items: int) -> Dict[str, float]:  # pylint: disable=unused-argument
+    return {"secs": import_time.measure(5)}
+
+
+BENCHMARKS: Dict[str, Callable[[int], Dict[str, float]]] = {
+    "wide": bench_wide,
+    "deep": bench_deep,
+    "barrier": bench_barrier,
+    "multi_queue": bench_multi_queue,
+    "typecheck_overhead": bench_typecheck_overhead,
+    "make_tasks": bench_make_tasks,
+    "serialization": bench_serialization,
+    "outcome_reports": bench_outcome_reports,
+    "sqs": bench_sqs,
+    "sqs_outcomes": bench_sqs_outcomes,
+    "import_time": bench_import_time,
+}
+
+
+def run_benchmark(name: str, scale: float, repeats: int) -> Dict[str, float]:
+    num_items = max(1, int(BASE_SIZES[name] * scale))
+    if name == "import_time":
+        num_items = 1
+    runs = [BENCHMARKS[name](num_items) for _ in range(repeats)]
+    result = dict(min(runs, key=lambda e: e["secs"]))
+    result["items"] = num_items
+    result["items_per_sec"] = num_items / result["secs"]
+    return result
+
+
+def compare(
+    results: Dict[str, Dict[str, float]],
+    baseline: Dict[str, Dict[str, float]],
+    threshold: float,
+) -> Iterator[Tuple[str, float, bool]]:
+    """
+    Yields ``(name, slowdown, is_regression)`` for benchmarks present in both results,
+    where ``slowdown`` is the ratio of per item times of ``results`` and ``baseline``.
+    """
+    for name, result in results.items():
+        if name in baseline:
+            slowdown = (result["secs"] / result["items"]) / (
+                baseline[name]["secs"] / baseline[name]["items"]
+            )
+            yield name, slowdown, slowdown > 1 + threshold
+
+
+def _get_git_revision() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True,
+            text=True,
+            check=True,
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n", maxsplit=1)[0])
+    parser.add_argument("--only", nargs="+", choices=list(BENCHMARKS), default=list(BENCHMARKS))
+    parser.add_argument("--scale", type=float, default=1.0)
+    parser.add_argument("--repeats", type=int, default=1)
+    parser.add_argument("--output", help="path to save results JSON to")
+    parser.add_argument("--compare", help="path to baseline results JSON")
+    parser.add_argument("--threshold", type=float, default=0.1)
+    parser.add_argument(
+        "--debug", action="store_true", help="keep typeguard runtime checks enabled"
+    )
+    args = parser.parse_args(argv)
+
+    mazepa.configure(debug=args.debug)
+    results = {}  # type: Dict[str, Dict[str, Any]]
+    for name in args.only:
+        results[name] = run_benchmark(name, args.scale, args.repeats)
+        print(
+            f"{name:>20}: {results[name]['secs']:9.3f} sec, "
+            f"{results[name]['items_per_sec']:12.0f} items/sec ({results[name]['items']} items)"
+        )
+
+    if args.output is not None:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(
+                {
+                    "meta": {
+                        "git_revision": _get_git_revision(),
+                        "python": platform.python_version(),
+                        "platform": platform.platform(),
+                        "scale": args.scale,
+                        "debug": args.debug,
+                    },
+                    "results": results,
+                },
+                f,
+                indent=2,
+            )
+
+    num_regressions = 0
+    if args.compare is not None:
+        with open(args.compare, encoding="utf-8") as f:
+            baseline = json.load(f)["results"]
+        print(f"\nComparison with {args.compare} (threshold {args.threshold:.0%}):")
+        for name, slowdown, is_regression in compare(results, baseline, args.threshold):
+            num_regressions += is_regression
+            flag = "  SLOWER" if is_regression else ""
+            print(f"{name:>20}: {slowdown:6.2f}x time per item{flag}")
+    return 1 if num_regressions > 0 else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,62 @@
+"""
+Memory footprint and construction throughput of mazepa tasks.
+
+Usage: ``python benchmarks/task_memory.py [num_tasks]``
+"""
+import sys
+import time
+import tracemalloc
+
+from mazepa import task_factory, InMemoryExecutionState, flow_type
+
+
+@task_factory
+def dummy_task(x: int) -> int:  # pragma: no cover
+    return x
+
+
+@flow_type
+def dummy_flow(tasks):  # pragma: no cover
+    yield tasks
+
+
+def measure(make_tasks, num_tasks):
+    """
+    Returns total traced memory of ``num_tasks`` tasks, seconds taken to create them,
+    and seconds taken to batch them through an execution state.
+    """
+    tracemalloc.start()
+    tasks = make_tasks(num_tasks)
+    mem_bytes, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del tasks
+
+    time_start = time.perf_counter()
+    tasks = make_tasks(num_tasks)
+    elapsed = time.perf_counter() - time_start
+
+    # Push tasks through the execution state to include its bookkeeping
+    state = InMemoryExecutionState([dummy_flow(tasks)])
+    time_start = time.perf_counter()
+    state.get_task_batch(max_batch_len=num_tasks)
+    state_elapsed = time.perf_counter() - time_start
+    return mem_bytes, elapsed, state_elapsed
+
+
+def report(name, make_tasks, num_tasks):
+    mem_bytes, elapsed, state_elapsed = measure(make_tasks, num_tasks)
+    print(
+        f"{name:>12}: {mem_bytes / num_tasks:8.1f} bytes/task, "
+        f"{num_tasks / elapsed:10.0f} tasks/sec created, "
+        f"{num_tasks / state_elapsed:10.0f} tasks/sec batched"
+    )
+
+
+def main():
+    num_tasks = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    report("make_task", lambda n: [dummy_task.make_task(x=i) for i in range(n)], num_tasks)
+    report("make_tasks", lambda n: dummy_task.map(x=range(n)), num_tasks)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,43 @@
+"""
+Executor overhead with and without ``typeguard`` runtime checks.
+
+Usage: ``python benchmarks/typecheck_overhead.py [num_tasks]``
+"""
+import sys
+import time
+
+import mazepa
+from mazepa import task_factory, flow_type, execute
+
+
+@task_factory
+def dummy_task(x: int) -> int:  # pragma: no cover
+    return x
+
+
+@flow_type
+def dummy_flow(num_tasks: int):  # pragma: no cover
+    yield dummy_task.map(x=range(num_tasks))
+
+
+def measure(debug: bool, num_tasks: int) -> float:
+    mazepa.configure(debug=debug)
+    time_start = time.perf_counter()
+    execute(dummy_flow(num_tasks), max_batch_len=10000)
+    return time.perf_counter() - time_start
+
+
+def main():
+    num_tasks = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    # Warm up imports and caches
+    measure(True, 1000)
+    for debug in (True, False):
+        elapsed = measure(debug, num_tasks)
+        print(
+            f"debug={str(debug):>5}: {elapsed:7.2f} sec, "
+            f"{num_tasks / elapsed:10.0f} tasks/sec executed"
+        )
+
+
+if __name__ == "__main__":
+    main()
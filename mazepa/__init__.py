@@ -1,12 +1,54 @@
+from typing import TYPE_CHECKING, Any
+import importlib
+
+from .config import configure, is_debug
 from . import serialization
 from .dependency import Dependency
 from .tasks import Task, TaskFactory, task_factory, task_factory_cls
 from .task_outcome import TaskStatus, TaskOutcome
 from .task_execution_env import TaskExecutionEnv
+from .task_bundles import TaskBundle
 from .flows import Flow, FlowType, flow_type, flow_type_cls, FlowFnReturnType
 from .execution_queue import ExecutionQueue, LocalExecutionQueue, ExecutionMultiQueue
+from .duration_estimator import DurationEstimator
 from .execution_state import ExecutionState, InMemoryExecutionState
+from .progress import (
+    ProgressTracker,
+    ProgressSnapshot,
+    StderrProgressReporter,
+    JsonLinesProgressReporter,
+)
+from .autoscaling import WorkerDemandPublisher, get_desired_workers
 from .execute import execute, Executor
-from .remote_execution_queues import SQSExecutionQueue
+from .simulation import SimulatedExecutionQueue, SimulationReport, SampledDurations, simulate
+from . import tracing
+from .resource_cache import ResourceCache, worker_cache
+from .task_isolation import IsolatedTaskRunner, TaskTimeoutError, TaskMemoryLimitError
+from .completion_markers import CompletionMarkers
 from .worker import run_worker
 from .tools import SubflowTask
+
+# Remote execution backends pull in heavy dependencies, such as ``boto3`` and ``taskqueue``,
+# so they are imported on first access.
+_LAZY_ATTRS = {
+    "remote_execution_queues": (".remote_execution_queues", None),
+    "SQSExecutionQueue": (".remote_execution_queues", "SQSExecutionQueue"),
+}
+
+if TYPE_CHECKING:  # pragma: no cover
+    from . import remote_execution_queues
+    from .remote_execution_queues import SQSExecutionQueue
+
+
+def __getattr__(name: str) -> Any:
+    if name not in _LAZY_ATTRS:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    module_name, attr_name = _LAZY_ATTRS[name]
+    module = importlib.import_module(module_name, __name__)
+    result = module if attr_name is None else getattr(module, attr_name)
+    globals()[name] = result
+    return result
+
+
+def __dir__():
+    return sorted(list(globals()) + list(_LAZY_ATTRS))
@@ -0,0 +1,125 @@
+from __future__ import annotations
+
+import http.server
+import json
+import math
+import os
+import threading
+from typing import Any, Callable, Dict, Optional
+
+import attrs
+from zetta_utils.log import get_logger
+
+from .progress import GroupProgress, ProgressSnapshot
+
+logger = get_logger("mazepa")
+
+
+def get_desired_workers(
+    progress: GroupProgress,
+    target_drain_secs: float,
+    default_execution_secs: float,
+    min_workers: int = 0,
+    max_workers: Optional[int] = None,
+) -> int:
+    """
+    Number of workers needed to complete the tasks of ``progress`` that are in flight or
+    pending within ``target_drain_secs``, based on their mean execution time, or on
+    ``default_execution_secs`` before any task of the group completed. The result is
+    never more than the number of these tasks.
+    """
+    execution_secs = progress.mean_execution_secs
+    if execution_secs is None:
+        execution_secs = default_execution_secs
+    num_tasks = progress.in_flight + progress.pending
+    result = min(num_tasks, math.ceil(num_tasks * execution_secs / target_drain_secs))
+    result = max(result, min_workers)
+    if max_workers is not None:
+        result = min(result, max_workers)
+    return result
+
+
+@attrs.mutable
+class WorkerDemandPublisher:  # pylint: disable=too-many-instance-attributes
+    """
+    Progress callback that estimates the desired number of workers for every execution
+    queue and every task execution environment tag, and publishes the estimates for
+    autoscalers. Estimates are passed to ``callback``, written as JSON to ``path``, and
+    served as JSON over HTTP on ``http_port`` of localhost, for whichever of them are set.
+    The HTTP server runs on a daemon thread until ``close`` is called.
+
+    Use with ``execute(progress_callbacks=[publisher], progress_interval_sec=...)``, which
+    closes the publisher at the end of execution.
+    """
+
+    target_drain_secs: float = 300.0
+    default_execution_secs: float = 60.0
+    min_workers: int = 0
+    max_workers: Optional[int] = None
+    callback: Optional[Callable[[Dict[str, Any]], Any]] = None
+    path: Optional[str] = None
+    http_port: Optional[int] = None
+    latest: Dict[str, Any] = attrs.field(init=False, factory=dict)
+    _server: Optional[http.server.ThreadingHTTPServer] = attrs.field(init=False, default=None)
+
+    def __attrs_post_init__(self):
+        if self.http_port is not None:
+            self._server = http.server.ThreadingHTTPServer(
+                ("localhost", self.http_port), _make_handler(self)
+            )
+            threading.Thread(target=self._server.serve_forever, daemon=True).start()
+            logger.info(f"Serving worker demand on http://localhost:{self.http_port}.")
+
+    def get_demand(self, snapshot: ProgressSnapshot) -> Dict[str, Any]:
+        def _get_entry(progress: GroupProgress) -> Dict[str, Any]:
+            return {
+                "in_flight": progress.in_flight,
+                "pending": progress.pending,
+                "mean_execution_secs": progress.mean_execution_secs,
+                "desired_workers": get_desired_workers(
+                    progress,
+                    target_drain_secs=self.target_drain_secs,
+                    default_execution_secs=self.default_execution_secs,
+                    min_workers=self.min_workers,
+                    max_workers=self.max_workers,
+                ),
+            }
+
+        return {
+            "ts": snapshot.ts,
+            "queues": {k: _get_entry(v) for k, v in snapshot.by_queue.items()},
+            "tags": {k: _get_entry(v) for k, v in snapshot.by_tag.items()},
+        }
+
+    def __call__(self, snapshot: ProgressSnapshot):
+        self.latest = self.get_demand(snapshot)
+        if self.callback is not None:
+            self.callback(self.latest)
+        if self.path is not None:
+            # Replace the file atomically so that readers never see partial content
+            tmp_path = f"{self.path}.tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(self.latest, f)
+            os.replace(tmp_path, self.path)
+
+    def close(self):
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+
+def _make_handler(publisher: WorkerDemandPublisher) -> type:
+    class _Handler(http.server.BaseHTTPRequestHandler):
+        def do_GET(self):  # pylint: disable=invalid-name
+            body = json.dumps(publisher.latest).encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):  # pylint: disable=redefined-builtin
+            pass
+
+    return _Handler
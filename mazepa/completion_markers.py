@@ -0,0 +1,50 @@
+from __future__ import annotations
+
+import hashlib
+import os
+import uuid
+from typing import Optional
+
+import attrs
+
+from . import serialization
+from .task_outcome import TaskOutcome, TaskStatus
+
+
+@attrs.frozen
+class CompletionMarkers:
+    """
+    Markers of completed tasks, stored as files in the ``path`` directory, which needs
+    to be shared between workers, e.g. on a network filesystem. A marker holds the
+    outcome of the task, so that a worker that gets a task another worker already
+    completed, e.g. after its lease expired, can report the recorded outcome instead of
+    executing the task again.
+    """
+
+    path: str
+
+    def __attrs_post_init__(self):
+        os.makedirs(self.path, exist_ok=True)
+
+    def _get_marker_path(self, task_id: str) -> str:
+        # Task ids may contain path separators or exceed file name length limits
+        file_name = hashlib.blake2b(task_id.encode(), digest_size=16).hexdigest()
+        return os.path.join(self.path, file_name)
+
+    def get(self, task_id: str) -> Optional[TaskOutcome]:
+        try:
+            with open(self._get_marker_path(task_id), encoding="utf-8") as f:
+                return serialization.deserialize(f.read())
+        except FileNotFoundError:
+            return None
+
+    def set(self, task_id: str, outcome: TaskOutcome):
+        """
+        Record ``outcome`` of the successfully completed task ``task_id``.
+        """
+        assert outcome.status == TaskStatus.SUCCEEDED
+        # Write to a unique temporary file first, so that markers are never partially read
+        tmp_path = f"{self._get_marker_path(task_id)}.{uuid.uuid4().hex}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write(serialization.serialize(outcome))
+        os.replace(tmp_path, self._get_marker_path(task_id))
@@ -0,0 +1,74 @@
+from __future__ import annotations
+
+import os
+from typing import Any, Dict, Optional, Tuple, TypeVar
+
+import attrs
+
+DEBUG_ENV_VAR = "MAZEPA_DEBUG"
+
+T = TypeVar("T", bound=type)
+
+# Classes decorated with ``typechecked``, mapped to their (unchecked, typechecked)
+# attributes once checks were installed, so that checks can be switched without re-importing.
+_TYPECHECKED_CLASSES: Dict[type, Optional[Tuple[Dict[str, Any], Dict[str, Any]]]] = {}
+
+
+@attrs.mutable
+class _Config:
+    debug: bool
+
+
+_config = _Config(
+    debug=os.environ.get(DEBUG_ENV_VAR, "1").strip().lower() not in ("0", "false", "no", "off")
+)
+
+
+def is_debug() -> bool:
+    return _config.debug
+
+
+def configure(debug: bool):
+    """
+    Set global mazepa options.
+
+    :param debug: whether to perform ``typeguard`` runtime type checks in execution
+        states, queues and dependencies. Checks are enabled by default and can be
+        disabled for production runs, where they add considerable overhead on large
+        task batches. The default is taken from the ``MAZEPA_DEBUG`` environment variable.
+    """
+    _config.debug = debug
+    for cls in _TYPECHECKED_CLASSES:
+        _set_checks(cls, debug)
+
+
+def typechecked(cls: T) -> T:
+    """
+    Class decorator that applies ``typeguard.typechecked`` when mazepa is in debug mode.
+    Switching the mode with ``configure`` swaps the methods of decorated classes, so
+    unchecked classes carry no per-call overhead. ``typeguard`` itself is only imported
+    once checks are first installed.
+    """
+    _TYPECHECKED_CLASSES[cls] = None
+    if _config.debug:
+        _set_checks(cls, True)
+    return cls
+
+
+def _set_checks(cls: type, debug: bool):
+    attributes = _TYPECHECKED_CLASSES[cls]
+    if attributes is None:
+        if debug:
+            import typeguard  # pylint: disable=import-outside-toplevel
+
+            unchecked = dict(cls.__dict__)
+            typeguard.typechecked(cls)
+            checked = {k: v for k, v in cls.__dict__.items() if unchecked.get(k) is not v}
+            _TYPECHECKED_CLASSES[cls] = ({k: unchecked[k] for k in checked}, checked)
+    else:
+        _set_attributes(cls, attributes[1] if debug else attributes[0])
+
+
+def _set_attributes(cls: type, attributes: Dict[str, Any]):
+    for k, v in attributes.items():
+        setattr(cls, k, v)
@@ -1,7 +1,7 @@
 from typing import Optional, Iterable
 
 import attrs
-from typeguard import typechecked
+from .config import typechecked
 
 
 @typechecked
@@ -0,0 +1,55 @@
+from __future__ import annotations
+
+import json
+import math
+import os
+from typing import Dict, Optional
+
+import attrs
+from zetta_utils.log import get_logger
+
+from .tasks import Task, get_factory_key
+from .task_outcome import TaskOutcome
+
+logger = get_logger("mazepa")
+
+
+@attrs.mutable
+class DurationEstimator:
+    """
+    Keeps per task factory estimates of task execution time as moving averages of
+    observed ``TaskOutcome.execution_secs``. When ``path`` is given, estimates are loaded
+    from the JSON file at ``path`` if it exists, and written back by ``save``.
+    Tasks of factories without observations are estimated to take ``math.inf`` seconds,
+    so that they are scheduled early and their durations become known.
+    """
+
+    path: Optional[str] = None
+    smoothing: float = 0.2
+    estimates: Dict[str, float] = attrs.field(factory=dict)
+
+    def __attrs_post_init__(self):
+        if self.path is not None and os.path.exists(self.path):
+            with open(self.path, encoding="utf-8") as f:
+                self.estimates.update(json.load(f))
+            logger.debug(f"Loaded {len(self.estimates)} task duration estimates from {self.path}.")
+
+    def observe(self, task: Task, outcome: TaskOutcome):
+        key = get_factory_key(task)
+        if key is None or outcome.execution_secs is None:
+            return
+        if key in self.estimates:
+            self.estimates[key] += self.smoothing * (outcome.execution_secs - self.estimates[key])
+        else:
+            self.estimates[key] = outcome.execution_secs
+
+    def estimate(self, task: Task) -> float:
+        key = get_factory_key(task)
+        if key is None:
+            return math.inf
+        return self.estimates.get(key, math.inf)
+
+    def save(self):
+        if self.path is not None:
+            with open(self.path, "w", encoding="utf-8") as f:
+                json.dump(self.estimates, f, indent=2, sort_keys=True)
@@ -1,6 +1,6 @@
 from __future__ import annotations
 
-from typing import Optional, Iterable, Union, Callable
+from typing import Any, Optional, Iterable, Sequence, Union, Callable
 import time
 import attrs
 from zetta_utils.log import get_logger
@@ -8,6 +8,9 @@ from zetta_utils.log import get_logger
 from .execution_queue import ExecutionQueue, LocalExecutionQueue
 from .flows import Flow
 from .execution_state import ExecutionState, InMemoryExecutionState
+from . import tracing
+from .task_metrics import MetricsSummary
+from .progress import ProgressSnapshot, ProgressTracker
 
 logger = get_logger("mazepa")
 
@@ -19,6 +22,10 @@ class Executor:  # pragma: no cover # single statement, pure delegation
     purge_at_start: bool = False
     max_batch_len: int = 10000
     state_constructor: Callable[..., ExecutionState] = InMemoryExecutionState
+    trace_path: Optional[str] = None
+    collect_metrics: bool = False
+    progress_callbacks: Sequence[Callable[[ProgressSnapshot], Any]] = ()
+    progress_interval_sec: float = 10.0
 
     def __call__(self, target: Union[Flow, Iterable[Flow], ExecutionState]):
         return execute(
@@ -28,6 +35,10 @@ class Executor:  # pragma: no cover # single statement, pure delegation
             purge_at_start=self.purge_at_start,
             max_batch_len=self.max_batch_len,
             state_constructor=self.state_constructor,
+            trace_path=self.trace_path,
+            collect_metrics=self.collect_metrics,
+            progress_callbacks=self.progress_callbacks,
+            progress_interval_sec=self.progress_interval_sec,
         )
 
 
@@ -38,14 +49,83 @@ def execute(
     purge_at_start: bool = False,
     max_batch_len: int = 10000,
     state_constructor: Callable[..., ExecutionState] = InMemoryExecutionState,
+    trace_path: Optional[str] = None,
+    collect_metrics: bool = False,
+    progress_callbacks: Sequence[Callable[[ProgressSnapshot], Any]] = (),
+    progress_interval_sec: float = 10.0,
 ):
     """
     Executes a target until completion using the given execution queue.
     Execution is performed by making an execution state from the target and passing new task
     batches and completed task ids between the state and the execution queue.
+
+    :param trace_path: if given, lifecycle stages of all tasks are traced and written to
+        ``trace_path`` as a Chrome trace JSON.
+    :param collect_metrics: if set, resource usage of every task is collected and a summary
+        table per task factory is logged at the end of execution.
+    :param progress_callbacks: callables that are given a ``ProgressSnapshot`` of tasks
+        submitted, completed and in flight every ``progress_interval_sec`` seconds and at
+        the end of execution, such as ``StderrProgressReporter`` or
+        ``JsonLinesProgressReporter``. Callbacks that have a ``close`` method are closed
+        at the end of execution.
     """
     logger.debug("Mazepa execute invoked.")
 
+    state = _make_state(target, state_constructor)
+    if exec_queue is None:
+        queue = LocalExecutionQueue()  # type: ExecutionQueue
+    else:
+        queue = exec_queue
+
+    if purge_at_start:
+        queue.purge()
+        logger.info(f"Purged queue {queue}.")
+
+    logger.debug(f"STARTING: mazepa execution of {target}.")
+    if trace_path is not None:
+        tracing.start_tracing()
+    metrics_summary = MetricsSummary() if collect_metrics else None
+    progress_tracker = None
+    if len(progress_callbacks) > 0:
+        progress_tracker = ProgressTracker(
+            callbacks=list(progress_callbacks),
+            report_interval_sec=progress_interval_sec,
+            get_pending_tasks=getattr(state, "get_pending_tasks", None),
+            get_flow_id=getattr(state, "get_flow_id", None),
+            get_queue_name=getattr(queue, "get_queue_name", lambda _: queue.name),
+        )
+    try:
+        _execute_loop(
+            state, queue, batch_gap_sleep_sec, max_batch_len, metrics_summary, progress_tracker
+        )
+    finally:
+        if progress_tracker is not None:
+            progress_tracker.maybe_report(force=True)
+        # States and progress callbacks may hold resources such as flow prefetch threads
+        # or the server of ``WorkerDemandPublisher``
+        _close_all(state, *progress_callbacks)
+        if metrics_summary is not None:
+            logger.info(f"Task metrics summary:\n{metrics_summary.format_table()}")
+        if trace_path is not None:
+            tracer = tracing.stop_tracing()
+            assert tracer is not None
+            tracer.export(trace_path)
+            logger.info(f"Wrote execution trace to {trace_path}.")
+
+    logger.debug(f"DONE: mazepa execution of {target}.")
+
+
+def _close_all(*objs: Any):
+    for e in objs:
+        close = getattr(e, "close", None)
+        if close is not None:
+            close()
+
+
+def _make_state(
+    target: Union[Flow, Iterable[Flow], ExecutionState],
+    state_constructor: Callable[..., ExecutionState],
+) -> ExecutionState:
     if isinstance(target, ExecutionState):
         state = target
         logger.debug(f"Given execution state {state}.")
@@ -57,34 +137,56 @@ def execute(
         state = state_constructor(ongoing_flows=flows)
         logger.debug(f"Constructed execution state {state}.")
 
-    if exec_queue is None:
-        queue = LocalExecutionQueue()  # type: ExecutionQueue
-    else:
-        queue = exec_queue
+    return state
 
-    if purge_at_start:
-        queue.purge()
-        logger.info(f"Purged queue {queue}.")
 
-    logger.debug(f"STARTING: mazepa execution of {target}.")
+def _execute_loop(
+    state: ExecutionState,
+    queue: ExecutionQueue,
+    batch_gap_sleep_sec: float,
+    max_batch_len: int,
+    metrics_summary: Optional[MetricsSummary],
+    progress_tracker: Optional[ProgressTracker],
+):
     while True:
         if len(state.get_ongoing_flow_ids()) == 0:
             logger.debug("No ongoing flows left.")
             break
 
-        task_batch = state.get_task_batch(max_batch_len=max_batch_len)
+        with tracing.executor_span("get_task_batch"):
+            task_batch = state.get_task_batch(max_batch_len=max_batch_len)
         logger.debug(f"Got a batch of {len(task_batch)} tasks.")
-        queue.push_tasks(task_batch)
+        tracer = tracing.get_active_tracer()
+        if tracer is not None:
+            # Remote queues restamp tasks once they are actually sent
+            for e in task_batch:
+                tracer.stamp(e, "pushed")
+        if metrics_summary is not None:
+            for e in task_batch:
+                # Tasks without ``metrics`` are not measured
+                if hasattr(e, "metrics") and getattr(e, "metrics") is None:
+                    setattr(e, "metrics", {})
+        with tracing.executor_span("push_tasks"):
+            queue.push_tasks(task_batch)
         logger.debug("DONE: Pushing tasks to queue.")
+        if progress_tracker is not None:
+            progress_tracker.add_submitted(task_batch)
         if not isinstance(queue, LocalExecutionQueue):
             logger.debug(f"Sleeping for {batch_gap_sleep_sec} between batches...")
-            time.sleep(batch_gap_sleep_sec)
+            with tracing.executor_span("sleep"):
+                time.sleep(batch_gap_sleep_sec)
             logger.debug("Awake.")
         logger.debug("Pulling task outcomes...")
-        task_outcomes = queue.pull_task_outcomes()
+        with tracing.executor_span("pull_task_outcomes"):
+            task_outcomes = queue.pull_task_outcomes()
         logger.debug(f"Received {len(task_outcomes)} taks outcomes.")
+        if metrics_summary is not None:
+            for outcome in task_outcomes.values():
+                metrics_summary.add(outcome)
+        if progress_tracker is not None:
+            progress_tracker.add_outcomes(task_outcomes)
+            progress_tracker.maybe_report()
         logger.debug("STARTING: Updating with taks outcomes.")
-        state.update_with_task_outcomes(task_outcomes)
+        with tracing.executor_span("update_with_task_outcomes"):
+            state.update_with_task_outcomes(task_outcomes)
         logger.debug("DONE: Updating with taks outcomes.")
-
-    logger.debug(f"DONE: mazepa execution of {target}.")
@@ -2,9 +2,9 @@ from __future__ import annotations
 import time
 from collections import defaultdict
 from typing import Protocol, Iterable, runtime_checkable, Dict, List
-from typeguard import typechecked
 import attrs
 from zetta_utils.log import get_logger
+from .config import typechecked
 from .tasks import Task
 from .task_outcome import TaskOutcome
 
@@ -13,7 +13,10 @@ logger = get_logger("mazepa")
 
 @runtime_checkable
 class ExecutionQueue(Protocol):  # pragma: no cover
-    name: str
+    # Read-only, so that queues with derived names such as ``ExecutionMultiQueue`` conform
+    @property
+    def name(self) -> str:
+        ...
 
     def purge(self):
         ...
@@ -30,6 +33,9 @@ class ExecutionQueue(Protocol):  # pragma: no cover
     def pull_tasks(self, max_num: int = ...) -> List[Task]:
         ...
 
+    def release_tasks(self, tasks: Iterable[Task]):
+        ...
+
 
 @typechecked
 @attrs.mutable
@@ -61,6 +67,11 @@ class LocalExecutionQueue:
     ) -> list[Task]:  # pragma: no cover
         return []
 
+    def release_tasks(  # pylint: disable=no-self-use
+        self, tasks: Iterable[Task]  # pylint: disable=unused-argument
+    ):  # pragma: no cover
+        pass
+
 
 @typechecked
 @attrs.frozen
@@ -77,21 +88,24 @@ class ExecutionMultiQueue:
             e.purge()
             logger.debug(f"Purged {e}.")
 
+    def get_queue_name(self, task: Task) -> str:
+        """
+        Return the name of the queue that ``task`` is routed to, which is the first queue
+        whose name contains all tags of the task.
+        """
+        for queue in self.queues:
+            if all(tag in queue.name for tag in task.task_execution_env.tags):
+                return queue.name
+        raise RuntimeError(
+            f"No queue from set {list(self.queues)} matches "
+            f"all tags {task.task_execution_env.tags}."
+        )
+
     def push_tasks(self, tasks: Iterable[Task]):
         tasks_for_queue = defaultdict(list)
 
         for task in tasks:
-            matching_queue_names = [
-                queue.name
-                for queue in self.queues
-                if all(tag in queue.name for tag in task.task_execution_env.tags)
-            ]
-            if len(matching_queue_names) == 0:
-                raise RuntimeError(
-                    f"No queue from set {list(self.queues)} matches "
-                    f"all tags {task.task_execution_env.tags}."
-                )
-            tasks_for_queue[matching_queue_names[0]].append(task)
+            tasks_for_queue[self.get_queue_name(task)].append(task)
 
         for queue in self.queues:
             queue.push_tasks(tasks_for_queue[queue.name])
@@ -121,3 +135,8 @@ class ExecutionMultiQueue:
                 break
 
         return result
+
+    def release_tasks(self, tasks: Iterable[Task]):
+        tasks = list(tasks)
+        for queue in self.queues:
+            queue.release_tasks(tasks)
@@ -1,14 +1,18 @@
 from __future__ import annotations
 
-from typing import Iterable, Protocol, runtime_checkable, Optional, List, Dict, Set
+from typing import Iterable, Protocol, runtime_checkable, Optional, List, Dict, Set, Union
 from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+import time
 import attrs
-from typeguard import typechecked
+from .config import typechecked
 
 from .flows import Flow
 from .tasks import Task
 from .task_outcome import TaskOutcome, TaskStatus
 from .dependency import Dependency
+from .duration_estimator import DurationEstimator
+from . import tracing
 
 
 @runtime_checkable
@@ -28,7 +32,7 @@ class ExecutionState(Protocol):  # pragma: no cover
 
 @typechecked
 @attrs.mutable
-class InMemoryExecutionState:
+class InMemoryExecutionState:  # pylint: disable=too-many-instance-attributes
     """
     ``ExecutionState`` implementation that keeps progress and dependency information
     as in-memory data structures.
@@ -37,7 +41,7 @@ class InMemoryExecutionState:
     ongoing_flows: Dict[str, Flow] = attrs.field(converter=lambda x: {e.id_: e for e in x})
     ongoing_exhausted_flow_ids: Set[str] = attrs.field(factory=set)
     ongoing_parent_map: Dict[str, Optional[str]] = attrs.field(
-        init=False, default=defaultdict(lambda: None)
+        init=False, factory=lambda: defaultdict(lambda: None)
     )
     ongoing_children_map: Dict[str, Set[str]] = attrs.field(
         init=False, factory=lambda: defaultdict(set)
@@ -46,6 +50,59 @@ class InMemoryExecutionState:
 
     completed_ids: Set[str] = attrs.field(factory=set)
     dependency_map: Dict[str, Set[str]] = attrs.field(init=False, factory=lambda: defaultdict(set))
+    # Dependencies on ids other than own children, e.g. on tasks of sibling flows,
+    # mapped from the upstream id to the ids waiting for it
+    downstream_map: Dict[str, Set[str]] = attrs.field(init=False, factory=lambda: defaultdict(set))
+    # Tasks held back until their ``upstream_ids`` complete, and tasks released since
+    blocked_tasks: Dict[str, Task] = attrs.field(init=False, factory=dict)
+    released_tasks: List[Task] = attrs.field(init=False, factory=list)
+
+    # Number of times a task that hit its time or memory limit will be resubmitted
+    max_resource_retries: int = 0
+    retry_counts: Dict[str, int] = attrs.field(init=False, factory=lambda: defaultdict(int))
+    tasks_to_retry: List[Task] = attrs.field(init=False, factory=list)
+    # Outcomes ignored because they were reported again for completed tasks, or for
+    # attempts of tasks that were already resubmitted
+    num_duplicate_outcomes: int = attrs.field(init=False, default=0)
+
+    # When non-zero, flows that are ready to be advanced are advanced concurrently
+    # on a pool of ``flow_prefetch_threads`` threads, each buffering up to
+    # ``flow_lookahead`` yields ahead of consumption. Useful when flow functions
+    # perform I/O between yields.
+    flow_prefetch_threads: int = 0
+    flow_lookahead: int = 2
+    _flow_executor: Optional[ThreadPoolExecutor] = attrs.field(init=False, default=None)
+    # Tasks whose flows were spliced into the execution, keyed by id
+    inline_flow_tasks: Dict[str, Task] = attrs.field(init=False, factory=dict)
+
+    # Order of tasks within each batch, based on per task factory duration estimates:
+    # ``None`` keeps the order in which tasks were yielded, ``"longest_first"`` sorts
+    # by estimated duration, and ``"critical_path"`` by the estimated duration of the
+    # longest chain of ``upstream_ids`` dependencies starting at the task.
+    task_order: Optional[str] = attrs.field(
+        default=None,
+        validator=attrs.validators.optional(
+            attrs.validators.in_(["longest_first", "critical_path"])
+        ),
+    )
+    duration_estimator: Optional[DurationEstimator] = None
+
+    def __attrs_post_init__(self):
+        if self.task_order is not None and self.duration_estimator is None:
+            self.duration_estimator = DurationEstimator()
+        if self.flow_prefetch_threads > 0:
+            self._flow_executor = ThreadPoolExecutor(
+                max_workers=self.flow_prefetch_threads, thread_name_prefix="mazepa_flow"
+            )
+
+    def close(self):
+        """
+        Shut down the flow prefetch threads, waiting for running prefetches to finish.
+        Flows are advanced on the calling thread afterwards.
+        """
+        if self._flow_executor is not None:
+            self._flow_executor.shutdown(wait=True)
+            self._flow_executor = None
 
     def get_ongoing_flow_ids(self) -> List[str]:
         """
@@ -53,28 +110,65 @@ class InMemoryExecutionState:
         """
         return list(self.ongoing_flows.keys())
 
+    def get_flow_id(self, task_id: str) -> Optional[str]:
+        """
+        Return the id of the flow that yielded the ongoing task ``task_id``.
+        """
+        return self.ongoing_parent_map.get(task_id)
+
+    def get_pending_tasks(self) -> List[Task]:
+        """
+        Return tasks that were generated but not returned in a batch yet, such as tasks
+        waiting for their upstream ids or scheduled for resubmission.
+        """
+        return self.tasks_to_retry + self.released_tasks + list(self.blocked_tasks.values())
+
     def update_with_task_outcomes(self, task_outcomes: Dict[str, TaskOutcome]):
         """
         Given a mapping from tasks ids to task outcomes, update dependency and state of the
-        execution. If any of the task outcomes indicates failure, will raise exception specified
-        in the task outcome.
+        execution. Tasks that timed out or ran out of memory are scheduled for resubmission
+        up to ``max_resource_retries`` times. If any other task outcome indicates failure,
+        will raise exception specified in the task outcome. Outcomes of tasks that have
+        already completed, and unsuccessful outcomes of earlier attempts of resubmitted
+        tasks, are duplicates under at-least-once delivery and are ignored.
 
         :param task_ids: IDs of tasks indicated as completed.
         """
 
+        tracer = tracing.get_active_tracer()
+        received_ts = time.time()
         for task_id, outcome in task_outcomes.items():
-            if outcome.status == TaskStatus.FAILED:
+            if self._is_duplicate_outcome(task_id, outcome):
+                self.num_duplicate_outcomes += 1
+                continue
+
+            if outcome.status in (
+                TaskStatus.TIMED_OUT,
+                TaskStatus.OUT_OF_MEMORY,
+            ) and self._schedule_retry(task_id):
+                continue
+
+            if outcome.status != TaskStatus.SUCCEEDED:
                 if outcome.exception is None:
                     outcome.exception = Exception(
-                        "Task outcome of '{task_id}' indicated failure "
+                        f"Task outcome of '{task_id}' indicated failure "
                         "without an exception specified."
                     )
                 raise outcome.exception
-            assert outcome.status == TaskStatus.SUCCEEDED
 
             if task_id in self.ongoing_tasks:
                 self.ongoing_tasks[task_id].outcome = outcome
+                task = self.ongoing_tasks[task_id]
+                if self.duration_estimator is not None:
+                    self.duration_estimator.observe(task, outcome)
                 self._update_completed_id(task_id)
+                if tracer is not None:
+                    tracer.record(
+                        task, outcome, outcome_received=received_ts, state_updated=time.time()
+                    )
+
+        if self.duration_estimator is not None and len(self.ongoing_flows) == 0:
+            self.duration_estimator.save()
 
     def get_task_batch(self, max_batch_len: int = 10000) -> List[Task]:
         """
@@ -82,10 +176,18 @@ class InMemoryExecutionState:
 
         :param max_batch_len: size limit after which no more flows will be querries for
             additional tasks. Note that the return length might be larger than
-            ``max_batch_len``, as individual flows batches may not be subdivided.
+            ``max_batch_len``, as lists yielded by flows are not subdivided. Iterators
+            yielded by flows are consumed only up to ``max_batch_len``.
         """
 
-        result = []  # type: List[Task]
+        result = self.tasks_to_retry[:max_batch_len]
+        self.tasks_to_retry = self.tasks_to_retry[max_batch_len:]
+        num_released = max_batch_len - len(result)
+        result.extend(self.released_tasks[:num_released])
+        self.released_tasks = self.released_tasks[num_released:]
+        for flow in self.ongoing_flows.values():
+            self._maybe_prefetch(flow)
+
         for flow in list(self.ongoing_flows.values()):
             while (
                 flow.id_ in self.ongoing_flows
@@ -93,34 +195,140 @@ class InMemoryExecutionState:
                 and len(result) < max_batch_len
                 and flow.id_ not in self.ongoing_exhausted_flow_ids
             ):
-                flow_batch = self._get_batch_from_flow(flow)
+                flow_batch = self._get_batch_from_flow(flow, max_batch_len - len(result))
                 result.extend(flow_batch)
 
             if len(result) >= max_batch_len:
                 break
 
+        tracer = tracing.get_active_tracer()
         for e in result:
             self.ongoing_tasks[e.id_] = e
+            if tracer is not None:
+                tracer.stamp(e, "generated", flow_id=self.ongoing_parent_map[e.id_])
+
+        if self.task_order is not None:
+            self._sort_batch(result)
 
         return result
 
+    def _sort_batch(self, batch: List[Task]):
+        assert self.duration_estimator is not None
+        estimator = self.duration_estimator
+        if self.task_order == "longest_first":
+            batch.sort(key=estimator.estimate, reverse=True)
+        else:
+            path_secs = {}  # type: Dict[str, float]
+            batch.sort(key=lambda e: self._get_critical_path_secs(e, path_secs), reverse=True)
+
+    def _get_critical_path_secs(self, task: Task, path_secs: Dict[str, float]) -> float:
+        assert self.duration_estimator is not None
+        # Post-order walk with an explicit stack, as chains of blocked tasks can be
+        # deeper than the recursion limit
+        stack = [(task, False)]
+        while len(stack) > 0:
+            current, expanded = stack.pop()
+            if current.id_ in path_secs:
+                continue
+            downstream = [
+                self.blocked_tasks[e]
+                for e in self.downstream_map.get(current.id_, ())
+                if e in self.blocked_tasks
+            ]
+            if not expanded:
+                stack.append((current, True))
+                stack.extend((e, False) for e in downstream if e.id_ not in path_secs)
+            else:
+                path_secs[current.id_] = self.duration_estimator.estimate(current) + max(
+                    (path_secs[e.id_] for e in downstream), default=0.0
+                )
+        return path_secs[task.id_]
+
+    def _maybe_prefetch(self, flow: Flow):
+        if (
+            self._flow_executor is not None
+            and len(self.dependency_map[flow.id_]) == 0
+            and flow.id_ not in self.ongoing_exhausted_flow_ids
+        ):
+            flow.prefetch(self._flow_executor, self.flow_lookahead)
+
+    def _maybe_inline(self, task: Task) -> Union[Task, Flow]:
+        """
+        Return the flow to be executed in place of ``task`` for tasks that wrap a flow
+        which can run in this execution, such as ``SubflowTask`` without its own queue.
+        The flow takes over the id of the task, so dependencies on the task are kept.
+        """
+        get_inline_flow = getattr(getattr(task, "fn", None), "get_inline_flow", None)
+        if get_inline_flow is None:
+            return task
+        flow = get_inline_flow()
+        if flow is None:
+            return task
+        flow.id_ = task.id_
+        self.inline_flow_tasks[task.id_] = task
+        return flow
+
+    def _is_duplicate_outcome(self, task_id: str, outcome: TaskOutcome) -> bool:
+        if task_id in self.completed_ids:
+            return True
+        task = self.ongoing_tasks.get(task_id)
+        return (
+            task is not None
+            and outcome.status != TaskStatus.SUCCEEDED
+            and outcome.attempt < getattr(task, "attempt", 0)
+        )
+
+    def _schedule_retry(self, task_id: str) -> bool:
+        if (
+            task_id not in self.ongoing_tasks
+            or self.retry_counts[task_id] >= self.max_resource_retries
+        ):
+            return False
+        self.retry_counts[task_id] += 1
+        task = self.ongoing_tasks[task_id]
+        # Tasks without ``attempt`` don't report it in their outcomes
+        if hasattr(task, "attempt"):
+            setattr(task, "attempt", self.retry_counts[task_id])
+        self.tasks_to_retry.append(task)
+        return True
+
     def _add_dependency(self, flow_id: str, dep: Dependency):
         if dep.is_barrier():  # depend on all ongoing children
             self.dependency_map[flow_id].update(self.ongoing_children_map[flow_id])
         else:
             for id_ in dep.ids:
                 if id_ not in self.completed_ids:
-                    assert (
-                        id_ in self.ongoing_children_map[flow_id]
-                    ), f"Dependency on a non-child '{id_}' for flows '{flow_id}'"
+                    if id_ in self.ongoing_children_map[flow_id]:
+                        self.dependency_map[flow_id].add(id_)
+                    else:
+                        self._add_upstream(flow_id, id_)
 
-                    self.dependency_map[flow_id].add(id_)
+    def _add_upstream(self, id_: str, upstream_id: str):
+        if upstream_id not in self.ongoing_parent_map and upstream_id not in self.ongoing_flows:
+            raise ValueError(
+                f"'{id_}' depends on the unknown id '{upstream_id}': dependencies must be "
+                "on tasks or flows that were yielded before."
+            )
+        self.dependency_map[id_].add(upstream_id)
+        self.downstream_map[upstream_id].add(id_)
 
     def _update_completed_id(self, id_: str):
         self.completed_ids.add(id_)
         self.ongoing_exhausted_flow_ids.discard(id_)
         self.ongoing_flows.pop(id_, None)
         self.ongoing_tasks.pop(id_, None)
+        self.retry_counts.pop(id_, None)
+        inline_flow_task = self.inline_flow_tasks.pop(id_, None)
+        if inline_flow_task is not None:
+            inline_flow_task.outcome = TaskOutcome(status=TaskStatus.SUCCEEDED)
+
+        for downstream_id in self.downstream_map.pop(id_, ()):
+            self.dependency_map[downstream_id].discard(id_)
+            if (
+                len(self.dependency_map[downstream_id]) == 0
+                and downstream_id in self.blocked_tasks
+            ):
+                self.released_tasks.append(self.blocked_tasks.pop(downstream_id))
 
         parent_id = self.ongoing_parent_map[id_]
         if parent_id is not None:
@@ -132,8 +340,8 @@ class InMemoryExecutionState:
             ):
                 self._update_completed_id(parent_id)
 
-    def _get_batch_from_flow(self, flow):
-        flow_yield = flow.get_next_batch()
+    def _get_batch_from_flow(self, flow: Flow, max_batch_len: int) -> List[Task]:
+        flow_yield = flow.get_next_batch(max_batch_len)
         result = []
         if flow_yield is None:  # Means the flows is exhausted
             self.ongoing_exhausted_flow_ids.add(flow.id_)
@@ -145,12 +353,33 @@ class InMemoryExecutionState:
         else:
             for e in flow_yield:
                 if e.id_ not in self.completed_ids:
+                    if isinstance(e, Task):
+                        e = self._maybe_inline(e)
                     self.ongoing_children_map[flow.id_].add(e.id_)
                     self.ongoing_parent_map[e.id_] = flow.id_
                     if isinstance(e, Flow):
                         self.ongoing_flows[e.id_] = e
+                        if e.id_ in self.inline_flow_tasks:
+                            # Inlined flows wait for the upstream ids of their task
+                            self._add_upstreams(e.id_, self.inline_flow_tasks[e.id_])
+                        self._maybe_prefetch(e)
                     else:
                         assert isinstance(e, Task), "Typechecking error."
-                        result.append(e)
+                        if self._add_upstreams(e.id_, e):
+                            self.blocked_tasks[e.id_] = e
+                        else:
+                            result.append(e)
 
         return result
+
+    def _add_upstreams(self, id_: str, task: Task) -> bool:
+        """
+        Record dependencies of ``id_`` on the incomplete upstream ids of ``task``, and
+        return whether there were any.
+        """
+        is_blocked = False
+        for upstream_id in getattr(task, "upstream_ids", ()):
+            if upstream_id not in self.completed_ids:
+                self._add_upstream(id_, upstream_id)
+                is_blocked = True
+        return is_blocked
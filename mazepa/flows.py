@@ -10,11 +10,18 @@ from typing import (
     List,
     Generic,
     Iterable,
+    Iterator,
     Dict,
     Protocol,
+    overload,
     runtime_checkable,
 )
+import collections.abc
+import threading
+from collections import deque
+from concurrent.futures import Executor
 from contextlib import contextmanager
+from itertools import islice
 from typing_extensions import ParamSpec
 import attrs
 from . import id_generators
@@ -24,7 +31,11 @@ from .task_execution_env import TaskExecutionEnv
 
 
 BatchType = Optional[Union[Dependency, List[Task], List["Flow"]]]
-FlowFnYieldType = Union[Dependency, "Task", List["Task"], "Flow", List["Flow"]]
+# Iterators, e.g. generators, of tasks and flows are consumed incrementally by the
+# execution state instead of being materialized at once.
+FlowFnYieldType = Union[
+    Dependency, "Task", List["Task"], "Flow", List["Flow"], Iterator[Union["Task", "Flow"]]
+]
 FlowFnReturnType = Generator[FlowFnYieldType, None, Any]
 P = ParamSpec("P")
 P1 = ParamSpec("P1")
@@ -54,9 +65,77 @@ class Flow(Protocol[P]):  # pragma: no cover # protocol
     def task_execution_env_ctx(self, env: Optional[TaskExecutionEnv]):
         ...
 
-    def get_next_batch(self) -> BatchType:
+    def get_next_batch(self, max_batch_len: Optional[int] = None) -> BatchType:
         ...
 
+    def prefetch(self, executor: Executor, lookahead: int):
+        ...
+
+
+@attrs.mutable
+class _LookaheadIterator:
+    """
+    Wraps a flow function iterator to advance it on an executor ahead of consumption,
+    buffering up to ``lookahead`` yields. Advancing stops after a ``Dependency`` is
+    yielded, as code following it may rely on the dependency being satisfied, and
+    resumes on the next ``prefetch`` after the dependency has been consumed.
+    """
+
+    iterator: Iterator
+    lookahead: int
+    _buffer: deque = attrs.field(init=False, factory=deque)
+    _cond: threading.Condition = attrs.field(init=False, factory=threading.Condition)
+    _running: bool = attrs.field(init=False, default=False)
+    _blocked: bool = attrs.field(init=False, default=False)
+
+    def prefetch(self, executor: Executor):
+        with self._cond:
+            if self._running or self._blocked or len(self._buffer) >= self.lookahead:
+                return
+            self._running = True
+        executor.submit(self._advance)
+
+    def _advance(self):
+        try:
+            while True:
+                with self._cond:
+                    if len(self._buffer) >= self.lookahead:
+                        return
+                try:
+                    yielded = next(self.iterator, None)
+                except Exception as exc:  # pylint: disable=broad-except
+                    yielded = exc
+                with self._cond:
+                    self._buffer.append(yielded)
+                    self._cond.notify_all()
+                    if yielded is None or isinstance(yielded, (Dependency, Exception)):
+                        self._blocked = True
+                        return
+        finally:
+            with self._cond:
+                self._running = False
+                self._cond.notify_all()
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        with self._cond:
+            self._cond.wait_for(lambda: len(self._buffer) > 0 or not self._running)
+            if len(self._buffer) == 0:
+                # Nothing was prefetched, advance synchronously.
+                yielded = next(self.iterator, None)
+            else:
+                yielded = self._buffer.popleft()
+                if isinstance(yielded, (Dependency, Exception)):
+                    self._blocked = False
+
+        if isinstance(yielded, Exception):
+            raise yielded
+        if yielded is None:
+            raise StopIteration
+        return yielded
+
 
 @attrs.mutable
 class _Flow(Generic[P]):
@@ -70,6 +149,8 @@ class _Flow(Generic[P]):
     id_: str
     task_execution_env: Optional[TaskExecutionEnv]
     _iterator: FlowFnReturnType = attrs.field(init=False, default=None)
+    # Remainder of an iterator yielded by the flow function
+    _yielded_iterator: Optional[Iterator] = attrs.field(init=False, default=None)
 
     # These are saved as attributes just for printability.
     args: Iterable = attrs.field(init=False, default=list)
@@ -91,10 +172,26 @@ class _Flow(Generic[P]):
         yield
         self.task_execution_env = old_env
 
-    def get_next_batch(self) -> BatchType:
-        yielded = next(self._iterator, None)
-
+    def get_next_batch(self, max_batch_len: Optional[int] = None) -> BatchType:
+        """
+        Return the next batch yielded by the flow function, or ``None`` if the flow
+        is exhausted. When the flow function yields an iterator, it is returned in
+        consecutive batches of at most ``max_batch_len`` elements.
+        """
         result: BatchType
+        while True:
+            if self._yielded_iterator is None:
+                yielded = next(self._iterator, None)
+                if not isinstance(yielded, collections.abc.Iterator):
+                    break
+                self._yielded_iterator = yielded
+
+            result = list(islice(self._yielded_iterator, max_batch_len))
+            if len(result) > 0:
+                self._set_task_execution_env(result)
+                return result
+            self._yielded_iterator = None
+
         if isinstance(yielded, Flow):
             result = [yielded]
         elif isinstance(yielded, Task):
@@ -102,12 +199,28 @@ class _Flow(Generic[P]):
         else:
             result = yielded
 
-        if self.task_execution_env is not None and isinstance(result, list):
-            for e in result:
-                e.task_execution_env = self.task_execution_env
+        if isinstance(result, list):
+            self._set_task_execution_env(result)
 
         return result
 
+    def prefetch(self, executor: Executor, lookahead: int):
+        """
+        Start advancing the flow function on ``executor`` ahead of ``get_next_batch``
+        calls, keeping up to ``lookahead`` yields buffered.
+        """
+        iterator: Any = self._iterator
+        if not isinstance(iterator, _LookaheadIterator):
+            # The wrapper stands in for the generator, which is only advanced with ``next``
+            iterator = _LookaheadIterator(iterator=self._iterator, lookahead=lookahead)
+            self._iterator = iterator
+        iterator.prefetch(executor)
+
+    def _set_task_execution_env(self, batch: Iterable[Union[Task, Flow]]):
+        if self.task_execution_env is not None:
+            for e in batch:
+                e.task_execution_env = self.task_execution_env
+
 
 @runtime_checkable
 class FlowType(Protocol[P]):  # pragma: no cover # protocol
@@ -150,9 +263,36 @@ class _FlowType(Generic[P]):
         return result
 
 
+@overload
 def flow_type(fn: Callable[P, FlowFnReturnType]) -> FlowType[P]:
-    """Decorator for generator functions defining mazepa flows."""
-    return _FlowType[P](fn)
+    ...
+
+
+@overload
+def flow_type(
+    *, id_fn: Callable[[Callable, dict], str] = ...
+) -> Callable[[Callable[P, FlowFnReturnType]], FlowType[P]]:
+    ...
+
+
+def flow_type(
+    fn: Optional[Callable[P, FlowFnReturnType]] = None,
+    *,
+    id_fn: Callable[[Callable, dict], str] = id_generators.get_unique_id,
+) -> Union[FlowType[P], Callable[[Callable[P, FlowFnReturnType]], FlowType[P]]]:
+    """
+    Decorator for generator functions defining mazepa flows. Can be used either bare or
+    with arguments, e.g. ``@flow_type(id_fn=id_generators.get_content_id)``.
+
+    :param id_fn: generates flow ids from the function and its keyword arguments.
+    """
+
+    def _decorate(fn_: Callable[P, FlowFnReturnType]) -> FlowType[P]:
+        return _FlowType[P](fn_, id_fn=id_fn)
+
+    if fn is None:
+        return _decorate
+    return _decorate(fn)
 
 
 # TODO: make static type checking detect when a class wihtout `generate` is decorated.
@@ -163,19 +303,39 @@ def flow_type(fn: Callable[P, FlowFnReturnType]) -> FlowType[P]:
 # def generate(self, *args: P.args, **kwargs: P.kwargs) -> FlowFnReturnType: # pylint: disable=no-method-argument
 
 
-def flow_type_cls(cls: Type) -> Type:  # rely on mypy plugin to do this properly
+@overload
+def flow_type_cls(cls: Type) -> Any:
+    ...
+
+
+@overload
+def flow_type_cls(*, id_fn: Callable[[Callable, dict], str] = ...) -> Callable[[Type], Any]:
+    ...
+
+
+def flow_type_cls(
+    cls: Optional[Type] = None,
+    *,
+    id_fn: Callable[[Callable, dict], str] = id_generators.get_unique_id,
+) -> Any:  # rely on mypy plugin to do this properly
     # original_call = cls.__call__
 
     # TODO: figure out how to handle this with changing TaskExecutionEnvs
     def _call_fn(self, *args, **kwargs):
         return _FlowType(
             self.generate,
+            id_fn=id_fn,
             # functools.partial(original_call, self),
             # TODO: Other params passed to decorator
         )(
             *args, **kwargs
         )  # pylint: disable=protected-access
 
-    # can't override __new__ because it doesn't combine well with attrs/dataclass
-    setattr(cls, "__call__", _call_fn)
-    return cls
+    def _decorate(cls_: Type) -> Type:
+        # can't override __new__ because it doesn't combine well with attrs/dataclass
+        setattr(cls_, "__call__", _call_fn)
+        return cls_
+
+    if cls is None:
+        return _decorate
+    return _decorate(cls)
@@ -1,7 +1,15 @@
-from typing import Callable
+from typing import Any, Callable, Dict, FrozenSet, List
+import dataclasses
+import enum
+import functools
+import hashlib
+import types
 import uuid
 
-from coolname import generate_slug  # type: ignore
+import attrs
+
+# ``coolname`` is imported on first use to keep ``import mazepa`` fast.
+# pylint: disable=import-outside-toplevel
 
 
 def get_unique_id(  # pylint: disable=unused-argument
@@ -9,6 +17,8 @@ def get_unique_id(  # pylint: disable=unused-argument
     kwargs: dict,
     slug_len=3,
 ) -> str:  # pragma: no cover
+    from coolname import generate_slug  # type: ignore
+
     return f"{generate_slug(slug_len)}-{str(uuid.uuid1())}"
 
 
@@ -22,3 +32,179 @@ def get_literal_id_fn(  # pylint: disable=unused-argument
         return id_
 
     return get_literal_id
+
+
+def get_unique_ids(  # pylint: disable=unused-argument
+    fn: Callable,
+    kwargs_list: List[dict],
+    slug_len=3,
+) -> List[str]:
+    """
+    Batch version of ``get_unique_id`` that generates a single unique prefix
+    for the whole batch.
+    """
+    prefix = get_unique_id(fn, {}, slug_len=slug_len)
+    return [f"{prefix}-{i}" for i in range(len(kwargs_list))]
+
+
+_SCALAR_TYPES = (type(None), bool, int, float, str, bytes)
+
+
+def _is_module_level_callable(obj: Any) -> bool:
+    """
+    Whether ``obj`` is identified by its qualified name. Lambdas, functions defined
+    within other functions and closures are not, as they share a qualified name across
+    definitions and captured values.
+    """
+    qualname = getattr(obj, "__qualname__", None)
+    return (
+        callable(obj)
+        and isinstance(qualname, str)
+        and "<lambda>" not in qualname
+        and "<locals>" not in qualname
+        and getattr(obj, "__closure__", None) is None
+    )
+
+
+def _canonical_repr(  # pylint: disable=too-many-return-statements
+    obj: Any, active: FrozenSet[int] = frozenset()
+) -> str:
+    """
+    Representation of ``obj`` that is equal for equal values across runs and processes.
+    Builtin containers and scalars, enums, ``attrs`` instances, dataclasses, functions
+    and other objects with a ``__dict__`` are represented field by field.
+
+    :param active: ids of the objects being represented further up, to cut reference cycles.
+    """
+    obj_type = type(obj)
+    if obj_type in _SCALAR_TYPES:
+        return repr(obj)
+    if id(obj) in active:
+        return f"<cycle {obj_type.__qualname__}>"
+    active = active | {id(obj)}
+    if obj_type in (list, tuple):
+        brackets = "[]" if obj_type is list else "()"
+        return brackets[0] + ",".join(_canonical_repr(e, active) for e in obj) + brackets[1]
+    if obj_type is dict:
+        items = sorted(
+            f"{_canonical_repr(k, active)}:{_canonical_repr(v, active)}" for k, v in obj.items()
+        )
+        return "{" + ",".join(items) + "}"
+    if obj_type in (set, frozenset):
+        return "set(" + ",".join(sorted(_canonical_repr(e, active) for e in obj)) + ")"
+    if isinstance(obj, enum.Enum):
+        return f"{obj_type.__module__}.{obj_type.__qualname__}.{obj.name}"
+    if _is_module_level_callable(obj):
+        result = f"{getattr(obj, '__module__', None)}.{obj.__qualname__}"
+        # Bound methods, e.g. ``generate`` of ``flow_type_cls`` instances, depend on their object
+        if hasattr(obj, "__self__") and not isinstance(obj.__self__, types.ModuleType):
+            result += f"<{_canonical_repr(obj.__self__, active)}>"
+        return result
+    return _canonical_object_repr(obj, active)
+
+
+def _canonical_object_repr(obj: Any, active: FrozenSet[int]) -> str:
+    obj_type = type(obj)
+    name = f"{obj_type.__module__}.{obj_type.__qualname__}"
+    if attrs.has(obj_type):
+        fields = {e.name: getattr(obj, e.name) for e in attrs.fields(obj_type)}
+    elif dataclasses.is_dataclass(obj) and not isinstance(obj, type):
+        fields = {e.name: getattr(obj, e.name) for e in dataclasses.fields(obj)}
+    elif isinstance(obj, types.FunctionType):
+        # Lambdas, local functions and closures are identified by their code and
+        # the values they capture
+        fields = {
+            "code": obj.__code__,
+            "defaults": obj.__defaults__,
+            "kwdefaults": obj.__kwdefaults__,
+            "closure": tuple(e.cell_contents for e in obj.__closure__ or ()),
+        }
+    elif isinstance(obj, types.CodeType):
+        fields = {
+            "code": obj.co_code,
+            "names": obj.co_names,
+            "consts": obj.co_consts,
+        }
+    elif isinstance(obj, functools.partial):
+        fields = {"func": obj.func, "args": obj.args, "keywords": obj.keywords}
+    elif hasattr(obj, "__dict__") and not isinstance(obj, (type, types.ModuleType)):
+        fields = vars(obj)
+    else:
+        try:
+            # Buffers such as ``numpy`` arrays are represented by their contents
+            view = memoryview(obj)
+        except TypeError:
+            raise TypeError(
+                f"Cannot make a content id from a value of type '{name}'. Use values of "
+                "builtin types, ``attrs`` classes or dataclasses, or a different ``id_fn``."
+            ) from None
+        fields = {"format": view.format, "shape": view.shape, "data": view.tobytes()}
+    items = ",".join(f"{k}={_canonical_repr(v, active)}" for k, v in sorted(fields.items()))
+    return f"{name}({items})"
+
+
+def _get_content_prefix(fn: Callable, version: str) -> str:
+    return f"{_canonical_repr(fn)}@{version}"
+
+
+def _get_content_digest(prefix: str, kwargs: dict) -> str:
+    return hashlib.blake2b(
+        f"{prefix}|{_canonical_repr(kwargs)}".encode(), digest_size=16
+    ).hexdigest()
+
+
+def _get_readable_name(fn: Callable) -> str:
+    return getattr(fn, "__name__", type(fn).__name__)
+
+
+def get_content_id(
+    fn: Callable,
+    kwargs: dict,
+    version: str = "",
+) -> str:
+    """
+    Deterministic id made from a hash of ``fn``, identified by its qualified name when
+    defined at module level, and the values of ``kwargs``, so that the same work gets
+    the same id in every run. Pass a new
+    ``version`` (e.g. through ``functools.partial``) when ``fn`` changes in a way that
+    should invalidate previously completed ids.
+    """
+    digest = _get_content_digest(_get_content_prefix(fn, version), kwargs)
+    return f"{_get_readable_name(fn)}-{digest}"
+
+
+def get_content_ids(
+    fn: Callable,
+    kwargs_list: List[dict],
+    version: str = "",
+) -> List[str]:
+    """
+    Batch version of ``get_content_id`` that canonicalizes ``fn`` once for the whole batch.
+    """
+    prefix = _get_content_prefix(fn, version)
+    name = _get_readable_name(fn)
+    return [f"{name}-{_get_content_digest(prefix, kwargs)}" for kwargs in kwargs_list]
+
+
+BATCH_ID_FNS: Dict[
+    Callable[[Callable, dict], str], Callable[[Callable, List[dict]], List[str]]
+] = {
+    get_unique_id: get_unique_ids,
+    get_content_id: get_content_ids,
+}
+
+
+def get_batch_id_fn(
+    id_fn: Callable[[Callable, dict], str]
+) -> Callable[[Callable, List[dict]], List[str]]:
+    """
+    Return the batch version of ``id_fn`` if one is registered in ``BATCH_ID_FNS``,
+    otherwise a function that applies ``id_fn`` to each element.
+    """
+    if id_fn in BATCH_ID_FNS:
+        return BATCH_ID_FNS[id_fn]
+
+    def get_ids(fn: Callable, kwargs_list: List[dict]) -> List[str]:
+        return [id_fn(fn, kwargs) for kwargs in kwargs_list]
+
+    return get_ids
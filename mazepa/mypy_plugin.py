@@ -2,6 +2,7 @@
 from __future__ import annotations
 from typing import Callable, Final, Optional
 from mypy.plugin import Plugin, ClassDefContext
+from mypy.nodes import ARG_POS, ARG_STAR2, Argument, Var
 from mypy.types import Parameters
 
 from mypy.plugins.common import (
@@ -45,6 +46,43 @@ def task_maker_cls_callback(ctx):  # pragma: no cover # type: ignore
             return_type=return_type,
         )
 
+        any_type = AnyType(TypeOfAny.explicit)
+        list_return_type = ctx.api.named_type(
+            fullname="builtins.list",
+            args=[ctx.api.named_type(fullname="mazepa.Task", args=[params, any_type])],
+        )
+        kwargs_iterable_type = ctx.api.named_type(
+            fullname="typing.Iterable",
+            args=[
+                ctx.api.named_type(
+                    fullname="builtins.dict",
+                    args=[ctx.api.named_type("builtins.str"), any_type],
+                )
+            ],
+        )
+        add_method_to_class(
+            ctx.api,
+            ctx.cls,
+            "make_tasks",
+            args=[
+                Argument(
+                    Var("kwargs_iterable", kwargs_iterable_type),
+                    kwargs_iterable_type,
+                    None,
+                    ARG_POS,
+                )
+            ],
+            return_type=list_return_type,
+        )
+        columns_type = ctx.api.named_type(fullname="typing.Iterable", args=[any_type])
+        add_method_to_class(
+            ctx.api,
+            ctx.cls,
+            "map",
+            args=[Argument(Var("columns", columns_type), columns_type, None, ARG_STAR2)],
+            return_type=list_return_type,
+        )
+
     return True
 
 
@@ -0,0 +1,287 @@
+from __future__ import annotations
+
+import collections
+import datetime
+import json
+import sys
+import time
+from typing import Any, Callable, Deque, Dict, Iterable, List, Optional, Tuple
+
+import attrs
+
+from .tasks import Task
+from .task_outcome import TaskOutcome, TaskStatus
+
+TOTAL_GROUP = "total"
+
+
+@attrs.frozen
+class GroupProgress:
+    """
+    Progress of a group of tasks, such as the tasks of a flow or with a given tag.
+    Rates are computed over the rolling window of the ``ProgressTracker``, as is the mean
+    execution time unless no task of the group completed within the window. ``pending``
+    counts tasks that were generated but not submitted yet, e.g. because they wait for
+    their upstream tasks.
+    """
+
+    submitted: int
+    completed: int
+    failed: int
+    throughput: float
+    arrival_rate: float
+    mean_execution_secs: Optional[float]
+    pending: int = 0
+
+    @property
+    def in_flight(self) -> int:
+        return self.submitted - self.completed - self.failed
+
+    @property
+    def busy_workers(self) -> Optional[float]:
+        """
+        Average number of workers executing tasks of the group, estimated from
+        ``execution_secs`` of the tasks completed within the window.
+        """
+        if self.mean_execution_secs is None:
+            return None
+        return self.mean_execution_secs * self.throughput
+
+    @property
+    def eta_secs(self) -> Optional[float]:
+        """
+        Time to complete the tasks in flight at the current throughput. Tasks that
+        flows have not generated yet are not accounted for.
+        """
+        if self.in_flight == 0:
+            return 0.0
+        if self.throughput == 0:
+            return None
+        return self.in_flight / self.throughput
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            **attrs.asdict(self),
+            "in_flight": self.in_flight,
+            "busy_workers": self.busy_workers,
+            "eta_secs": self.eta_secs,
+        }
+
+
+@attrs.frozen
+class ProgressSnapshot:
+    ts: float
+    elapsed_secs: float
+    total: GroupProgress
+    by_flow: Dict[str, GroupProgress]
+    by_tag: Dict[str, GroupProgress]
+    by_queue: Dict[str, GroupProgress]
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "ts": self.ts,
+            "elapsed_secs": self.elapsed_secs,
+            "total": self.total.to_dict(),
+            "by_flow": {k: v.to_dict() for k, v in self.by_flow.items()},
+            "by_tag": {k: v.to_dict() for k, v in self.by_tag.items()},
+            "by_queue": {k: v.to_dict() for k, v in self.by_queue.items()},
+        }
+
+
+@attrs.mutable
+class _GroupCounts:
+    submitted: int = 0
+    completed: int = 0
+    failed: int = 0
+    execution_secs: float = 0.0
+    num_timed: int = 0
+    # (timestamp, num submitted, num completed, sum of execution_secs, num timed) per update
+    window: Deque[Tuple[float, int, int, float, int]] = attrs.field(factory=collections.deque)
+
+    def get_progress(self, now_ts: float, window_secs: float, pending: int = 0) -> GroupProgress:
+        while len(self.window) > 0 and self.window[0][0] < now_ts - window_secs:
+            self.window.popleft()
+        num_submitted = sum(e[1] for e in self.window)
+        num_completed = sum(e[2] for e in self.window)
+        execution_secs = sum(e[3] for e in self.window)
+        num_timed = sum(e[4] for e in self.window)
+        if num_timed == 0:  # fall back to durations of tasks completed before the window
+            execution_secs, num_timed = self.execution_secs, self.num_timed
+        return GroupProgress(
+            submitted=self.submitted,
+            completed=self.completed,
+            failed=self.failed,
+            throughput=num_completed / window_secs,
+            arrival_rate=num_submitted / window_secs,
+            mean_execution_secs=execution_secs / num_timed if num_timed > 0 else None,
+            pending=pending,
+        )
+
+
+@attrs.mutable
+class ProgressTracker:
+    """
+    Tracks tasks submitted, completed and in flight, in total as well as per flow, per
+    task execution environment tag and per execution queue, and periodically reports
+    snapshots of progress to ``callbacks``. Throughput and arrival rates are computed
+    over the last ``window_secs`` seconds, or over the whole execution while it is shorter.
+    Tasks returned by ``get_pending_tasks`` are counted as pending whenever a snapshot
+    is taken.
+
+    Work done per submitted batch and per pulled outcome is a few counter updates.
+    """
+
+    callbacks: List[Callable[[ProgressSnapshot], Any]] = attrs.field(factory=list)
+    report_interval_sec: float = 10.0
+    window_secs: float = 60.0
+    get_pending_tasks: Optional[Callable[[], Iterable[Task]]] = None
+    get_flow_id: Optional[Callable[[str], Optional[str]]] = None
+    get_queue_name: Optional[Callable[[Task], str]] = None
+    start_ts: float = attrs.field(factory=time.time)
+    last_report_ts: float = attrs.field(init=False, default=0.0)
+    groups: Dict[str, _GroupCounts] = attrs.field(
+        init=False, factory=lambda: collections.defaultdict(_GroupCounts)
+    )
+    # Group keys of the tasks in flight
+    task_groups: Dict[str, Tuple[str, ...]] = attrs.field(init=False, factory=dict)
+
+    def add_submitted(
+        self,
+        tasks: Iterable[Task],
+        get_flow_id: Optional[Callable[[str], Optional[str]]] = None,
+        get_queue_name: Optional[Callable[[Task], str]] = None,
+    ):
+        """
+        :param get_flow_id: defaults to the ``get_flow_id`` of the tracker.
+        :param get_queue_name: defaults to the ``get_queue_name`` of the tracker.
+        """
+        counts = collections.Counter()  # type: collections.Counter[str]
+        for task in tasks:
+            keys = self._get_group_keys(task, get_flow_id, get_queue_name)
+            self.task_groups[task.id_] = keys
+            counts.update(keys)
+
+        now_ts = time.time()
+        for key, num in counts.items():
+            group = self.groups[key]
+            group.submitted += num
+            group.window.append((now_ts, num, 0, 0.0, 0))
+
+    def add_outcomes(self, outcomes: Dict[str, TaskOutcome]):
+        completed = collections.Counter()  # type: collections.Counter[str]
+        failed = collections.Counter()  # type: collections.Counter[str]
+        execution_secs = collections.defaultdict(float)  # type: Dict[str, float]
+        timed = collections.Counter()  # type: collections.Counter[str]
+        for task_id, outcome in outcomes.items():
+            keys = self.task_groups.pop(task_id, None)
+            if keys is None:
+                continue
+            if outcome.status == TaskStatus.SUCCEEDED:
+                completed.update(keys)
+            else:
+                failed.update(keys)
+            if outcome.execution_secs is not None:
+                timed.update(keys)
+                for key in keys:
+                    execution_secs[key] += outcome.execution_secs
+
+        now_ts = time.time()
+        for key in completed.keys() | failed.keys():
+            group = self.groups[key]
+            group.completed += completed[key]
+            group.failed += failed[key]
+            group.execution_secs += execution_secs[key]
+            group.num_timed += timed[key]
+            group.window.append((now_ts, 0, completed[key], execution_secs[key], timed[key]))
+
+    def _get_group_keys(
+        self,
+        task: Task,
+        get_flow_id: Optional[Callable[[str], Optional[str]]] = None,
+        get_queue_name: Optional[Callable[[Task], str]] = None,
+    ) -> Tuple[str, ...]:
+        get_flow_id = get_flow_id or self.get_flow_id
+        get_queue_name = get_queue_name or self.get_queue_name
+        keys = [TOTAL_GROUP] + [f"tag:{e}" for e in task.task_execution_env.tags]
+        flow_id = get_flow_id(task.id_) if get_flow_id is not None else None
+        if flow_id is not None:
+            keys.append(f"flow:{flow_id}")
+        if get_queue_name is not None:
+            keys.append(f"queue:{get_queue_name(task)}")
+        return tuple(keys)
+
+    def get_snapshot(self) -> ProgressSnapshot:
+        now_ts = time.time()
+        window_secs = max(min(self.window_secs, now_ts - self.start_ts), 1e-6)
+        pending = collections.Counter()  # type: collections.Counter[str]
+        if self.get_pending_tasks is not None:
+            for task in self.get_pending_tasks():
+                pending.update(self._get_group_keys(task))
+        progress = {
+            k: self.groups[k].get_progress(now_ts, window_secs, pending[k])
+            for k in self.groups.keys() | pending.keys()
+        }
+        return ProgressSnapshot(
+            ts=now_ts,
+            elapsed_secs=now_ts - self.start_ts,
+            total=progress.get(TOTAL_GROUP, _GroupCounts().get_progress(now_ts, window_secs)),
+            by_flow={k[5:]: v for k, v in progress.items() if k.startswith("flow:")},
+            by_tag={k[4:]: v for k, v in progress.items() if k.startswith("tag:")},
+            by_queue={k[6:]: v for k, v in progress.items() if k.startswith("queue:")},
+        )
+
+    def maybe_report(self, force: bool = False):
+        now_ts = time.time()
+        if force or now_ts - self.last_report_ts >= self.report_interval_sec:
+            self.last_report_ts = now_ts
+            snapshot = self.get_snapshot()
+            for callback in self.callbacks:
+                callback(snapshot)
+
+
+def _format_secs(secs: Optional[float]) -> str:
+    if secs is None:
+        return "?"
+    return str(datetime.timedelta(seconds=round(secs)))
+
+
+def _format_group(name: str, progress: GroupProgress) -> str:
+    return (
+        f"{name}: {progress.completed}/{progress.submitted} done, "
+        f"{progress.in_flight} in flight, {progress.failed} failed, "
+        f"{progress.throughput:.1f} tasks/sec, ETA {_format_secs(progress.eta_secs)}"
+    )
+
+
+@attrs.mutable
+class StderrProgressReporter:
+    """
+    Progress callback that prints total progress, followed by the progress of up to
+    ``max_flows`` flows with the most tasks in flight.
+    """
+
+    max_flows: int = 5
+
+    def __call__(self, snapshot: ProgressSnapshot):
+        lines = [
+            f"[mazepa {_format_secs(snapshot.elapsed_secs)}] "
+            + _format_group("total", snapshot.total)
+        ]
+        flows = sorted(snapshot.by_flow.items(), key=lambda e: -e[1].in_flight)
+        for flow_id, progress in flows[: self.max_flows]:
+            if progress.in_flight > 0:
+                lines.append("    " + _format_group(flow_id, progress))
+        print("\n".join(lines), file=sys.stderr, flush=True)
+
+
+@attrs.mutable
+class JsonLinesProgressReporter:
+    """
+    Progress callback that appends every snapshot to the file at ``path`` as a line of JSON.
+    """
+
+    path: str
+
+    def __call__(self, snapshot: ProgressSnapshot):
+        with open(self.path, "a", encoding="utf-8") as f:
+            f.write(json.dumps(snapshot.to_dict()) + "\n")
@@ -0,0 +1,213 @@
+"""
+Wire format of outcome reports sent from workers to executors.
+
+Reports are encoded as a versioned binary payload, base64 encoded to fit into SQS
+message bodies. Every report is a fixed size record of the task status, attempt and
+execution time followed by the task id, so that the common case of a successful task
+without a return value takes a few dozen bytes. Return values and exceptions are
+appended as pickles only when present, with exceptions accompanied by their formatted
+traceback. Payloads of large bundles are additionally compressed.
+
+Messages in the original format, a compressed pickle of the reports, are still decoded.
+"""
+from __future__ import annotations
+
+import base64
+import json
+import struct
+import traceback
+import zlib
+from typing import Any, List, Tuple, cast
+
+import attrs
+
+from .. import serialization
+from ..task_outcome import TaskOutcome, TaskStatus
+
+# ``dill`` is imported on first use to keep ``import mazepa`` fast.
+# pylint: disable=import-outside-toplevel
+
+# Prefix of encoded messages, chosen outside of the base64 alphabet of the original format
+MAGIC = "~"
+VERSION = 1
+
+_HEADER = struct.Struct("<BI")  # payload flags, number of reports
+# task id length, status, field flags, attempt, execution_secs
+_RECORD = struct.Struct("<HBBHd")
+_LENGTH = struct.Struct("<I")
+
+_COMPRESSED = 1
+_COMPRESS_MIN_LEN = 512
+
+_HAS_EXECUTION_SECS = 1
+_HAS_RETURN_VALUE = 2
+_HAS_EXCEPTION = 4
+_HAS_TRACE_STAMPS = 8
+_HAS_METRICS = 16
+
+_OUTCOME_FIELD_NAMES = tuple(e.name for e in attrs.fields(cast(Any, TaskOutcome)))
+
+
+@attrs.frozen
+class OutcomeReport:
+    task_id: str
+    outcome: TaskOutcome
+
+
+class RemoteTraceback(Exception):
+    """
+    Set as the cause of exceptions decoded from outcome reports, to show where the
+    exception was raised on the worker.
+    """
+
+    def __init__(self, formatted_tb: str):
+        super().__init__(formatted_tb)
+        self.formatted_tb = formatted_tb
+
+    def __str__(self) -> str:
+        return f'\n"""\n{self.formatted_tb}"""'
+
+
+def _dumps(obj: Any) -> bytes:
+    import dill  # type: ignore
+
+    return dill.dumps(obj, protocol=4)
+
+
+def _loads(data: bytes) -> Any:
+    import dill
+
+    return dill.loads(data)
+
+
+def _encode_exception(exc: Exception) -> bytes:
+    formatted_tb = "".join(traceback.format_exception(type(exc), exc, exc.__traceback__))
+    try:
+        exc_data = _dumps(exc)
+    except Exception:  # pylint: disable=broad-except
+        exc_data = _dumps(RuntimeError(f"Unpicklable exception {exc!r}"))
+    return _dumps((exc_data, formatted_tb))
+
+
+def _decode_exception(data: bytes) -> Exception:
+    exc_data, formatted_tb = _loads(data)
+    try:
+        exc = _loads(exc_data)
+    except Exception as load_exc:  # pylint: disable=broad-except
+        exc = RuntimeError(f"Exception could not be unpickled: {load_exc!r}")
+    exc.__cause__ = RemoteTraceback(formatted_tb)
+    return exc
+
+
+def _encode_report(report: OutcomeReport, chunks: List[bytes]):
+    outcome = report.outcome
+    fields = []  # type: List[Tuple[int, bytes]]
+    if outcome.return_value is not None:
+        fields.append((_HAS_RETURN_VALUE, _dumps(outcome.return_value)))
+    if outcome.exception is not None:
+        fields.append((_HAS_EXCEPTION, _encode_exception(outcome.exception)))
+    if outcome.trace_stamps is not None:
+        fields.append((_HAS_TRACE_STAMPS, json.dumps(outcome.trace_stamps).encode()))
+    if outcome.metrics is not None:
+        fields.append((_HAS_METRICS, json.dumps(outcome.metrics).encode()))
+
+    field_flags = sum(e[0] for e in fields)
+    if outcome.execution_secs is not None:
+        field_flags |= _HAS_EXECUTION_SECS
+    task_id = report.task_id.encode()
+    chunks.append(
+        _RECORD.pack(
+            len(task_id),
+            outcome.status.value,
+            field_flags,
+            outcome.attempt,
+            outcome.execution_secs or 0.0,
+        )
+    )
+    chunks.append(task_id)
+    for _, data in fields:
+        chunks.append(_LENGTH.pack(len(data)))
+        chunks.append(data)
+
+
+def encode_outcome_reports(reports: List[OutcomeReport]) -> str:
+    chunks = []  # type: List[bytes]
+    for report in reports:
+        _encode_report(report, chunks)
+    payload = b"".join(chunks)
+    payload_flags = 0
+    if len(payload) >= _COMPRESS_MIN_LEN:
+        payload = zlib.compress(payload)
+        payload_flags |= _COMPRESSED
+    data = _HEADER.pack(payload_flags, len(reports)) + payload
+    return f"{MAGIC}{VERSION}{base64.b64encode(data).decode()}"
+
+
+def _read_field(data: bytes, offset: int) -> Tuple[bytes, int]:
+    (length,) = _LENGTH.unpack_from(data, offset)
+    offset += _LENGTH.size
+    return data[offset : offset + length], offset + length
+
+
+def _decode_payload(payload: bytes, num_reports: int) -> List[OutcomeReport]:
+    result = []
+    offset = 0
+    for _ in range(num_reports):
+        id_len, status, field_flags, attempt, execution_secs = _RECORD.unpack_from(payload, offset)
+        offset += _RECORD.size
+        task_id = payload[offset : offset + id_len].decode()
+        offset += id_len
+
+        values = {}  # type: dict
+        for flag in (_HAS_RETURN_VALUE, _HAS_EXCEPTION, _HAS_TRACE_STAMPS, _HAS_METRICS):
+            if field_flags & flag:
+                values[flag], offset = _read_field(payload, offset)
+
+        outcome = TaskOutcome(
+            status=TaskStatus(status),
+            exception=_decode_exception(values[_HAS_EXCEPTION])
+            if _HAS_EXCEPTION in values
+            else None,
+            execution_secs=execution_secs if field_flags & _HAS_EXECUTION_SECS else None,
+            return_value=_loads(values[_HAS_RETURN_VALUE])
+            if _HAS_RETURN_VALUE in values
+            else None,
+            trace_stamps=json.loads(values[_HAS_TRACE_STAMPS])
+            if _HAS_TRACE_STAMPS in values
+            else None,
+            metrics=json.loads(values[_HAS_METRICS]) if _HAS_METRICS in values else None,
+            attempt=attempt,
+        )  # type: TaskOutcome
+        result.append(OutcomeReport(task_id=task_id, outcome=outcome))
+    return result
+
+
+def _upgrade_legacy_report(report: OutcomeReport) -> OutcomeReport:
+    # Outcomes pickled by older workers lack the slots of fields added since, so they are
+    # rebuilt from the fields they have, with the others left at their defaults
+    outcome = TaskOutcome(
+        **{
+            name: getattr(report.outcome, name)
+            for name in _OUTCOME_FIELD_NAMES
+            if hasattr(report.outcome, name)
+        }
+    )  # type: TaskOutcome
+    return OutcomeReport(task_id=report.task_id, outcome=outcome)
+
+
+def decode_outcome_reports(body: str) -> List[OutcomeReport]:
+    if not body.startswith(MAGIC):
+        report = serialization.deserialize(body)
+        return [
+            _upgrade_legacy_report(e) for e in (report if isinstance(report, list) else [report])
+        ]
+
+    version = body[len(MAGIC) : len(MAGIC) + 1]
+    if version != str(VERSION):
+        raise ValueError(f"Unsupported outcome report format version '{version}'.")
+    data = base64.b64decode(body[len(MAGIC) + 1 :])
+    payload_flags, num_reports = _HEADER.unpack_from(data)
+    payload = data[_HEADER.size :]
+    if payload_flags & _COMPRESSED:
+        payload = zlib.decompress(payload)
+    return _decode_payload(payload, num_reports)
@@ -1,13 +1,33 @@
 from __future__ import annotations
-from typing import Iterable, Any, Optional, Dict
+import multiprocessing
+import time
+import uuid
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Iterable, Any, Optional, Dict, List, Tuple
 import attrs
-from typeguard import typechecked
 import taskqueue  # type: ignore
 
-# from zetta_utils.log import logger
+from zetta_utils.log import get_logger
 from zetta_utils.partial import ComparablePartial
-from .. import Task, TaskOutcome, serialization
+from ..config import typechecked
+from .. import Task, TaskOutcome, serialization, tracing
+from ..task_outcome import is_preferred_outcome
+from ..task_bundles import TaskBundle, BundleSizer, make_task_bundles
 from . import sqs_utils
+from .outcome_codec import (
+    OutcomeReport,
+    RemoteTraceback,
+    encode_outcome_reports,
+    decode_outcome_reports,
+)
+
+logger = get_logger("mazepa")
+
+# Leaves room for `python-task-queue` wrapping within the 256KiB SQS message size limit
+MAX_TASK_SER_LEN = 240 * 1024
+
+# Message attribute that identifies the execution an outcome report belongs to
+EXECUTION_ID_ATTRIBUTE = "mazepa_execution_id"
 
 
 class TQTask(taskqueue.RegisteredTask):
@@ -24,20 +44,27 @@ class TQTask(taskqueue.RegisteredTask):
         raise NotImplementedError()
 
 
-@attrs.frozen
-class OutcomeReport:
-    task_id: str
-    outcome: TaskOutcome
-
-
 def _send_outcome_report(
-    task: Task, queue_name: str, region_name: str, endpoint_url: Optional[str] = None
+    task: Task,
+    queue_name: str,
+    region_name: str,
+    endpoint_url: Optional[str] = None,
+    execution_id: Optional[str] = None,
 ):
+    members = task.tasks if isinstance(task, TaskBundle) else [task]
+    reports = [OutcomeReport(task_id=e.id_, outcome=e.outcome) for e in members]
+
+    sent_ts = time.time()
+    for e in reports:
+        if e.outcome.trace_stamps is not None:
+            e.outcome.trace_stamps["outcome_sent"] = sent_ts
+
     sqs_utils.send_msg(
         queue_name=queue_name,
         region_name=region_name,
         endpoint_url=endpoint_url,
-        msg_body=serialization.serialize(OutcomeReport(task_id=task.id_, outcome=task.outcome)),
+        msg_body=encode_outcome_reports(reports),
+        msg_attributes=None if execution_id is None else {EXECUTION_ID_ATTRIBUTE: execution_id},
     )
 
 
@@ -56,19 +83,120 @@ def _delete_task_message(
     )
 
 
+def _serialize_for_push(task: Task) -> List[str]:
+    result = serialization.serialize(task)
+    if isinstance(task, TaskBundle) and len(task.tasks) > 1 and len(result) > MAX_TASK_SER_LEN:
+        return [e for half in task.split() for e in _serialize_for_push(half)]
+    return [result]
+
+
+def _decode_outcome_bodies(bodies: List[str]) -> List[List[OutcomeReport]]:
+    return [decode_outcome_reports(e) for e in bodies]
+
+
+def _decode_outcome_bodies_for_transfer(
+    bodies: List[str],
+) -> List[Tuple[List[OutcomeReport], List[Optional[str]]]]:
+    """
+    Decode in a subprocess. Pickling exceptions drops their causes, so worker tracebacks
+    are returned alongside the reports.
+    """
+    result = []
+    for reports in _decode_outcome_bodies(bodies):
+        formatted_tbs = []  # type: List[Optional[str]]
+        for e in reports:
+            cause = getattr(e.outcome.exception, "__cause__", None)
+            if isinstance(cause, RemoteTraceback):
+                formatted_tbs.append(cause.formatted_tb)
+            else:
+                formatted_tbs.append(None)
+        result.append((reports, formatted_tbs))
+    return result
+
+
+def _restore_remote_tracebacks(
+    decoded: List[Tuple[List[OutcomeReport], List[Optional[str]]]]
+) -> List[List[OutcomeReport]]:
+    for reports, formatted_tbs in decoded:
+        for report, formatted_tb in zip(reports, formatted_tbs):
+            if formatted_tb is not None:
+                assert report.outcome.exception is not None
+                report.outcome.exception.__cause__ = RemoteTraceback(formatted_tb)
+    return [e[0] for e in decoded]
+
+
+def _forget_lease(
+    task: Task,
+    leased_receipt_handles: Dict[str, str],
+):
+    leased_receipt_handles.pop(task.id_, None)
+
+
 @typechecked
 @attrs.mutable
-class SQSExecutionQueue:
+class SQSExecutionQueue:  # pylint: disable=too-many-instance-attributes
+    """
+    ``ExecutionQueue`` backed by an SQS task queue and an SQS outcome queue.
+
+    Outcome reports are tagged with ``execution_id``, so that many executors can share
+    the same pair of queues. Outcome reports of other executions are released back to
+    the outcome queue, where they stay hidden for ``foreign_outcome_visibility_sec`` so
+    that executors do not receive each other's reports on every pull. Reports without
+    an execution id, sent by workers of older versions, are accepted by any executor.
+
+    Every receive of a report counts towards its ``ApproximateReceiveCount``, so reports
+    received by other executors may be moved to the dead-letter queue of an outcome queue
+    with a redrive policy before their own executor gets them. Shared outcome queues
+    should have no redrive policy, or a ``maxReceiveCount`` well above the number of
+    executors. Reports of executions that stopped early circulate until the retention
+    period of the queue expires.
+
+    Decoding outcome reports can be spread over ``outcome_decode_processes`` processes,
+    which pays off when many reports with large return values or tracebacks arrive per
+    pull. With ``prefetch_outcomes``, the next batch of outcome messages is received in
+    the background while the executor processes the current one. ``close`` releases
+    these resources once the queue is no longer used.
+    """
+
     name: str
     region_name: str = attrs.field(default=taskqueue.secrets.AWS_DEFAULT_REGION)
     endpoint_url: Optional[str] = None
     insertion_threads: int = 0
     outcome_queue_name: Optional[str] = None
     _queue: Any = attrs.field(init=False)
-    pull_wait_sec: int = 0
+    # Non-zero values enable SQS long polling, which is capped at 20 seconds
+    pull_wait_sec: int = attrs.field(
+        default=0, validator=[attrs.validators.ge(0), attrs.validators.le(20)]
+    )
     pull_lease_sec: int = 30
+    _leased_receipt_handles: Dict[str, str] = attrs.field(init=False, factory=dict)
+    # Tasks with equal execution environments are bundled into messages of up to
+    # ``max_bundle_len`` tasks, sized to take about ``target_bundle_secs`` to execute
+    max_bundle_len: int = 1
+    target_bundle_secs: float = 10.0
+    _bundle_sizer: BundleSizer = attrs.field(init=False)
+    execution_id: str = attrs.field(factory=lambda: str(uuid.uuid1()))
+    foreign_outcome_visibility_sec: int = 10
+    outcome_decode_processes: int = 0
+    prefetch_outcomes: bool = False
+    _decode_executor: Optional[ProcessPoolExecutor] = attrs.field(init=False, default=None)
+    _receive_executor: Optional[ThreadPoolExecutor] = attrs.field(init=False, default=None)
+    _prefetched_msgs: Optional[Future] = attrs.field(init=False, default=None)
 
     def __attrs_post_init__(self):
+        self._bundle_sizer = BundleSizer(
+            max_bundle_len=self.max_bundle_len, target_bundle_secs=self.target_bundle_secs
+        )
+        if self.outcome_decode_processes > 0:
+            # Forked processes could inherit locks held by the receiving thread, e.g. in boto3
+            self._decode_executor = ProcessPoolExecutor(
+                max_workers=self.outcome_decode_processes,
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+        if self.prefetch_outcomes:
+            self._receive_executor = ThreadPoolExecutor(
+                max_workers=1, thread_name_prefix="mazepa_outcomes"
+            )
         # Use TaskQueue for fast insertion
         self._queue = taskqueue.TaskQueue(
             self.name, region_name=self.region_name, endpoint_url=self.endpoint_url, green=False
@@ -77,22 +205,52 @@ class SQSExecutionQueue:
     def purge(self):  # pragma: no cover
         raise NotImplementedError()
 
+    def close(self):
+        """
+        Release outcome messages received in the background that were not pulled yet, and
+        shut down the decoding processes and the receiving thread. Outcomes are received
+        and decoded on the calling thread afterwards.
+        """
+        if self._prefetched_msgs is not None:
+            if not self._prefetched_msgs.cancel():
+                sqs_utils.release_received_msgs(self._prefetched_msgs.result())
+            self._prefetched_msgs = None
+        if self._receive_executor is not None:
+            self._receive_executor.shutdown(wait=True)
+            self._receive_executor = None
+        if self._decode_executor is not None:
+            self._decode_executor.shutdown(wait=True)
+            self._decode_executor = None
+
     def push_tasks(self, tasks: Iterable[Task]):
         if self.outcome_queue_name is None:
             raise RuntimeError("Outcome queue name not specified.")
 
+        if self.max_bundle_len > 1:
+            tasks = make_task_bundles(tasks, max_bundle_len=self._bundle_sizer.get_bundle_len())
+        else:
+            tasks = list(tasks)
+
+        outcome_callback = ComparablePartial(
+            _send_outcome_report,
+            queue_name=self.outcome_queue_name,
+            region_name=self.region_name,
+            endpoint_url=self.endpoint_url,
+            execution_id=self.execution_id,
+        )
         for task in tasks:
-            task._mazepa_callbacks.append(  # pylint: disable=protected-access
-                ComparablePartial(
-                    _send_outcome_report,
-                    queue_name=self.outcome_queue_name,
-                    region_name=self.region_name,
-                    endpoint_url=self.endpoint_url,
-                )
-            )
-        tq_tasks = [TQTask(serialization.serialize(e)) for e in tasks]
+            # Retried tasks are pushed more than once
+            if outcome_callback not in task._mazepa_callbacks:  # pylint: disable=protected-access
+                task._mazepa_callbacks.append(outcome_callback)  # pylint: disable=protected-access
+        tq_tasks = [TQTask(task_ser) for e in tasks for task_ser in _serialize_for_push(e)]
         self._queue.insert(tq_tasks, parallel=self.insertion_threads)
 
+        tracer = tracing.get_active_tracer()
+        if tracer is not None:
+            for task in tasks:
+                for e in task.tasks if isinstance(task, TaskBundle) else [task]:
+                    tracer.stamp(e, "pushed")
+
     def pull_task_outcomes(
         self, max_num: int = 100, max_time_sec: float = 2.5
     ) -> Dict[str, TaskOutcome]:
@@ -101,23 +259,101 @@ class SQSExecutionQueue:
                 "Attempting to pull task oucomes without outcome queue beign specified"
             )
 
-        msgs = sqs_utils.receive_msgs(
-            queue_name=self.outcome_queue_name,
-            region_name=self.region_name,
-            endpoint_url=self.endpoint_url,
-            max_msg_num=max_num,
-            max_time_sec=max_time_sec,
+        own_msgs = self._receive_outcome_msgs(max_num=max_num, max_time_sec=max_time_sec)
+        result = {}  # type: Dict[str, TaskOutcome]
+        for msg, reports in zip(own_msgs, self._decode_outcome_msgs(own_msgs)):
+            for e in reports:
+                if e.outcome.metrics is not None:
+                    e.outcome.metrics["outcome_bytes"] = len(msg.body) / len(reports)
+                # Tasks may run and report more than once under at-least-once delivery
+                if e.task_id not in result or is_preferred_outcome(e.outcome, result[e.task_id]):
+                    result[e.task_id] = e.outcome
+        sqs_utils.delete_received_msgs(own_msgs)
+        self._bundle_sizer.observe(result.values())
+
+        return result
+
+    def _receive_outcome_msgs(
+        self, max_num: int, max_time_sec: float
+    ) -> List[sqs_utils.SQSReceivedMsg]:
+        if self._receive_executor is None:
+            return self._receive_own_outcome_msgs(max_num, max_time_sec)
+
+        # Return the messages received in the background since the previous pull and start
+        # receiving the next ones, which are returned by the next pull
+        if self._prefetched_msgs is None:
+            result = self._receive_own_outcome_msgs(max_num, max_time_sec)
+        else:
+            result = self._prefetched_msgs.result()
+        self._prefetched_msgs = self._receive_executor.submit(
+            self._receive_own_outcome_msgs, max_num, max_time_sec
         )
-        task_outcomes = [serialization.deserialize(msg.body) for msg in msgs]
-        result = {e.task_id: e.outcome for e in task_outcomes}
-        sqs_utils.delete_received_msgs(msgs)
+        return result
+
+    def _receive_own_outcome_msgs(
+        self, max_num: int, max_time_sec: float
+    ) -> List[sqs_utils.SQSReceivedMsg]:
+        """
+        Receive up to ``max_num`` outcome messages of this execution within ``max_time_sec``,
+        releasing messages of other executions as they are received, so that they do not
+        count towards ``max_num``.
+        """
+        assert self.outcome_queue_name is not None
+        result = []  # type: List[sqs_utils.SQSReceivedMsg]
+        start_ts = time.time()
+        while True:
+            msgs = sqs_utils.receive_msgs(
+                queue_name=self.outcome_queue_name,
+                region_name=self.region_name,
+                endpoint_url=self.endpoint_url,
+                max_msg_num=max_num - len(result),
+                max_time_sec=max(0.0, max_time_sec - (time.time() - start_ts)),
+            )
+            foreign_msgs = []
+            for msg in msgs:
+                msg_execution_id = msg.attributes.get(EXECUTION_ID_ATTRIBUTE, self.execution_id)
+                if msg_execution_id == self.execution_id:
+                    result.append(msg)
+                else:
+                    foreign_msgs.append(msg)
+            if len(foreign_msgs) > 0:
+                sqs_utils.release_received_msgs(
+                    foreign_msgs, visibility_timeout=self.foreign_outcome_visibility_sec
+                )
+            if len(msgs) == 0 or len(result) >= max_num or time.time() - start_ts >= max_time_sec:
+                return result
+
+    def _decode_outcome_msgs(
+        self, msgs: List[sqs_utils.SQSReceivedMsg]
+    ) -> List[List[OutcomeReport]]:
+        bodies = [e.body for e in msgs]
+        if self._decode_executor is None or len(bodies) <= 1:
+            return _decode_outcome_bodies(bodies)
 
+        # A few chunks per process balance the load while amortizing the transfer overhead
+        num_chunks = min(len(bodies), self.outcome_decode_processes * 4)
+        chunk_len = -(-len(bodies) // num_chunks)
+        chunks = [bodies[i : i + chunk_len] for i in range(0, len(bodies), chunk_len)]
+        futures = [
+            self._decode_executor.submit(_decode_outcome_bodies_for_transfer, e) for e in chunks
+        ]
+        result = []  # type: List[List[OutcomeReport]]
+        for chunk, future in zip(chunks, futures):
+            try:
+                result += _restore_remote_tracebacks(future.result())
+            except Exception as e:  # pylint: disable=broad-except
+                # Reports holding objects that cannot be sent back from the decoding
+                # process with plain pickle are decoded in this process instead
+                logger.debug(f"Decoding outcome reports in the executor process: {e!r}")
+                result += _decode_outcome_bodies(chunk)
         return result
 
     def pull_tasks(self, max_num: int = 1):
         try:
             tq_tasks = self._queue.lease(
-                seconds=self.pull_lease_sec, num_tasks=max_num, wait_sec=self.pull_wait_sec
+                seconds=self.pull_lease_sec,
+                num_tasks=min(max_num, 10),  # SQS max receive batch size
+                wait_sec=self.pull_wait_sec,
             )
         except taskqueue.taskqueue.QueueEmptyError:
             tq_tasks = []
@@ -128,6 +364,11 @@ class SQSExecutionQueue:
         tasks = []
         for tq_task in tq_tasks:
             task = serialization.deserialize(tq_task.task_ser)
+            members = task.tasks if isinstance(task, TaskBundle) else [task]
+            for e in members:
+                metrics = getattr(e, "metrics", None)
+                if metrics is not None:
+                    metrics["task_bytes"] = len(tq_task.task_ser) / len(members)
             task._mazepa_callbacks.append(  # pylint: disable=protected-access
                 ComparablePartial(
                     _delete_task_message,
@@ -137,5 +378,32 @@ class SQSExecutionQueue:
                     endpoint_url=self.endpoint_url,
                 )
             )
+            task._mazepa_callbacks.append(  # pylint: disable=protected-access
+                ComparablePartial(
+                    _forget_lease,
+                    leased_receipt_handles=self._leased_receipt_handles,
+                )
+            )
+            self._leased_receipt_handles[task.id_] = tq_task.id
             tasks.append(task)
         return tasks
+
+    def release_tasks(self, tasks: Iterable[Task]):
+        """
+        Return leases of tasks pulled from this queue that will not be executed, making them
+        immediately visible to other workers. Tasks not leased from this queue are ignored.
+        """
+        for task in tasks:
+            receipt_handle = self._leased_receipt_handles.pop(task.id_, None)
+            if receipt_handle is not None:
+                try:
+                    sqs_utils.change_msg_visibility_by_receipt_handle(
+                        receipt_handle=receipt_handle,
+                        queue_name=self.name,
+                        region_name=self.region_name,
+                        endpoint_url=self.endpoint_url,
+                        visibility_timeout=0,
+                    )
+                except Exception as e:  # pylint: disable=broad-except
+                    # The lease might have expired and the message been received again
+                    logger.warning(f"Failed to release task {task.id_}: {e!r}")
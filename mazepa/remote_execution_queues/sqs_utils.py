@@ -1,7 +1,7 @@
 from __future__ import annotations
 import time
 from collections import defaultdict
-from typing import Any, Optional
+from typing import Any, Dict, Optional
 import cachetools  # type: ignore
 import attrs
 import tenacity
@@ -19,6 +19,8 @@ class SQSReceivedMsg:
     region_name: str
     receipt_handle: dict
     endpoint_url: Optional[str] = None
+    # String message attributes
+    attributes: Dict[str, str] = attrs.field(factory=dict)
 
 
 @cachetools.cached(cache={})
@@ -50,6 +52,7 @@ def receive_msgs(
         resp = sqs_client.receive_message(
             QueueUrl=get_queue_url(queue_name, region_name, endpoint_url=endpoint_url),
             AttributeNames=["All"],
+            MessageAttributeNames=["All"],
             MaxNumberOfMessages=msg_batch_size,
             VisibilityTimeout=visibility_timeout,
             WaitTimeSeconds=1,
@@ -64,6 +67,11 @@ def receive_msgs(
                 queue_name=queue_name,
                 region_name=region_name,
                 endpoint_url=endpoint_url,
+                attributes={
+                    k: v["StringValue"]
+                    for k, v in message.get("MessageAttributes", {}).items()
+                    if "StringValue" in v
+                },
             )
             for message in resp["Messages"]
         ]
@@ -84,11 +92,18 @@ def send_msg(
     region_name: str,
     msg_body: str,
     endpoint_url: Optional[str] = None,
+    msg_attributes: Optional[Dict[str, str]] = None,
 ):
     sqs_client = get_sqs_client(region_name, endpoint_url=endpoint_url)
+    kwargs = {}  # type: Dict[str, Any]
+    if msg_attributes:
+        kwargs["MessageAttributes"] = {
+            k: {"DataType": "String", "StringValue": v} for k, v in msg_attributes.items()
+        }
     msg_ack = sqs_client.send_message(
         QueueUrl=get_queue_url(queue_name, region_name, endpoint_url=endpoint_url),
         MessageBody=msg_body,
+        **kwargs,
     )
     if (
         "ResponseMetadata" not in msg_ack or msg_ack["ResponseMetadata"]["HTTPStatusCode"] != 200
@@ -98,7 +113,9 @@ def send_msg(
         )
 
 
-def delete_received_msgs(msgs: list[SQSReceivedMsg]) -> None:
+def _get_receipt_chunks_by_queue(
+    msgs: list[SQSReceivedMsg],
+) -> dict[tuple[str, str, Optional[str]], list[list[dict]]]:
     receipts_by_queue = defaultdict(list)  # type: dict[tuple[str, str, Optional[str]], list[dict]]
     for msg in msgs:
         receipts_by_queue[(msg.queue_name, msg.region_name, msg.endpoint_url)].append(
@@ -106,10 +123,11 @@ def delete_received_msgs(msgs: list[SQSReceivedMsg]) -> None:
         )
 
     # break into chunks of 10
-    receipt_chunks_by_queue = {
-        k: [v[i : i + 10] for i in range(0, len(v), 10)] for k, v in receipts_by_queue.items()
-    }
-    for k, v in receipt_chunks_by_queue.items():
+    return {k: [v[i : i + 10] for i in range(0, len(v), 10)] for k, v in receipts_by_queue.items()}
+
+
+def delete_received_msgs(msgs: list[SQSReceivedMsg]) -> None:
+    for k, v in _get_receipt_chunks_by_queue(msgs).items():
         for chunk in v:
             delete_msg_batch(
                 chunk,
@@ -119,6 +137,22 @@ def delete_received_msgs(msgs: list[SQSReceivedMsg]) -> None:
             )
 
 
+def release_received_msgs(msgs: list[SQSReceivedMsg], visibility_timeout: int = 0) -> None:
+    """
+    Make received messages visible to other receivers after ``visibility_timeout`` seconds
+    instead of deleting them.
+    """
+    for k, v in _get_receipt_chunks_by_queue(msgs).items():
+        for chunk in v:
+            change_msg_visibility_batch(
+                chunk,
+                queue_name=k[0],
+                region_name=k[1],
+                visibility_timeout=visibility_timeout,
+                endpoint_url=k[2],
+            )
+
+
 @tenacity.retry(stop=tenacity.stop_after_attempt(5), wait=tenacity.wait_random(min=0.5, max=2))
 def delete_msg_by_receipt_handle(
     receipt_handle: str,
@@ -136,6 +170,25 @@ def delete_msg_by_receipt_handle(
     )
 
 
+@tenacity.retry(stop=tenacity.stop_after_attempt(5), wait=tenacity.wait_random(min=0.5, max=2))
+def change_msg_visibility_by_receipt_handle(
+    receipt_handle: str,
+    queue_name: str,
+    region_name: str,
+    visibility_timeout: int,
+    endpoint_url: Optional[str] = None,
+):
+    logger.debug(
+        f"Setting visibility timeout of message with handle '{receipt_handle}' from queue "
+        f"'{queue_name}' in region '{region_name}' to {visibility_timeout}"
+    )
+    get_sqs_client(region_name, endpoint_url=endpoint_url).change_message_visibility(
+        QueueUrl=get_queue_url(queue_name, region_name, endpoint_url=endpoint_url),
+        ReceiptHandle=receipt_handle,
+        VisibilityTimeout=visibility_timeout,
+    )
+
+
 def delete_msg_batch(
     receipt_handles: list[dict],
     queue_name: str,
@@ -159,3 +212,34 @@ def delete_msg_batch(
             return
 
     raise RuntimeError(f"Failed to delete messages: {ack}")  # pragma: no cover
+
+
+def change_msg_visibility_batch(
+    receipt_handles: list[dict],
+    queue_name: str,
+    region_name: str,
+    visibility_timeout: int,
+    endpoint_url: Optional[str] = None,
+    try_count: int = 5,
+) -> None:
+    assert len(receipt_handles) <= 10, "SQS only supports batch size <= 10"
+    entries_left = {str(k): v for k, v in enumerate(receipt_handles)}
+
+    for _ in range(try_count):
+        ack = get_sqs_client(
+            region_name, endpoint_url=endpoint_url
+        ).change_message_visibility_batch(
+            QueueUrl=get_queue_url(queue_name, region_name, endpoint_url=endpoint_url),
+            Entries=[
+                {"Id": k, "ReceiptHandle": v, "VisibilityTimeout": visibility_timeout}
+                for k, v in entries_left.items()
+            ],
+        )
+        if "Successful" in ack:
+            for k in ack["Successful"]:
+                del entries_left[k["Id"]]
+
+        if len(entries_left) == 0:
+            return
+
+    raise RuntimeError(f"Failed to change message visibility: {ack}")  # pragma: no cover
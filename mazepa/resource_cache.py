@@ -0,0 +1,130 @@
+from __future__ import annotations
+
+import time
+import atexit
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Hashable, Optional, TypeVar
+
+import attrs
+from zetta_utils.log import get_logger
+
+logger = get_logger("mazepa")
+
+V = TypeVar("V")
+
+
+@attrs.mutable
+class _CacheEntry:
+    value: Any
+    size: float
+    cleanup: Optional[Callable[[Any], None]]
+    expire_ts: Optional[float]
+
+
+@attrs.mutable
+class ResourceCache:
+    """
+    Keyed cache for expensive resources, such as volume handles, model weights or
+    database connections, that should be shared by all tasks executed by a worker.
+
+    Least recently used entries are evicted once the total size of the entries exceeds
+    ``max_size``, and entries expire ``ttl_sec`` seconds after creation. Cleanup hooks
+    are called on entries when they are evicted, expire, or when the cache is cleared
+    at worker shutdown.
+    """
+
+    max_size: Optional[float] = None
+    ttl_sec: Optional[float] = None
+    _entries: OrderedDict[Hashable, _CacheEntry] = attrs.field(init=False, factory=OrderedDict)
+    _total_size: float = attrs.field(init=False, default=0)
+    _lock: threading.RLock = attrs.field(init=False, factory=threading.RLock)
+
+    def get_or_create(
+        self,
+        key: Hashable,
+        factory: Callable[[], V],
+        size: float = 1,
+        cleanup: Optional[Callable[[V], None]] = None,
+        ttl_sec: Optional[float] = None,
+    ) -> V:
+        """
+        Return the resource cached under ``key``, creating it with ``factory`` if it
+        is missing or expired.
+
+        :param size: size of the resource counted against ``max_size``.
+        :param cleanup: called with the resource when it is removed from the cache.
+        :param ttl_sec: overrides the cache ``ttl_sec`` for this resource.
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry.expire_ts is not None and entry.expire_ts < time.time():
+                self.invalidate(key)
+                entry = None
+
+            if entry is None:
+                if ttl_sec is None:
+                    ttl_sec = self.ttl_sec
+                entry = _CacheEntry(
+                    value=factory(),
+                    size=size,
+                    cleanup=cleanup,
+                    expire_ts=None if ttl_sec is None else time.time() + ttl_sec,
+                )
+                self._entries[key] = entry
+                self._total_size += size
+                self._evict()
+            else:
+                self._entries.move_to_end(key)
+
+            return entry.value
+
+    def invalidate(self, key: Hashable):
+        """
+        Remove the resource cached under ``key``, if any, calling its cleanup hook.
+        """
+        with self._lock:
+            entry = self._entries.pop(key, None)
+            if entry is not None:
+                self._total_size -= entry.size
+                _run_cleanup(key, entry)
+
+    def clear(self):
+        """
+        Remove all cached resources, calling their cleanup hooks.
+        """
+        with self._lock:
+            while len(self._entries) > 0:
+                key, entry = self._entries.popitem(last=False)
+                _run_cleanup(key, entry)
+            self._total_size = 0
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._entries
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def _evict(self):
+        # The most recently added entry is kept even if it exceeds ``max_size`` on its own.
+        while (
+            self.max_size is not None
+            and self._total_size > self.max_size
+            and len(self._entries) > 1
+        ):
+            key, entry = self._entries.popitem(last=False)
+            self._total_size -= entry.size
+            logger.debug(f"Evicting '{key}' from worker cache.")
+            _run_cleanup(key, entry)
+
+
+def _run_cleanup(key: Hashable, entry: _CacheEntry):
+    if entry.cleanup is not None:
+        try:
+            entry.cleanup(entry.value)
+        except Exception as exc:  # pylint: disable=broad-except
+            logger.warning(f"Cleanup of worker cache entry '{key}' failed: {exc}")
+
+
+worker_cache = ResourceCache()
+atexit.register(worker_cache.clear)
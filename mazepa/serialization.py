@@ -1,12 +1,18 @@
 # import pickle
 import codecs
 import zlib
-import dill  # type: ignore
+
+# ``dill`` is imported on first use to keep ``import mazepa`` fast.
+# pylint: disable=import-outside-toplevel
 
 
 def serialize(obj):  # pragma: no cover
+    import dill  # type: ignore
+
     return codecs.encode(zlib.compress(dill.dumps(obj, protocol=4)), "base64").decode()
 
 
 def deserialize(s):  # pragma: no cover
+    import dill
+
     return dill.loads(zlib.decompress(codecs.decode(s.encode(), "base64")))
@@ -0,0 +1,216 @@
+from __future__ import annotations
+
+import heapq
+import json
+import random
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple, Union
+
+import attrs
+
+from .config import typechecked
+from .execute import execute
+from .execution_state import ExecutionState, InMemoryExecutionState
+from .flows import Flow
+from .tasks import Task, get_factory_key
+from .task_outcome import TaskOutcome, TaskStatus
+
+
+@attrs.mutable
+class SampledDurations:
+    """
+    Task duration model that samples durations of tasks of each task factory from
+    ``samples``, such as recorded ``TaskOutcome.execution_secs``. Tasks of factories
+    without samples take ``default_secs``.
+    """
+
+    samples: Dict[str, List[float]] = attrs.field(factory=dict)
+    default_secs: float = 1.0
+    seed: Optional[int] = 0
+    _rng: random.Random = attrs.field(init=False)
+
+    def __attrs_post_init__(self):
+        self._rng = random.Random(self.seed)
+
+    @classmethod
+    def from_duration_estimates(cls, path: str, **kwargs) -> SampledDurations:
+        """
+        Load per task factory durations saved by ``DurationEstimator``.
+        """
+        with open(path, encoding="utf-8") as f:
+            estimates = json.load(f)
+        return cls(samples={k: [v] for k, v in estimates.items()}, **kwargs)
+
+    def observe(self, task: Task, outcome: TaskOutcome):
+        key = get_factory_key(task)
+        if key is not None and outcome.execution_secs is not None:
+            self.samples.setdefault(key, []).append(outcome.execution_secs)
+
+    def __call__(self, task: Task) -> float:
+        key = get_factory_key(task)
+        if key is None or key not in self.samples:
+            return self.default_secs
+        return self._rng.choice(self.samples[key])
+
+
+@attrs.frozen
+class SimulationReport:
+    num_workers: int
+    num_tasks: int
+    makespan_secs: float
+    busy_worker_secs: float
+    # Periods during which no task was executing, such as waits on barriers
+    num_stalls: int
+    stall_secs: float
+
+    @property
+    def utilization(self) -> float:
+        if self.makespan_secs == 0:
+            return 0.0
+        return self.busy_worker_secs / (self.num_workers * self.makespan_secs)
+
+    def __str__(self) -> str:
+        return (
+            f"{self.num_workers} workers: {self.num_tasks} tasks in {self.makespan_secs:.1f} "
+            f"sec, {self.utilization:.1%} utilization, {self.num_stalls} stalls "
+            f"totalling {self.stall_secs:.1f} sec"
+        )
+
+
+@typechecked
+@attrs.mutable
+class SimulatedExecutionQueue:  # pylint: disable=too-many-instance-attributes
+    """
+    ``ExecutionQueue`` that simulates execution of tasks by ``num_workers`` workers in
+    virtual time. Pushed tasks become available to workers after ``queue_latency_sec``
+    and are started in the order they were pushed as workers free up, taking
+    ``duration_fn(task)`` seconds. Their outcomes arrive ``queue_latency_sec`` after
+    completion. Pulling outcomes takes ``batch_gap_sec`` of virtual time, and when no
+    outcomes have arrived, virtual time advances to the arrival of the next one.
+
+    Tasks are not run unless ``run_tasks`` is set, which is needed for flows that use
+    return values of their tasks.
+    """
+
+    num_workers: int
+    duration_fn: Callable[[Task], float] = attrs.field(factory=SampledDurations)
+    queue_latency_sec: float = 0.0
+    batch_gap_sec: float = 0.0
+    run_tasks: bool = False
+    name: str = "simulated_execution"
+    now_ts: float = attrs.field(init=False, default=0.0)
+    # Times at which every worker becomes free
+    _worker_free_ts: List[float] = attrs.field(init=False)
+    # Heap of (arrival time, push order, task id, outcome)
+    _pending_outcomes: List[Tuple[float, int, str, TaskOutcome]] = attrs.field(
+        init=False, factory=list
+    )
+    _busy_intervals: List[Tuple[float, float]] = attrs.field(init=False, factory=list)
+
+    def __attrs_post_init__(self):
+        if self.num_workers < 1:
+            raise ValueError("`num_workers` must be positive.")
+        self._worker_free_ts = [0.0] * self.num_workers
+
+    def purge(self):
+        self._pending_outcomes = []
+
+    def push_tasks(self, tasks: Iterable[Task]):
+        available_ts = self.now_ts + self.queue_latency_sec
+        for task in tasks:
+            duration = self.duration_fn(task)
+            start_ts = max(heapq.heappop(self._worker_free_ts), available_ts)
+            end_ts = start_ts + duration
+            heapq.heappush(self._worker_free_ts, end_ts)
+            self._busy_intervals.append((start_ts, end_ts))
+            if self.run_tasks:
+                task()
+                outcome = task.outcome
+                outcome.execution_secs = duration
+            else:
+                outcome = TaskOutcome(status=TaskStatus.SUCCEEDED, execution_secs=duration)
+            heapq.heappush(
+                self._pending_outcomes,
+                (
+                    end_ts + self.queue_latency_sec,
+                    len(self._busy_intervals),
+                    task.id_,
+                    outcome,
+                ),
+            )
+
+    def pull_task_outcomes(
+        self, max_num: int = 100000, max_time_sec: float = 2.5  # pylint: disable=unused-argument
+    ) -> Dict[str, TaskOutcome]:
+        self.now_ts += self.batch_gap_sec
+        if len(self._pending_outcomes) > 0:
+            self.now_ts = max(self.now_ts, self._pending_outcomes[0][0])
+        result = {}  # type: Dict[str, TaskOutcome]
+        while (
+            len(self._pending_outcomes) > 0
+            and self._pending_outcomes[0][0] <= self.now_ts
+            and len(result) < max_num
+        ):
+            _, _, task_id, outcome = heapq.heappop(self._pending_outcomes)
+            result[task_id] = outcome
+        return result
+
+    def pull_tasks(  # pylint: disable=no-self-use
+        self, max_num: int = 1  # pylint: disable=unused-argument
+    ) -> List[Task]:  # pragma: no cover
+        return []
+
+    def release_tasks(  # pylint: disable=no-self-use
+        self, tasks: Iterable[Task]  # pylint: disable=unused-argument
+    ):  # pragma: no cover
+        pass
+
+    def get_report(self) -> SimulationReport:
+        busy_secs = 0.0
+        stalls = []
+        busy_until_ts = 0.0
+        for start_ts, end_ts in sorted(self._busy_intervals):
+            busy_secs += end_ts - start_ts
+            if start_ts > busy_until_ts:
+                stalls.append(start_ts - busy_until_ts)
+            busy_until_ts = max(busy_until_ts, end_ts)
+        if self.now_ts > busy_until_ts:
+            stalls.append(self.now_ts - busy_until_ts)
+        return SimulationReport(
+            num_workers=self.num_workers,
+            num_tasks=len(self._busy_intervals),
+            makespan_secs=self.now_ts,
+            busy_worker_secs=busy_secs,
+            num_stalls=len(stalls),
+            stall_secs=sum(stalls),
+        )
+
+
+def simulate(
+    target: Union[Flow, Iterable[Flow], ExecutionState],
+    num_workers: int,
+    duration_fn: Optional[Callable[[Task], float]] = None,
+    max_batch_len: int = 10000,
+    state_constructor: Callable[..., ExecutionState] = InMemoryExecutionState,
+    **kwargs: Any,
+) -> SimulationReport:
+    """
+    Predict the execution of ``target`` by ``num_workers`` workers, driving the execution
+    state and flows the same way ``execute`` does, but against a
+    ``SimulatedExecutionQueue``. Flows are consumed by the simulation, so new flows
+    need to be made for each simulated number of workers.
+
+    :param duration_fn: model of task durations, by default every task takes one second.
+    :param kwargs: further arguments of ``SimulatedExecutionQueue``, such as
+        ``queue_latency_sec`` and ``batch_gap_sec``.
+    """
+    if duration_fn is None:
+        duration_fn = SampledDurations()
+    queue = SimulatedExecutionQueue(num_workers=num_workers, duration_fn=duration_fn, **kwargs)
+    execute(
+        target,
+        exec_queue=queue,
+        batch_gap_sleep_sec=0,
+        max_batch_len=max_batch_len,
+        state_constructor=state_constructor,
+    )
+    return queue.get_report()
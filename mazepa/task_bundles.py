@@ -0,0 +1,153 @@
+from __future__ import annotations
+
+import time
+import uuid
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+import attrs
+
+from .tasks import Task, run_task_fn, set_task_outcome
+from .task_outcome import TaskOutcome, TaskStatus, NOT_SUBMITTED_OUTCOME
+from .task_execution_env import TaskExecutionEnv
+
+
+@attrs.mutable
+class TaskBundle:  # pylint: disable=too-many-instance-attributes
+    """
+    A group of tasks with the same execution environment that is submitted and
+    executed as a single task. The outcome of the bundle holds the outcomes of all
+    member tasks, keyed by task id.
+    """
+
+    tasks: List[Task]
+    id_: str = attrs.field(factory=lambda: str(uuid.uuid1()))
+    task_execution_env: TaskExecutionEnv = attrs.field(factory=TaskExecutionEnv)
+    # Bundles are made of tasks that are ready for execution
+    upstream_ids: Tuple[str, ...] = attrs.field(init=False, default=())
+    trace_stamps: Optional[Dict[str, Any]] = attrs.field(init=False, default=None)
+    metrics: Optional[Dict[str, Any]] = attrs.field(init=False, default=None)
+    # Attempts are tracked by member tasks
+    attempt: int = attrs.field(init=False, default=0)
+
+    _mazepa_callbacks: list[Callable] = attrs.field(factory=list)
+    outcome: TaskOutcome = attrs.field(default=NOT_SUBMITTED_OUTCOME)
+
+    def set_up(self, *args, **kwargs):  # pragma: no cover
+        raise NotImplementedError()
+
+    def __call__(self) -> TaskOutcome[Dict[str, TaskOutcome]]:
+        self.set_outcome(self.run_fn())
+        return self.outcome
+
+    def run_fn(self) -> TaskOutcome[Dict[str, TaskOutcome]]:
+        """
+        Run all member tasks and return the bundle outcome without recording it.
+        """
+        time_start = time.time()
+        member_outcomes = {e.id_: run_task_fn(e) for e in self.tasks}
+        time_end = time.time()
+        return TaskOutcome(
+            status=TaskStatus.SUCCEEDED,
+            execution_secs=time_end - time_start,
+            return_value=member_outcomes,
+        )
+
+    def set_outcome(self, outcome: TaskOutcome):
+        """
+        Record the bundle outcome and the outcomes of member tasks, and notify callbacks.
+        If the bundle as a whole did not succeed, e.g. because it hit a time limit,
+        all members are given the bundle's status and exception.
+        """
+        if outcome.status == TaskStatus.SUCCEEDED:
+            member_outcomes = outcome.return_value
+            assert member_outcomes is not None
+            for e in self.tasks:
+                set_task_outcome(e, member_outcomes[e.id_])
+        else:
+            for e in self.tasks:
+                set_task_outcome(
+                    e,
+                    TaskOutcome(
+                        status=outcome.status,
+                        exception=outcome.exception,
+                        attempt=getattr(e, "attempt", 0),
+                    ),
+                )
+
+        self.outcome = outcome
+        for callback in self._mazepa_callbacks:
+            callback(task=self)
+
+    def depends_on(self, *upstream_ids: str) -> TaskBundle:  # pragma: no cover
+        raise NotImplementedError()
+
+    def split(self) -> Tuple[TaskBundle, TaskBundle]:
+        """
+        Split the bundle into two halves that keep the bundle's callbacks.
+        """
+        assert len(self.tasks) > 1
+        mid = len(self.tasks) // 2
+        return (
+            TaskBundle(
+                tasks=self.tasks[:mid],
+                task_execution_env=self.task_execution_env,
+                mazepa_callbacks=list(self._mazepa_callbacks),
+            ),
+            TaskBundle(
+                tasks=self.tasks[mid:],
+                task_execution_env=self.task_execution_env,
+                mazepa_callbacks=list(self._mazepa_callbacks),
+            ),
+        )
+
+
+def make_task_bundles(tasks: Iterable[Task], max_bundle_len: int) -> List[Task]:
+    """
+    Group tasks with equal execution environments into bundles of at most
+    ``max_bundle_len`` tasks. Groups of a single task are returned unbundled.
+    """
+    groups = []  # type: List[Tuple[TaskExecutionEnv, List[Task]]]
+    for task in tasks:
+        for env, group in groups:
+            if env == task.task_execution_env:
+                group.append(task)
+                break
+        else:
+            groups.append((task.task_execution_env, [task]))
+
+    result = []  # type: List[Task]
+    for env, group in groups:
+        for i in range(0, len(group), max_bundle_len):
+            chunk = group[i : i + max_bundle_len]
+            if len(chunk) == 1:
+                result.append(chunk[0])
+            else:
+                result.append(TaskBundle(tasks=chunk, task_execution_env=env))
+    return result
+
+
+@attrs.mutable
+class BundleSizer:
+    """
+    Picks bundle length so that a bundle takes about ``target_bundle_secs`` to execute,
+    based on a moving average of observed task execution times.
+    Until any execution times are observed, bundles of ``max_bundle_len`` are used.
+    """
+
+    max_bundle_len: int
+    target_bundle_secs: float = 10.0
+    smoothing: float = 0.05
+    avg_task_secs: Optional[float] = None
+
+    def observe(self, outcomes: Iterable[TaskOutcome[Any]]):
+        for e in outcomes:
+            if e.execution_secs is not None:
+                if self.avg_task_secs is None:
+                    self.avg_task_secs = e.execution_secs
+                else:
+                    self.avg_task_secs += self.smoothing * (e.execution_secs - self.avg_task_secs)
+
+    def get_bundle_len(self) -> int:
+        if self.avg_task_secs is None or self.avg_task_secs <= 0:
+            return self.max_bundle_len
+        return max(1, min(self.max_bundle_len, int(self.target_bundle_secs / self.avg_task_secs)))
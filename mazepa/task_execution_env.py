@@ -1,12 +1,17 @@
 from __future__ import annotations
 
-from typing import Optional
+from typing import Iterable, Optional
 import attrs
 
 
+def _to_tags(tags: Iterable[str]) -> set[str]:
+    # A typed converter lets mypy check tags passed as any iterable of strings
+    return set(tags)
+
+
 @attrs.mutable
 class TaskExecutionEnv:
-    tags: set[str] = attrs.field(factory=set, converter=set)
+    tags: set[str] = attrs.field(factory=set, converter=_to_tags)
     docker_image: Optional[str] = None
 
     def extend(self, other: TaskExecutionEnv):
@@ -14,3 +19,7 @@ class TaskExecutionEnv:
 
     def apply_defaults(self, other: TaskExecutionEnv):
         raise NotImplementedError  # pragma: no cover
+
+
+# Shared by all tasks created without an explicit environment, should not be modified.
+DEFAULT_TASK_EXECUTION_ENV = TaskExecutionEnv()
@@ -0,0 +1,249 @@
+from __future__ import annotations
+
+import os
+import time
+import signal
+import resource
+import threading
+import multiprocessing
+from multiprocessing.connection import Connection
+from typing import Any, Optional
+
+import attrs
+from zetta_utils.log import get_logger
+
+from . import serialization
+from .resource_cache import worker_cache
+from .tasks import Task, run_task_fn, set_task_outcome
+from .task_outcome import TaskOutcome, TaskStatus
+
+logger = get_logger("mazepa")
+
+
+class TaskTimeoutError(Exception):
+    """
+    Task exceeded its wall-clock or CPU time limit.
+    """
+
+
+class TaskMemoryLimitError(Exception):
+    """
+    Task exceeded its memory limit or was killed by the OOM killer.
+    """
+
+
+def _get_rss_bytes(pid: Optional[int]) -> Optional[int]:
+    if pid is None:  # pragma: no cover
+        return None
+    try:
+        with open(f"/proc/{pid}/statm", encoding="ascii") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):  # pragma: no cover # process exited, or not Linux
+        return None
+
+
+def _set_cpu_limit(max_cpu_sec: Optional[float]):
+    _, hard = resource.getrlimit(resource.RLIMIT_CPU)
+    if max_cpu_sec is None:
+        resource.setrlimit(resource.RLIMIT_CPU, (hard, hard))
+    else:
+        # RLIMIT_CPU counts the whole process lifetime, so the limit is moved
+        # forward by the CPU time already used by previous tasks.
+        usage = resource.getrusage(resource.RUSAGE_SELF)
+        soft = int(usage.ru_utime + usage.ru_stime + max_cpu_sec) + 1
+        if hard != resource.RLIM_INFINITY:
+            soft = min(soft, hard)
+        resource.setrlimit(resource.RLIMIT_CPU, (soft, hard))
+
+
+def _child_main(conn: Connection, max_cpu_sec: Optional[float]):  # pragma: no cover # subprocess
+    conn.send(None)  # ready
+    while True:
+        try:
+            task = serialization.deserialize(conn.recv())
+        except EOFError:
+            worker_cache.clear()
+            return
+        _set_cpu_limit(max_cpu_sec)
+        outcome = run_task_fn(task)
+        try:
+            outcome_ser = serialization.serialize(outcome)
+        except Exception as exc:  # pylint: disable=broad-except
+            outcome_ser = serialization.serialize(
+                TaskOutcome[Any](
+                    status=TaskStatus.FAILED,
+                    exception=RuntimeError(
+                        f"Unable to serialize outcome of task {task.id_}: {exc}"
+                    ),
+                    execution_secs=outcome.execution_secs,
+                )
+            )
+        conn.send(outcome_ser)
+
+
+@attrs.mutable
+class IsolatedTaskRunner:
+    """
+    Executes tasks in a child process with resource limits, so that hung or
+    leaky tasks cannot take down the worker. The child process is kept warm and reused
+    across tasks, and is replaced after it gets killed, after ``max_tasks_per_child``
+    tasks or when its resident memory stays above ``max_rss_bytes`` between tasks.
+
+    Tasks that exceed ``timeout_sec`` of wall-clock time or ``max_cpu_sec`` of CPU time
+    get the ``TIMED_OUT`` status. Tasks that exceed ``max_rss_bytes`` of resident memory
+    or are killed by the OOM killer get the ``OUT_OF_MEMORY`` status.
+    Task callbacks are run in the parent process.
+    """
+
+    timeout_sec: Optional[float] = None
+    max_rss_bytes: Optional[int] = None
+    max_cpu_sec: Optional[float] = None
+    max_tasks_per_child: Optional[int] = None
+    poll_interval_sec: float = 0.1
+    _process: Optional[multiprocessing.process.BaseProcess] = attrs.field(init=False, default=None)
+    _conn: Optional[Connection] = attrs.field(init=False, default=None)
+    _child_task_count: int = attrs.field(init=False, default=0)
+
+    def start(self):
+        """
+        Start the child process ahead of the first task. The child is forked when the
+        calling process has no other threads, and started from a fork server otherwise,
+        as locks held by other threads at the time of a fork stay locked in the child.
+        """
+        if self._process is None:
+            if threading.active_count() == 1:
+                ctx = multiprocessing.get_context("fork")
+            else:
+                ctx = multiprocessing.get_context("forkserver")
+                ctx.set_forkserver_preload([__name__])
+            self._conn, child_conn = ctx.Pipe()
+            self._process = ctx.Process(
+                target=_child_main,
+                args=(child_conn, self.max_cpu_sec),
+                name="mazepa_task_runner",
+                daemon=True,
+            )
+            self._process.start()
+            child_conn.close()
+            # Children started from a fork server need to import modules first, which
+            # should not count towards the time limit of the first task
+            self._conn.recv()
+            self._child_task_count = 0
+            logger.debug(f"Started task runner process {self._process.pid}.")
+
+    def shutdown(self):
+        """
+        Stop the child process, if one is running.
+        """
+        if self._process is not None:
+            assert self._conn is not None
+            self._conn.close()
+            self._process.join(timeout=self.poll_interval_sec)
+            self._discard_child()
+
+    def __call__(self, task: Task) -> TaskOutcome:
+        """
+        Execute the task in the child process and record its outcome on the task.
+        """
+        outcome = self._run_in_child(task)
+        set_task_outcome(task, outcome)
+        return outcome
+
+    def _run_in_child(self, task: Task) -> TaskOutcome:
+        self.start()
+        assert self._process is not None and self._conn is not None
+
+        time_start = time.time()
+        self._conn.send(serialization.serialize(task))
+        self._child_task_count += 1
+
+        while True:
+            if self._conn.poll(self.poll_interval_sec):
+                try:
+                    outcome = serialization.deserialize(self._conn.recv())
+                except EOFError:
+                    return self._on_child_death(task, time_start)
+                self._maybe_recycle()
+                return outcome
+
+            if not self._process.is_alive():
+                return self._on_child_death(task, time_start)
+
+            elapsed = time.time() - time_start
+            if self.timeout_sec is not None and elapsed > self.timeout_sec:
+                self._kill()
+                return TaskOutcome(
+                    status=TaskStatus.TIMED_OUT,
+                    exception=TaskTimeoutError(
+                        f"Task {task.id_} exceeded the time limit of {self.timeout_sec} secs."
+                    ),
+                    execution_secs=elapsed,
+                )
+            if self.max_rss_bytes is not None:
+                rss = _get_rss_bytes(self._process.pid)
+                if rss is not None and rss > self.max_rss_bytes:
+                    self._kill()
+                    return TaskOutcome(
+                        status=TaskStatus.OUT_OF_MEMORY,
+                        exception=TaskMemoryLimitError(
+                            f"Task {task.id_} exceeded the memory limit of "
+                            f"{self.max_rss_bytes} bytes."
+                        ),
+                        execution_secs=elapsed,
+                    )
+
+    def _on_child_death(self, task: Task, time_start: float) -> TaskOutcome:
+        assert self._process is not None
+        self._process.join()
+        exitcode = self._process.exitcode
+        self._discard_child()
+
+        elapsed = time.time() - time_start
+        if exitcode == -signal.SIGXCPU:
+            return TaskOutcome(
+                status=TaskStatus.TIMED_OUT,
+                exception=TaskTimeoutError(
+                    f"Task {task.id_} exceeded the CPU time limit of {self.max_cpu_sec} secs."
+                ),
+                execution_secs=elapsed,
+            )
+        if exitcode == -signal.SIGKILL:
+            return TaskOutcome(
+                status=TaskStatus.OUT_OF_MEMORY,
+                exception=TaskMemoryLimitError(
+                    f"Task {task.id_} process was killed, likely by the OOM killer."
+                ),
+                execution_secs=elapsed,
+            )
+        return TaskOutcome(
+            status=TaskStatus.FAILED,
+            exception=RuntimeError(f"Task {task.id_} process exited with code {exitcode}."),
+            execution_secs=elapsed,
+        )
+
+    def _maybe_recycle(self):
+        assert self._process is not None
+        if (
+            self.max_tasks_per_child is not None
+            and self._child_task_count >= self.max_tasks_per_child
+        ):
+            self.shutdown()
+        elif self.max_rss_bytes is not None:
+            rss = _get_rss_bytes(self._process.pid)
+            if rss is not None and rss > self.max_rss_bytes:
+                logger.info(f"Replacing task runner process {self._process.pid} due to RSS.")
+                self.shutdown()
+
+    def _kill(self):
+        assert self._process is not None
+        logger.warning(f"Killing task runner process {self._process.pid}.")
+        self._discard_child()
+
+    def _discard_child(self):
+        assert self._process is not None and self._conn is not None
+        if self._process.is_alive():
+            self._process.kill()
+            self._process.join()
+        self._conn.close()
+        self._process = None
+        self._conn = None
@@ -0,0 +1,124 @@
+from __future__ import annotations
+
+import resource
+import sys
+import time
+from collections import defaultdict
+from typing import Any, Dict, List, Optional, Tuple
+
+import attrs
+
+from .task_outcome import TaskOutcome
+
+# ``ru_maxrss`` is reported in kilobytes on Linux and in bytes on macOS
+_MAXRSS_UNIT_BYTES = 1 if sys.platform == "darwin" else 1024
+
+
+def _read_proc_io() -> Optional[Tuple[int, int]]:
+    try:
+        with open("/proc/self/io", encoding="utf-8") as f:
+            fields = dict(line.split(":") for line in f if ":" in line)
+        return int(fields["read_bytes"]), int(fields["write_bytes"])
+    except (OSError, KeyError, ValueError):  # pragma: no cover # not Linux
+        return None
+
+
+@attrs.frozen
+class ResourceSnapshot:
+    """
+    Resource usage of the current process at a point in time.
+    """
+
+    cpu_secs: float
+    max_rss_bytes: int
+    io_bytes: Optional[Tuple[int, int]]
+
+    @classmethod
+    def take(cls) -> ResourceSnapshot:
+        return cls(
+            cpu_secs=time.process_time(),
+            max_rss_bytes=resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * _MAXRSS_UNIT_BYTES,
+            io_bytes=_read_proc_io(),
+        )
+
+    def get_usage_since(self, start: ResourceSnapshot) -> Dict[str, float]:
+        """
+        Resource usage between ``start`` and this snapshot. ``peak_rss_delta_bytes`` is
+        the growth of the process peak RSS, so it is zero for work that stays within the
+        memory previously used by the process. I/O bytes are only available on Linux.
+        """
+        result = {
+            "cpu_secs": self.cpu_secs - start.cpu_secs,
+            "peak_rss_delta_bytes": float(self.max_rss_bytes - start.max_rss_bytes),
+        }
+        if self.io_bytes is not None and start.io_bytes is not None:
+            result["read_bytes"] = float(self.io_bytes[0] - start.io_bytes[0])
+            result["write_bytes"] = float(self.io_bytes[1] - start.io_bytes[1])
+        return result
+
+
+# (metric, column title, aggregation, scale) of the summary table
+_SUMMARY_COLUMNS: List[Tuple[str, str, str, float]] = [
+    ("execution_secs", "wall s", "mean", 1.0),
+    ("cpu_secs", "cpu s", "mean", 1.0),
+    ("peak_rss_delta_bytes", "max rss+ MiB", "max", 2**20),
+    ("read_bytes", "read MiB", "sum", 2**20),
+    ("write_bytes", "write MiB", "sum", 2**20),
+    ("task_bytes", "task KiB", "mean", 2**10),
+    ("outcome_bytes", "outcome KiB", "mean", 2**10),
+]
+
+
+@attrs.mutable
+class MetricsSummary:
+    """
+    Aggregates task metrics reported in ``TaskOutcome.metrics`` per task factory.
+    """
+
+    counts: Dict[str, int] = attrs.field(factory=lambda: defaultdict(int))
+    sums: Dict[str, Dict[str, float]] = attrs.field(
+        factory=lambda: defaultdict(lambda: defaultdict(float))
+    )
+    maxes: Dict[str, Dict[str, float]] = attrs.field(
+        factory=lambda: defaultdict(lambda: defaultdict(float))
+    )
+
+    def add(self, outcome: TaskOutcome[Any]):
+        if outcome.metrics is None:
+            return
+        factory = str(outcome.metrics.get("factory"))
+        self.counts[factory] += 1
+        values = dict(outcome.metrics)
+        if outcome.execution_secs is not None:
+            values["execution_secs"] = outcome.execution_secs
+        for k, v in values.items():
+            if isinstance(v, (int, float)):
+                self.sums[factory][k] += v
+                self.maxes[factory][k] = max(self.maxes[factory][k], v)
+
+    def get_value(self, factory: str, metric: str, aggregation: str) -> Optional[float]:
+        if metric not in self.sums[factory]:
+            return None
+        if aggregation == "sum":
+            return self.sums[factory][metric]
+        if aggregation == "max":
+            return self.maxes[factory][metric]
+        return self.sums[factory][metric] / self.counts[factory]
+
+    def format_table(self) -> str:
+        header = ["factory", "count"] + [e[1] for e in _SUMMARY_COLUMNS]
+        rows = [header]
+        for factory in sorted(self.counts, key=lambda e: -self.sums[e]["execution_secs"]):
+            row = [factory, str(self.counts[factory])]
+            for metric, _, aggregation, scale in _SUMMARY_COLUMNS:
+                value = self.get_value(factory, metric, aggregation)
+                row.append("-" if value is None else f"{value / scale:.3f}")
+            rows.append(row)
+        widths = [max(len(row[i]) for row in rows) for i in range(len(header))]
+        return "\n".join(
+            "  ".join(
+                cell.ljust(width) if i == 0 else cell.rjust(width)
+                for i, (cell, width) in enumerate(zip(row, widths))
+            )
+            for row in rows
+        )
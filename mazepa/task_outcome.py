@@ -1,4 +1,4 @@
-from typing import Optional, TypeVar, Generic
+from typing import Any, Dict, Optional, TypeVar, Generic
 from enum import Enum, unique, auto
 import attrs
 
@@ -9,14 +9,37 @@ class TaskStatus(Enum):
     SUBMITTED = auto()
     SUCCEEDED = auto()
     FAILED = auto()
+    TIMED_OUT = auto()
+    OUT_OF_MEMORY = auto()
 
 
 R_co = TypeVar("R_co", covariant=True)
 
 
-@attrs.mutable
+@attrs.mutable(weakref_slot=False)
 class TaskOutcome(Generic[R_co]):
     status: TaskStatus
     exception: Optional[Exception] = None
     execution_secs: Optional[float] = None
     return_value: Optional[R_co] = None
+    # Lifecycle stamps recorded by the worker for traced tasks
+    trace_stamps: Optional[Dict[str, Any]] = None
+    # Resource usage of the task, reported when metrics collection is enabled
+    metrics: Optional[Dict[str, Any]] = None
+    # Attempt of the task that produced the outcome, incremented on every resubmission
+    attempt: int = 0
+
+
+def is_preferred_outcome(outcome: TaskOutcome, other: TaskOutcome) -> bool:
+    """
+    Whether ``outcome`` should be kept over ``other`` when both are reported for the
+    same task. Successful outcomes are preferred, followed by outcomes of later attempts.
+    """
+    return (outcome.status == TaskStatus.SUCCEEDED, outcome.attempt) > (
+        other.status == TaskStatus.SUCCEEDED,
+        other.attempt,
+    )
+
+
+# Shared by all tasks that haven't been submitted, should not be modified.
+NOT_SUBMITTED_OUTCOME: TaskOutcome = TaskOutcome(status=TaskStatus.NOT_SUBMITTED)
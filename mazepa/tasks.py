@@ -1,29 +1,54 @@
 from __future__ import annotations
 
+import os
+import socket
 import time
 import uuid
 from typing import (
+    Any,
     Callable,
     TypeVar,
     Generic,
     Iterable,
     Dict,
+    List,
+    Optional,
     Protocol,
+    Tuple,
     Type,
+    Union,
+    overload,
     runtime_checkable,
 )
-import functools
 from typing_extensions import ParamSpec
 import attrs
 from . import id_generators
-from .task_outcome import TaskOutcome, TaskStatus
-from .task_execution_env import TaskExecutionEnv
+from .task_outcome import TaskOutcome, TaskStatus, NOT_SUBMITTED_OUTCOME
+from .task_execution_env import TaskExecutionEnv, DEFAULT_TASK_EXECUTION_ENV
+from .task_metrics import ResourceSnapshot
 
 R_co = TypeVar("R_co", covariant=True)
 P = ParamSpec("P")
 P1 = ParamSpec("P1")
 
 
+def get_worker_name() -> str:
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+def get_factory_key(task: Task) -> Optional[str]:
+    """
+    Name of the function or callable class executed by ``task``, shared by all tasks
+    made by the same task factory. ``None`` for tasks that don't wrap a single callable.
+    """
+    fn = getattr(task, "fn", None)
+    if fn is None:
+        return None
+    if not hasattr(fn, "__qualname__"):
+        fn = type(fn)
+    return f"{fn.__module__}.{fn.__qualname__}"
+
+
 @runtime_checkable
 class Task(Protocol[P, R_co]):  # pragma: no cover # protocol
     """
@@ -43,41 +68,75 @@ class Task(Protocol[P, R_co]):  # pragma: no cover # protocol
         ...
 
 
-@attrs.mutable
-class _Task(Generic[P, R_co]):
+@attrs.mutable(weakref_slot=False)
+class _Task(Generic[P, R_co]):  # pylint: disable=too-many-instance-attributes
     """
     An executable task.
     """
 
     fn: Callable[P, R_co]
     id_: str = attrs.field(factory=lambda: str(uuid.uuid1()))
-    task_execution_env: TaskExecutionEnv = attrs.field(factory=TaskExecutionEnv)
+    # Execution environments are shared between tasks and should not be modified in place.
+    task_execution_env: TaskExecutionEnv = attrs.field(default=DEFAULT_TASK_EXECUTION_ENV)
     args_are_set: bool = attrs.field(init=False, default=False)
-    args: Iterable = attrs.field(init=False, factory=list)
+    args: Iterable = attrs.field(init=False, default=())
     kwargs: Dict = attrs.field(init=False, factory=dict)
+    # Ids of tasks or flows that must complete before this task is submitted
+    upstream_ids: Tuple[str, ...] = attrs.field(init=False, default=())
+    # Lifecycle stamps, only set for tasks traced by ``mazepa.tracing``
+    trace_stamps: Optional[Dict[str, Any]] = attrs.field(init=False, default=None)
+    # Resource metrics, only collected when set to a dict before the task is run
+    metrics: Optional[Dict[str, Any]] = attrs.field(init=False, default=None)
+    # Number of times the task was resubmitted, reported in its outcome for deduplication
+    attempt: int = attrs.field(init=False, default=0)
 
-    _mazepa_callbacks: list[Callable] = attrs.field(factory=list)
-    outcome: TaskOutcome = attrs.field(
-        factory=functools.partial(
-            TaskOutcome,
-            status=TaskStatus.NOT_SUBMITTED,
-        )
-    )
+    # Most tasks never get callbacks, so the list is created on first access.
+    _callbacks: Optional[List[Callable]] = attrs.field(init=False, default=None)
+    outcome: TaskOutcome = attrs.field(default=NOT_SUBMITTED_OUTCOME)
     # cache_expiration: datetime.timedelta = None
     # max_retry: # Can use SQS approximateReceiveCount to explicitly fail the task
 
     # Split into __init__ and set_up because ParamSpec doesn't allow us
     # to play with kwargs.
     # cc: https://peps.python.org/pep-0612/#concatenating-keyword-parameters
+    @property
+    def _mazepa_callbacks(self) -> List[Callable]:
+        if self._callbacks is None:
+            self._callbacks = []
+        return self._callbacks
+
+    @_mazepa_callbacks.setter
+    def _mazepa_callbacks(self, value: List[Callable]):
+        self._callbacks = value
+
     def set_up(self, *args: P.args, **kwargs: P.kwargs):
         assert not self.args_are_set
         self.args = args
         self.kwargs = kwargs
         self.args_are_set = True
 
+    def depends_on(self, *upstream_ids: str) -> _Task[P, R_co]:
+        """
+        Declare that the task can only be submitted after the tasks or flows with the
+        given ids complete. Unlike a ``Dependency`` yielded by a flow, this only holds back
+        this task, and the ids may belong to any task or flow seen earlier in the execution,
+        including ones in sibling flows.
+        """
+        self.upstream_ids = self.upstream_ids + upstream_ids
+        return self
+
     def __call__(self) -> TaskOutcome[R_co]:
+        self.set_outcome(self.run_fn())
+        return self.outcome
+
+    def run_fn(self) -> TaskOutcome[R_co]:
+        """
+        Run the task function and return its outcome without recording it
+        on the task or notifying callbacks.
+        """
         assert self.args_are_set
 
+        snapshot_start = None if self.metrics is None else ResourceSnapshot.take()
         time_start = time.time()
         try:
             # TODO: parametrize by task execution environment
@@ -92,15 +151,57 @@ class _Task(Generic[P, R_co]):
 
         time_end = time.time()
 
-        self.outcome = TaskOutcome(
+        metrics = None
+        if snapshot_start is not None and self.metrics is not None:
+            metrics = dict(self.metrics)
+            metrics.update(ResourceSnapshot.take().get_usage_since(snapshot_start))
+            metrics["factory"] = get_factory_key(self)
+
+        return TaskOutcome(
             status=status,
             exception=exception,
             execution_secs=time_end - time_start,
             return_value=return_value,
+            trace_stamps=None
+            if self.trace_stamps is None
+            else {"exec_start": time_start, "exec_end": time_end, "worker": get_worker_name()},
+            metrics=metrics,
+            attempt=self.attempt,
         )
-        for callback in self._mazepa_callbacks:
-            callback(task=self)
-        return self.outcome
+
+    def set_outcome(self, outcome: TaskOutcome[R_co]):
+        """
+        Record the outcome of the task and notify callbacks.
+        """
+        self.outcome = outcome
+        if self._callbacks is not None:
+            for callback in self._callbacks:
+                callback(task=self)
+
+
+def run_task_fn(task: Task) -> TaskOutcome:
+    """
+    Run ``task`` and return its outcome without recording it, for tasks that implement
+    ``run_fn``. Other tasks are called, which records the outcome as well.
+    """
+    run_fn = getattr(task, "run_fn", None)
+    if run_fn is None:
+        return task()
+    return run_fn()
+
+
+def set_task_outcome(task: Task, outcome: TaskOutcome):
+    """
+    Record ``outcome`` on ``task`` and notify its callbacks, through ``set_outcome``
+    for tasks that implement it.
+    """
+    set_outcome = getattr(task, "set_outcome", None)
+    if set_outcome is not None:
+        set_outcome(outcome)
+    else:
+        task.outcome = outcome
+        for callback in task._mazepa_callbacks:  # pylint: disable=protected-access
+            callback(task=task)
 
 
 @runtime_checkable
@@ -125,6 +226,13 @@ class TaskFactory(Protocol[P, R_co]):  # pragma: no cover # protocol
     ) -> Task[P, R_co]:
         ...
 
+    # Return types use ``Any`` as ``List`` is invariant in the covariant ``R_co``
+    def make_tasks(self, kwargs_iterable: Iterable[Dict[str, Any]]) -> List[Task[P, Any]]:
+        ...
+
+    def map(self, **columns: Iterable) -> List[Task[P, Any]]:
+        ...
+
 
 @attrs.mutable
 class _TaskFactory(Generic[P, R_co]):
@@ -154,22 +262,105 @@ class _TaskFactory(Generic[P, R_co]):
         result.set_up(*args, **kwargs)  # pylint: disable=protected-access # friend class
         return result
 
+    def make_tasks(self, kwargs_iterable: Iterable[Dict[str, Any]]) -> List[Task[P, R_co]]:
+        """
+        Create a task for each of the given keyword argument dicts. Ids are generated
+        for the whole batch at once, and all tasks share the factory's execution environment.
+        """
+        kwargs_list = list(kwargs_iterable)
+        ids = id_generators.get_batch_id_fn(self.id_fn)(self.fn, kwargs_list)
+        result = []  # type: List[Task[P, R_co]]
+        for id_, kwargs in zip(ids, kwargs_list):
+            # Unsubscripted constructor avoids per-instance generic alias overhead
+            task = _Task(fn=self.fn, id_=id_, task_execution_env=self.task_execution_env)
+            task.set_up(**kwargs)
+            result.append(task)
+        return result
+
+    def map(self, **columns: Iterable) -> List[Task[P, R_co]]:
+        """
+        Create tasks from column-wise keyword arguments, where the i-th task
+        gets the i-th element of every column. All columns must be of the same length.
+        """
+        names = list(columns.keys())
+        values = [list(e) for e in columns.values()]
+        lengths = {k: len(v) for k, v in zip(names, values)}
+        if len(set(lengths.values())) > 1:
+            raise ValueError(f"Columns passed to `map` must be of the same length, got {lengths}.")
+        return self.make_tasks(dict(zip(names, e)) for e in zip(*values))
 
+
+@overload
 def task_factory(fn: Callable[P, R_co]) -> TaskFactory[P, R_co]:
-    return _TaskFactory(fn=fn)
+    ...
+
+
+@overload
+def task_factory(
+    *, id_fn: Callable[[Callable, dict], str] = ...
+) -> Callable[[Callable[P, R_co]], TaskFactory[P, R_co]]:
+    ...
+
+
+def task_factory(
+    fn: Optional[Callable[P, R_co]] = None,
+    *,
+    id_fn: Callable[[Callable, dict], str] = id_generators.get_unique_id,
+) -> Union[TaskFactory[P, R_co], Callable[[Callable[P, R_co]], TaskFactory[P, R_co]]]:
+    """
+    Decorator for functions defining mazepa tasks. Can be used either bare or
+    with arguments, e.g. ``@task_factory(id_fn=id_generators.get_content_id)``.
+
+    :param id_fn: generates task ids from the function and its keyword arguments.
+    """
+
+    def _decorate(fn_: Callable[P, R_co]) -> TaskFactory[P, R_co]:
+        return _TaskFactory(fn=fn_, id_fn=id_fn)
+
+    if fn is None:
+        return _decorate
+    return _decorate(fn)
+
+
+@overload
+def task_factory_cls(cls: Type[Callable[P, R_co]]) -> Any:
+    ...
+
+
+@overload
+def task_factory_cls(*, id_fn: Callable[[Callable, dict], str] = ...) -> Callable[[Type], Any]:
+    ...
 
 
 def task_factory_cls(
-    cls: Type[Callable[P, R_co]],
-) -> Type[Callable[P, R_co]]:
+    cls: Optional[Type] = None,
+    *,
+    id_fn: Callable[[Callable, dict], str] = id_generators.get_unique_id,
+) -> Any:  # rely on mypy plugin to do this properly
     def _make_task(self, *args, **kwargs):
         return _TaskFactory(  # pylint: disable=protected-access
             self,
+            id_fn=id_fn,
             # TODO: Other params passed to decorator
         ).make_task(
             *args, **kwargs
         )  # pylint: disable=protected-access
 
-    # can't override __new__ because it doesn't combine well with attrs/dataclass
-    setattr(cls, "make_task", _make_task)
-    return cls
+    def _make_tasks(self, kwargs_iterable):
+        return _TaskFactory(self, id_fn=id_fn).make_tasks(  # pylint: disable=protected-access
+            kwargs_iterable
+        )
+
+    def _map(self, **columns):
+        return _TaskFactory(self, id_fn=id_fn).map(**columns)  # pylint: disable=protected-access
+
+    def _decorate(cls_: Type) -> Type:
+        # can't override __new__ because it doesn't combine well with attrs/dataclass
+        setattr(cls_, "make_task", _make_task)
+        setattr(cls_, "make_tasks", _make_tasks)
+        setattr(cls_, "map", _map)
+        return cls_
+
+    if cls is None:
+        return _decorate
+    return _decorate(cls)
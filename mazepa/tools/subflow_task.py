@@ -1,5 +1,6 @@
-from typing import Generic
+from typing import Generic, Optional
 from typing_extensions import ParamSpec
+import attrs
 from .. import task_factory_cls
 from .. import Flow, Executor
 
@@ -7,9 +8,21 @@ P = ParamSpec("P")
 
 
 @task_factory_cls
+@attrs.mutable
 class SubflowTask(Generic[P]):
+    """
+    Task that executes a subflow with its own executor. Unless the executor has an
+    explicitly requested execution queue, ``InMemoryExecutionState`` splices the subflow
+    into the parent execution instead of blocking a worker on it.
+    """
+
     subflow: Flow[P]
-    executor: Executor
+    executor: Executor = attrs.field(factory=Executor)
 
     def __call__(self, *args: P.args, **kwargs: P.kwargs) -> None:  # pragma: no cover
         self.executor(self.subflow)
+
+    def get_inline_flow(self) -> Optional[Flow[P]]:
+        if self.executor.exec_queue is None:
+            return self.subflow
+        return None
@@ -0,0 +1,191 @@
+from __future__ import annotations
+
+import json
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+import attrs
+
+from .tasks import Task, get_factory_key
+from .task_outcome import TaskOutcome
+
+# Consecutive stamps of a task lifecycle, each pair forming a span in the exported trace.
+TASK_SPANS: List[Tuple[str, str, str]] = [
+    ("generated", "pushed", "submission"),
+    ("pushed", "exec_start", "queue_wait"),
+    ("exec_start", "exec_end", "execution"),
+    ("exec_end", "outcome_sent", "outcome_reporting"),
+    ("outcome_sent", "outcome_received", "outcome_transit"),
+    ("outcome_received", "state_updated", "state_update"),
+]
+
+
+@attrs.mutable
+class Tracer:
+    """
+    Collects timestamps of task lifecycle stages and of executor activity, and exports
+    them as a Chrome trace that can be viewed in ``chrome://tracing`` or Perfetto.
+
+    Tasks stamped by an active tracer carry their stamps in ``trace_stamps`` to the
+    worker, which records execution stamps in ``TaskOutcome.trace_stamps``. Stamps of
+    tasks without ``trace_stamps`` are kept by the tracer, and such tasks get no
+    execution stamps.
+    """
+
+    task_records: List[Dict[str, Any]] = attrs.field(factory=list)
+    executor_spans: List[Tuple[str, float, float]] = attrs.field(factory=list)
+    _untraced_task_stamps: Dict[str, Dict[str, Any]] = attrs.field(init=False, factory=dict)
+
+    def stamp(self, task: Task, stage: str, **info):
+        if not hasattr(task, "trace_stamps"):
+            stamps = self._untraced_task_stamps.setdefault(task.id_, {})
+        else:
+            if getattr(task, "trace_stamps") is None:
+                setattr(task, "trace_stamps", {})
+            stamps = getattr(task, "trace_stamps")
+        stamps[stage] = time.time()
+        stamps.update(info)
+
+    def record(self, task: Task, outcome: TaskOutcome, **stamps: float):
+        """
+        Record the complete lifecycle of ``task``, combining the stamps made in the
+        executor, by the worker, and the given final ``stamps``.
+        """
+        if hasattr(task, "trace_stamps"):
+            record = dict(getattr(task, "trace_stamps") or {})
+        else:
+            record = self._untraced_task_stamps.pop(task.id_, {})
+        if outcome.trace_stamps is not None:
+            record.update(outcome.trace_stamps)
+        record.update(stamps)
+        record["task_id"] = task.id_
+        record["name"] = get_factory_key(task)
+        self.task_records.append(record)
+
+    def add_executor_span(self, name: str, start_ts: float, end_ts: float):
+        self.executor_spans.append((name, start_ts, end_ts))
+
+    def to_chrome_trace(self) -> Dict[str, Any]:
+        """
+        Executor activity is shown in the ``executor`` process, task lifecycle spans are
+        grouped by flow in the ``tasks`` process, and task executions are shown in a
+        separate process for every worker.
+        """
+        all_ts = [e[1] for e in self.executor_spans] + [
+            v for e in self.task_records for k, v in e.items() if k in _STAGES
+        ]
+        origin_ts = min(all_ts, default=0.0)
+
+        def _us(ts: float) -> float:
+            return (ts - origin_ts) * 1e6
+
+        events = [
+            {"name": "process_name", "ph": "M", "pid": 0, "args": {"name": "executor"}},
+            {"name": "process_name", "ph": "M", "pid": 1, "args": {"name": "tasks"}},
+        ]  # type: List[Dict[str, Any]]
+        for name, start_ts, end_ts in self.executor_spans:
+            events.append(
+                {
+                    "name": name,
+                    "ph": "X",
+                    "pid": 0,
+                    "tid": 0,
+                    "ts": _us(start_ts),
+                    "dur": _us(end_ts) - _us(start_ts),
+                }
+            )
+
+        worker_pids = {}  # type: Dict[str, int]
+        for record in self.task_records:
+            events.extend(_get_task_events(record, _us, worker_pids))
+
+        return {"traceEvents": events, "displayTimeUnit": "ms"}
+
+    def export(self, path: str):
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(self.to_chrome_trace(), f)
+
+
+_STAGES = {e for span in TASK_SPANS for e in span[:2]}
+
+
+def _get_task_events(
+    record: Dict[str, Any], to_us: Callable[[float], float], worker_pids: Dict[str, int]
+) -> List[Dict[str, Any]]:
+    result = []  # type: List[Dict[str, Any]]
+    args = {"task_id": record["task_id"], "flow_id": record.get("flow_id")}
+    for start_stage, end_stage, span_name in TASK_SPANS:
+        if start_stage in record and end_stage in record:
+            for phase, stage in (("b", start_stage), ("e", end_stage)):
+                result.append(
+                    {
+                        "name": span_name,
+                        "cat": str(record.get("flow_id")),
+                        "ph": phase,
+                        "id": record["task_id"],
+                        "pid": 1,
+                        "ts": to_us(record[stage]),
+                        "args": args,
+                    }
+                )
+
+    if "exec_start" in record and "exec_end" in record:
+        worker = record.get("worker", "unknown")
+        if worker not in worker_pids:
+            worker_pids[worker] = len(worker_pids) + 2
+            result.append(
+                {
+                    "name": "process_name",
+                    "ph": "M",
+                    "pid": worker_pids[worker],
+                    "args": {"name": f"worker {worker}"},
+                }
+            )
+        result.append(
+            {
+                "name": record["name"] or record["task_id"],
+                "ph": "X",
+                "pid": worker_pids[worker],
+                "tid": 0,
+                "ts": to_us(record["exec_start"]),
+                "dur": to_us(record["exec_end"]) - to_us(record["exec_start"]),
+                "args": args,
+            }
+        )
+    return result
+
+
+@attrs.mutable
+class _TracingState:
+    tracer: Optional[Tracer] = None
+
+
+_state = _TracingState()
+
+
+def get_active_tracer() -> Optional[Tracer]:
+    return _state.tracer
+
+
+def start_tracing() -> Tracer:
+    _state.tracer = Tracer()
+    return _state.tracer
+
+
+def stop_tracing() -> Optional[Tracer]:
+    result = _state.tracer
+    _state.tracer = None
+    return result
+
+
+@contextmanager
+def executor_span(name: str) -> Iterator[None]:
+    """
+    Record the enclosed block as a span of executor activity if tracing is active.
+    """
+    start_ts = time.time()
+    yield
+    tracer = get_active_tracer()
+    if tracer is not None:
+        tracer.add_executor_span(name, start_ts, time.time())
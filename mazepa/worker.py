@@ -1,22 +1,304 @@
+from __future__ import annotations
+
 import time
+import random
+import threading
+from collections import deque
+from typing import Deque, Dict, List, Optional, Tuple
+
+import attrs
 from zetta_utils.log import get_logger
-from . import ExecutionQueue
+from . import ExecutionQueue, Task, IsolatedTaskRunner, worker_cache
+from .completion_markers import CompletionMarkers
+from .task_bundles import TaskBundle
+from .task_outcome import TaskOutcome, TaskStatus
+from .tasks import set_task_outcome
 
 logger = get_logger("mazepa")
 
 
+@attrs.mutable
+class IdleBackoff:
+    """
+    Exponential backoff with jitter for polling an empty queue.
+    Consecutive sleeps grow by ``factor`` from ``min_sec`` up to ``max_sec``, with each
+    sleep drawn uniformly from the upper half of the current interval.
+    """
+
+    min_sec: float = 0.1
+    max_sec: float = 4.0
+    factor: float = 2.0
+    _ceiling_sec: float = attrs.field(init=False, default=0.0)
+
+    def __attrs_post_init__(self):
+        self.reset()
+
+    def reset(self):
+        self._ceiling_sec = self.min_sec
+
+    def next_sleep_sec(self) -> float:
+        result = random.uniform(self._ceiling_sec / 2, self._ceiling_sec)
+        self._ceiling_sec = min(self.max_sec, self._ceiling_sec * self.factor)
+        return result
+
+
+@attrs.mutable
+class TaskPrefetcher:
+    """
+    Leases tasks from an execution queue in a background thread, so that the
+    queue round-trip and task deserialization overlap with task execution.
+
+    At most ``depth`` tasks are kept leased ahead of execution. Tasks that have
+    been waiting in the buffer for longer than ``max_age_sec`` are dropped, as
+    their lease might have expired and they might be picked up by another worker.
+    Tasks that are still buffered when the prefetcher is stopped are released
+    back to the queue.
+    """
+
+    exec_queue: ExecutionQueue
+    depth: int
+    max_pull_num: int = 1
+    backoff: IdleBackoff = attrs.field(factory=IdleBackoff)
+    max_age_sec: Optional[float] = None
+    _buffer: Deque[Tuple[float, Task]] = attrs.field(init=False, factory=deque)
+    _cond: threading.Condition = attrs.field(init=False, factory=threading.Condition)
+    _stopped: bool = attrs.field(init=False, default=False)
+    _exc: Optional[Exception] = attrs.field(init=False, default=None)
+    _thread: Optional[threading.Thread] = attrs.field(init=False, default=None)
+
+    def start(self):
+        assert self._thread is None
+        self._thread = threading.Thread(target=self._run, name="mazepa_prefetch", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """
+        Stop prefetching and release leases of the tasks that were not executed.
+        """
+        with self._cond:
+            self._stopped = True
+            self._cond.notify_all()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+        unused = [task for _, task in self._buffer]
+        self._buffer.clear()
+        if len(unused) > 0:
+            logger.info(f"Releasing {len(unused)} prefetched tasks.")
+            self.exec_queue.release_tasks(unused)
+
+    def get(self, timeout: Optional[float] = None) -> Optional[Task]:
+        """
+        Return the next prefetched task, waiting for at most ``timeout`` seconds.
+        Returns ``None`` if no task became available in time.
+        """
+        dropped = []  # type: List[Task]
+        try:
+            with self._cond:
+                while True:
+                    self._cond.wait_for(
+                        lambda: len(self._buffer) > 0 or self._exc is not None, timeout
+                    )
+                    if self._exc is not None:
+                        raise self._exc
+                    if len(self._buffer) == 0:
+                        return None
+
+                    lease_ts, task = self._buffer.popleft()
+                    self._cond.notify_all()
+                    if self.max_age_sec is None or time.time() - lease_ts < self.max_age_sec:
+                        return task
+                    logger.warning(
+                        f"Dropping prefetched task {task.id_} that has been waiting for more "
+                        f"than {self.max_age_sec} secs."
+                    )
+                    dropped.append(task)
+        finally:
+            # Queues keep track of leased tasks until they are released
+            if len(dropped) > 0:
+                self.exec_queue.release_tasks(dropped)
+
+    def _run(self):
+        try:
+            while True:
+                with self._cond:
+                    self._cond.wait_for(lambda: self._stopped or len(self._buffer) < self.depth)
+                    if self._stopped:
+                        return
+                    room = self.depth - len(self._buffer)
+
+                tasks = self.exec_queue.pull_tasks(max_num=min(room, self.max_pull_num))
+                lease_ts = time.time()
+
+                with self._cond:
+                    self._buffer.extend((lease_ts, task) for task in tasks)
+                    self._cond.notify_all()
+                    if len(tasks) == 0:
+                        self._cond.wait_for(lambda: self._stopped, self.backoff.next_sleep_sec())
+                    else:
+                        self.backoff.reset()
+        except Exception as exc:  # pylint: disable=broad-except
+            with self._cond:
+                self._exc = exc
+                self._cond.notify_all()
+
+
 def run_worker(
-    exec_queue: ExecutionQueue, sleep_sec: int = 4, max_pull_num: int = 1
-):  # pragma: no cover # TODO
-    while True:
-        tasks = exec_queue.pull_tasks(max_num=max_pull_num)
-        logger.info(f"Got {len(tasks)} tasks.")
-
-        if len(tasks) == 0:
-            logger.info(f"Sleeping for {sleep_sec} secs.")
-            time.sleep(sleep_sec)
+    exec_queue: ExecutionQueue,
+    sleep_sec: float = 4,
+    max_pull_num: int = 1,
+    prefetch_depth: int = 0,
+    prefetch_max_age_sec: Optional[float] = None,
+    min_sleep_sec: float = 0.1,
+    idle_exit_sec: Optional[float] = None,
+    task_runner: Optional[IsolatedTaskRunner] = None,
+    completion_markers: Optional[CompletionMarkers] = None,
+):
+    """
+    Pull tasks from the given execution queue and execute them.
+
+    When the queue is empty, the worker backs off exponentially with jitter
+    from ``min_sleep_sec`` to ``sleep_sec`` between polls. For SQS queues, set
+    ``pull_wait_sec`` on the queue to long-poll instead of sleeping.
+
+    :param prefetch_depth: if greater than 0, up to ``prefetch_depth`` tasks will be
+        leased and deserialized in a background thread while the current task is executing.
+    :param prefetch_max_age_sec: prefetched tasks that wait longer than this are dropped
+        instead of executed. Defaults to the ``pull_lease_sec`` of the queue, if it has one.
+    :param idle_exit_sec: if given, the worker returns after not receiving any tasks
+        for this many seconds.
+    :param task_runner: if given, tasks are executed in an isolated child process with
+        the runner's resource limits instead of in the worker process.
+    :param completion_markers: if given, successful outcomes are recorded as completion
+        markers, and tasks that already have a marker report the recorded outcome
+        instead of being executed again.
+
+    Resources cached by tasks in ``mazepa.worker_cache`` are cleaned up when the worker exits.
+    """
+    if task_runner is not None:
+        # Fork the warm child before any background threads are started.
+        task_runner.start()
+
+    backoff = IdleBackoff(min_sec=min_sleep_sec, max_sec=sleep_sec)
+
+    prefetcher = None  # type: Optional[TaskPrefetcher]
+    if prefetch_depth > 0:
+        prefetcher = TaskPrefetcher(
+            exec_queue=exec_queue,
+            depth=prefetch_depth,
+            max_pull_num=max_pull_num,
+            backoff=IdleBackoff(min_sec=min_sleep_sec, max_sec=sleep_sec),
+            max_age_sec=(
+                prefetch_max_age_sec
+                if prefetch_max_age_sec is not None
+                else getattr(exec_queue, "pull_lease_sec", None)
+            ),
+        )
+        prefetcher.start()
+
+    last_task_ts = time.time()
+    try:
+        while True:
+            tasks = _pull_tasks(exec_queue, prefetcher, max_pull_num, timeout=sleep_sec)
+            logger.info(f"Got {len(tasks)} tasks.")
+
+            if len(tasks) == 0:
+                idle_sec = time.time() - last_task_ts
+                if idle_exit_sec is not None and idle_sec >= idle_exit_sec:
+                    logger.info(f"No tasks received for {idle_sec:.1f} secs, exiting.")
+                    break
+                if prefetcher is None:
+                    backoff_sec = backoff.next_sleep_sec()
+                    logger.info(f"Sleeping for {backoff_sec:.2f} secs.")
+                    time.sleep(backoff_sec)
+            else:
+                backoff.reset()
+                _execute_tasks(tasks, task_runner, completion_markers)
+                last_task_ts = time.time()
+    finally:
+        if prefetcher is not None:
+            prefetcher.stop()
+        if task_runner is not None:
+            task_runner.shutdown()
+        worker_cache.clear()
+
+
+def _pull_tasks(
+    exec_queue: ExecutionQueue,
+    prefetcher: Optional[TaskPrefetcher],
+    max_pull_num: int,
+    timeout: float,
+) -> List[Task]:
+    if prefetcher is None:
+        return exec_queue.pull_tasks(max_num=max_pull_num)
+    task = prefetcher.get(timeout=timeout)
+    return [] if task is None else [task]
+
+
+def _execute_tasks(
+    tasks: List[Task],
+    task_runner: Optional[IsolatedTaskRunner],
+    completion_markers: Optional[CompletionMarkers] = None,
+):
+    logger.info("STARTING: taks batch execution.")
+    for e in tasks:
+        if completion_markers is None:
+            _run_task(e, task_runner)
         else:
-            logger.info("STARTING: taks batch execution.")
-            for e in tasks:
-                e()
-            logger.info("DONE: taks batch execution.")
+            _execute_task_with_markers(e, task_runner, completion_markers)
+    logger.info("DONE: taks batch execution.")
+
+
+def _run_task(task: Task, task_runner: Optional[IsolatedTaskRunner]):
+    if task_runner is None:
+        task()
+    else:
+        task_runner(task)
+
+
+def _execute_task_with_markers(
+    task: Task,
+    task_runner: Optional[IsolatedTaskRunner],
+    completion_markers: CompletionMarkers,
+):
+    # Markers are kept per member task, as bundles get new ids whenever they are pushed
+    members = task.tasks if isinstance(task, TaskBundle) else [task]
+    recorded = {}  # type: Dict[str, TaskOutcome]
+    for e in members:
+        outcome = completion_markers.get(e.id_)
+        if outcome is not None:
+            recorded[e.id_] = outcome
+    if len(recorded) > 0:
+        logger.info(
+            f"{len(recorded)} of {len(members)} tasks of {task.id_} were already completed, "
+            "reporting their recorded outcomes."
+        )
+
+    if len(recorded) == 0:
+        _run_task(task, task_runner)
+    elif not isinstance(task, TaskBundle):
+        set_task_outcome(task, recorded[task.id_])
+    elif len(recorded) == len(members):
+        task.set_outcome(TaskOutcome(status=TaskStatus.SUCCEEDED, return_value=recorded))
+    else:
+        pending = TaskBundle(
+            tasks=[e for e in members if e.id_ not in recorded],
+            task_execution_env=task.task_execution_env,
+        )
+        _run_task(pending, task_runner)
+        if pending.outcome.status == TaskStatus.SUCCEEDED:
+            assert pending.outcome.return_value is not None
+            task.set_outcome(
+                TaskOutcome(
+                    status=TaskStatus.SUCCEEDED,
+                    execution_secs=pending.outcome.execution_secs,
+                    return_value={**recorded, **pending.outcome.return_value},
+                )
+            )
+        else:
+            task.set_outcome(pending.outcome)
+
+    for e in members:
+        if e.id_ not in recorded and e.outcome.status == TaskStatus.SUCCEEDED:
+            completion_markers.set(e.id_, e.outcome)
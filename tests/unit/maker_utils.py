@@ -1,3 +1,6 @@
+from typing import Callable
+import attrs
+from mazepa import TaskExecutionEnv, TaskOutcome, TaskStatus
 from mazepa.tasks import _TaskFactory
 from mazepa.flows import _FlowType
 from mazepa.id_generators import get_literal_id_fn
@@ -13,3 +16,31 @@ def make_test_task(fn, id_, task_execution_env=None):  # TODO: type me
 
 def make_test_flow(fn, id_, **kwargs):  # TODO: type me
     return _FlowType(fn=fn, id_fn=get_literal_id_fn(id_))(**kwargs)
+
+
+def dummy_iter(iterable):
+    return iter(iterable)
+
+
+@attrs.mutable
+class ExternalTask:
+    """
+    Task that implements only the members of the original ``Task`` protocol.
+    """
+
+    fn: Callable
+    id_: str
+    task_execution_env: TaskExecutionEnv = attrs.field(factory=TaskExecutionEnv)
+    _mazepa_callbacks: list = attrs.field(factory=list)
+    outcome: TaskOutcome = attrs.field(
+        factory=lambda: TaskOutcome(status=TaskStatus.NOT_SUBMITTED)
+    )
+
+    def set_up(self, *args, **kwargs):  # pragma: no cover
+        pass
+
+    def __call__(self) -> TaskOutcome:
+        self.outcome = TaskOutcome(status=TaskStatus.SUCCEEDED, return_value=self.fn())
+        for callback in self._mazepa_callbacks:
+            callback(task=self)
+        return self.outcome
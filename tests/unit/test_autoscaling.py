@@ -0,0 +1,140 @@
+from __future__ import annotations
+
+import json
+import socket
+import urllib.request
+from typing import Any, Dict, List
+
+from mazepa import (
+    ExecutionMultiQueue,
+    LocalExecutionQueue,
+    ProgressTracker,
+    TaskExecutionEnv,
+    TaskOutcome,
+    TaskStatus,
+    WorkerDemandPublisher,
+    execute,
+    flow_type,
+    get_desired_workers,
+    task_factory,
+)
+from mazepa.progress import GroupProgress
+
+
+@task_factory
+def dummy_task(x: int) -> int:
+    return x
+
+
+@flow_type
+def dummy_flow(num_tasks: int):
+    yield dummy_task.map(x=range(num_tasks))
+
+
+def _get_free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("localhost", 0))
+        return s.getsockname()[1]
+
+
+def test_get_desired_workers() -> None:
+    progress = GroupProgress(
+        submitted=100, completed=0, failed=0, throughput=0, arrival_rate=0, mean_execution_secs=60
+    )
+    assert get_desired_workers(progress, target_drain_secs=600, default_execution_secs=1) == 10
+    assert get_desired_workers(progress, target_drain_secs=1, default_execution_secs=1) == 100
+    assert (
+        get_desired_workers(
+            progress, target_drain_secs=600, default_execution_secs=1, max_workers=5
+        )
+        == 5
+    )
+    progress = GroupProgress(
+        submitted=5, completed=5, failed=0, throughput=0, arrival_rate=0, mean_execution_secs=None
+    )
+    assert get_desired_workers(progress, 1, 1) == 0
+    assert get_desired_workers(progress, 1, 1, min_workers=2) == 2
+    progress = GroupProgress(
+        submitted=5,
+        completed=5,
+        failed=0,
+        throughput=0,
+        arrival_rate=0,
+        mean_execution_secs=None,
+        pending=20,
+    )
+    assert get_desired_workers(progress, target_drain_secs=10, default_execution_secs=1) == 2
+
+
+def test_publisher(tmp_path) -> None:
+    path = str(tmp_path / "demand.json")
+    demands = []  # type: List[Dict[str, Any]]
+    publisher = WorkerDemandPublisher(
+        target_drain_secs=10,
+        default_execution_secs=20,
+        callback=demands.append,
+        path=path,
+        http_port=_get_free_port(),
+    )
+    pending_tasks = dummy_task.map(x=range(2))
+    tracker = ProgressTracker(
+        callbacks=[publisher],
+        get_pending_tasks=lambda: pending_tasks,
+        get_queue_name=lambda _: "q",
+    )
+    tasks = dummy_task.map(x=range(3))
+    tracker.add_submitted(tasks)
+    tracker.add_outcomes({tasks[0].id_: TaskOutcome[Any](status=TaskStatus.SUCCEEDED)})
+    tracker.maybe_report()
+    try:
+        assert demands[-1]["queues"]["q"] == {
+            "in_flight": 2,
+            "pending": 2,
+            "mean_execution_secs": None,
+            "desired_workers": 4,
+        }
+        with open(path, encoding="utf-8") as f:
+            assert json.load(f) == demands[-1]
+        assert publisher._server is not None  # pylint: disable=protected-access
+        port = publisher._server.server_address[1]  # pylint: disable=protected-access
+        with urllib.request.urlopen(f"http://localhost:{port}") as response:
+            assert json.load(response) == demands[-1]
+    finally:
+        publisher.close()
+
+
+def test_execute_multiqueue_demand() -> None:
+    demands = []  # type: List[Dict[str, Any]]
+    queue = ExecutionMultiQueue([LocalExecutionQueue(name="cpu"), LocalExecutionQueue(name="gpu")])
+    gpu_flow = dummy_flow(1)
+    gpu_flow.task_execution_env = TaskExecutionEnv(tags=["gpu"])
+    execute(
+        [dummy_flow(3), gpu_flow],
+        exec_queue=queue,
+        batch_gap_sleep_sec=0,
+        progress_callbacks=[WorkerDemandPublisher(callback=demands.append)],
+        progress_interval_sec=0,
+    )
+    assert set(demands[-1]["queues"]) == {"cpu", "gpu"}
+    assert set(demands[-1]["tags"]) == {"gpu"}
+    assert all(e["desired_workers"] == 0 for e in demands[-1]["queues"].values())
+
+
+@flow_type
+def dependent_flow(num_tasks):
+    first = dummy_task.make_task(x=0)
+    yield [first] + [dummy_task.make_task(x=i).depends_on(first.id_) for i in range(num_tasks)]
+
+
+def test_execute_pending_demand() -> None:
+    demands = []  # type: List[Dict[str, Any]]
+    publisher = WorkerDemandPublisher(callback=demands.append, http_port=_get_free_port())
+    execute(
+        dependent_flow(3),
+        batch_gap_sleep_sec=0,
+        progress_callbacks=[publisher],
+        progress_interval_sec=0,
+    )
+    assert demands[0]["queues"]["local_execution"]["pending"] == 3
+    assert demands[-1]["queues"]["local_execution"]["pending"] == 0
+    assert publisher._server is None  # pylint: disable=protected-access
@@ -0,0 +1,19 @@
+from __future__ import annotations
+
+import pytest
+import mazepa
+from mazepa import Dependency
+
+
+def test_configure_debug() -> None:
+    assert mazepa.is_debug()
+    with pytest.raises(TypeError):
+        Dependency(ids=1)  # type: ignore[arg-type]
+    try:
+        mazepa.configure(debug=False)
+        assert not mazepa.is_debug()
+        assert Dependency(ids=1).ids == 1  # type: ignore[arg-type]
+    finally:
+        mazepa.configure(debug=True)
+    with pytest.raises(TypeError):
+        Dependency(ids=1)  # type: ignore[arg-type]
@@ -0,0 +1,93 @@
+from __future__ import annotations
+
+import math
+import sys
+from typing import Any
+
+from mazepa import DurationEstimator, InMemoryExecutionState, TaskOutcome, TaskStatus
+from .maker_utils import dummy_iter, make_test_flow, make_test_task
+
+
+def short_fn():  # pragma: no cover
+    pass
+
+
+def long_fn():  # pragma: no cover
+    pass
+
+
+def new_fn():  # pragma: no cover
+    pass
+
+
+def make_estimator(**kwargs) -> DurationEstimator:
+    estimator = DurationEstimator(**kwargs)
+    estimator.observe(
+        make_test_task(short_fn, "s"),
+        TaskOutcome[Any](status=TaskStatus.SUCCEEDED, execution_secs=1.0),
+    )
+    estimator.observe(
+        make_test_task(long_fn, "l"),
+        TaskOutcome[Any](status=TaskStatus.SUCCEEDED, execution_secs=10.0),
+    )
+    return estimator
+
+
+def test_estimate(tmp_path) -> None:
+    path = str(tmp_path / "durations.json")
+    estimator = make_estimator(path=path, smoothing=0.5)
+    estimator.observe(
+        make_test_task(short_fn, "s"),
+        TaskOutcome[Any](status=TaskStatus.SUCCEEDED, execution_secs=3.0),
+    )
+    assert estimator.estimate(make_test_task(short_fn, "x")) == 2.0
+    assert estimator.estimate(make_test_task(new_fn, "x")) == math.inf
+    estimator.save()
+    assert DurationEstimator(path=path).estimates == estimator.estimates
+
+
+def test_longest_first() -> None:
+    tasks = [
+        make_test_task(short_fn, "s"),
+        make_test_task(long_fn, "l"),
+        make_test_task(new_fn, "n"),
+    ]
+    state = InMemoryExecutionState(
+        ongoing_flows=[make_test_flow(fn=dummy_iter, iterable=[tasks], id_="flow_0")],
+        task_order="longest_first",
+        duration_estimator=make_estimator(),
+    )
+    assert [e.id_ for e in state.get_task_batch()] == ["n", "l", "s"]
+
+
+def test_critical_path() -> None:
+    tasks = [
+        make_test_task(long_fn, "l"),
+        make_test_task(short_fn, "s0"),
+        make_test_task(long_fn, "l0").depends_on("s0"),
+        make_test_task(long_fn, "l1").depends_on("l0"),
+    ]
+    state = InMemoryExecutionState(
+        ongoing_flows=[make_test_flow(fn=dummy_iter, iterable=[tasks], id_="flow_0")],
+        task_order="critical_path",
+        duration_estimator=make_estimator(),
+    )
+    assert [e.id_ for e in state.get_task_batch()] == ["s0", "l"]
+    state.update_with_task_outcomes(
+        {"s0": TaskOutcome[Any](status=TaskStatus.SUCCEEDED, execution_secs=1.0)}
+    )
+    assert [e.id_ for e in state.get_task_batch()] == ["l0"]
+
+
+def test_critical_path_deep_chain() -> None:
+    depth = sys.getrecursionlimit() + 100
+    tasks = [make_test_task(short_fn, "t0")] + [
+        make_test_task(short_fn, f"t{i}").depends_on(f"t{i - 1}") for i in range(1, depth)
+    ]
+    tasks.append(make_test_task(long_fn, "l"))
+    state = InMemoryExecutionState(
+        ongoing_flows=[make_test_flow(fn=dummy_iter, iterable=[tasks], id_="flow_0")],
+        task_order="critical_path",
+        duration_estimator=make_estimator(),
+    )
+    assert [e.id_ for e in state.get_task_batch()] == ["t0", "l"]
@@ -10,8 +10,11 @@ from mazepa import (
     execute,
     InMemoryExecutionState,
     LocalExecutionQueue,
+    Executor,
 )
+from mazepa.tools import SubflowTask
 from mazepa.remote_execution_queues import SQSExecutionQueue
+from .maker_utils import ExternalTask, dummy_iter, make_test_flow
 
 TASK_COUNT = 0
 
@@ -84,6 +87,13 @@ def test_local_execution_state(reset_task_count):
     assert TASK_COUNT == 6
 
 
+def test_execution_closes_state(reset_task_count):
+    state = InMemoryExecutionState([dummy_flow(), dummy_flow()], flow_prefetch_threads=2)
+    execute(state, batch_gap_sleep_sec=0)
+    assert state._flow_executor is None  # pylint: disable=protected-access
+    assert TASK_COUNT == 4
+
+
 def test_local_execution_state_queue(reset_task_count):
     execute(
         InMemoryExecutionState(
@@ -123,3 +133,42 @@ def test_non_local_sleep(mocker):
         exec_queue=queue_m,
     )
     sleep_m.assert_called_once()
+
+
+@flow_type
+def dummy_subflow_parent(child_count: int):
+    subflow_tasks = [SubflowTask(subflow=dummy_flow()).make_task() for _ in range(child_count)]
+    yield subflow_tasks
+    yield Dependency([e.id_ for e in subflow_tasks])
+    assert all(e.outcome.status == TaskStatus.SUCCEEDED for e in subflow_tasks)
+
+
+def test_inline_subflow(reset_task_count, mocker):
+    executor_call = mocker.patch("mazepa.Executor.__call__")
+    execute(dummy_subflow_parent(child_count=3), batch_gap_sleep_sec=0)
+    executor_call.assert_not_called()
+    assert TASK_COUNT == 6
+
+
+def test_remote_subflow_not_inlined():
+    task = SubflowTask(
+        subflow=dummy_flow(), executor=Executor(exec_queue=LocalExecutionQueue())
+    ).make_task()
+    state = InMemoryExecutionState([dummy_flow_with_task(task)])
+    assert state.get_task_batch() == [task]
+
+
+@flow_type
+def dummy_flow_with_task(task):
+    yield task
+
+
+def test_external_tasks(tmp_path):
+    tasks = [ExternalTask(fn=lambda: 1, id_=str(i)) for i in range(3)]
+    execute(
+        make_test_flow(fn=dummy_iter, iterable=tasks, id_="f"),
+        batch_gap_sleep_sec=0,
+        trace_path=str(tmp_path / "trace.json"),
+        collect_metrics=True,
+    )
+    assert all(e.outcome.return_value == 1 for e in tasks)
@@ -1,14 +1,13 @@
 # type: ignore # We're breaking mypy here
 from __future__ import annotations
 
+import threading
+import time
 from typing import Any
 import pytest
 from mazepa import Dependency, InMemoryExecutionState, TaskStatus, TaskOutcome, Flow
-from .maker_utils import make_test_flow, make_test_task
-
-
-def dummy_iter(iterable):
-    return iter(iterable)
+from mazepa.tools import SubflowTask
+from .maker_utils import ExternalTask, dummy_iter, make_test_flow, make_test_task
 
 
 @pytest.mark.parametrize(
@@ -238,3 +237,198 @@ def test_task_outcome_exc():
     outcomes = {"a": TaskOutcome[Any](status=TaskStatus.FAILED)}
     with pytest.raises(Exception):
         state.update_with_task_outcomes(outcomes)
+
+
+@pytest.mark.parametrize("status", [TaskStatus.TIMED_OUT, TaskStatus.OUT_OF_MEMORY])
+def test_resource_retry(status):
+    # type: (TaskStatus) -> None
+    task = make_test_task(fn=lambda: None, id_="a")
+    flows = [make_test_flow(fn=dummy_iter, iterable=[task], id_="flow_0")]
+    state = InMemoryExecutionState(ongoing_flows=flows, max_resource_retries=1)
+    assert [e.id_ for e in state.get_task_batch()] == ["a"]
+    state.update_with_task_outcomes({"a": TaskOutcome[Any](status=status)})
+    assert [e.id_ for e in state.get_task_batch()] == ["a"]
+    assert task.attempt == 1
+    # Late report of the first attempt
+    state.update_with_task_outcomes({"a": TaskOutcome[Any](status=status)})
+    assert state.num_duplicate_outcomes == 1
+    with pytest.raises(Exception):
+        state.update_with_task_outcomes({"a": TaskOutcome[Any](status=status, attempt=1)})
+
+
+def test_duplicate_outcomes():
+    # type: () -> None
+    task = make_test_task(fn=lambda: None, id_="a")
+    flows = [make_test_flow(fn=dummy_iter, iterable=[task], id_="flow_0")]
+    state = InMemoryExecutionState(ongoing_flows=flows)
+    state.get_task_batch()
+    outcome = TaskOutcome(status=TaskStatus.SUCCEEDED, return_value=1)
+    state.update_with_task_outcomes({"a": outcome})
+    state.update_with_task_outcomes(
+        {
+            "a": TaskOutcome(status=TaskStatus.SUCCEEDED, return_value=2),
+        }
+    )
+    state.update_with_task_outcomes({"a": TaskOutcome[Any](status=TaskStatus.FAILED)})
+    assert task.outcome is outcome
+    assert state.num_duplicate_outcomes == 2
+
+
+def test_streamed_yield():
+    # type: () -> None
+    created = []
+
+    def make_tasks(ids):
+        for id_ in ids:
+            created.append(id_)
+            yield make_test_task(fn=lambda: None, id_=id_)
+
+    def flow_fn():
+        yield make_tasks(["a", "b", "c", "d", "e"])
+        yield Dependency()
+        yield make_tasks([])
+        yield make_test_task(fn=lambda: None, id_="f")
+
+    state = InMemoryExecutionState(ongoing_flows=[make_test_flow(fn=flow_fn, id_="flow_0")])
+    assert [e.id_ for e in state.get_task_batch(max_batch_len=2)] == ["a", "b"]
+    assert created == ["a", "b"]
+    assert [e.id_ for e in state.get_task_batch(max_batch_len=2)] == ["c", "d"]
+    assert [e.id_ for e in state.get_task_batch(max_batch_len=2)] == ["e"]
+    assert state.get_task_batch(max_batch_len=2) == []
+    state.update_with_task_outcomes(
+        {id_: TaskOutcome[Any](status=TaskStatus.SUCCEEDED) for id_ in "abcde"}
+    )
+    assert [e.id_ for e in state.get_task_batch(max_batch_len=2)] == ["f"]
+
+
+def test_flow_prefetch_parallel():
+    # type: () -> None
+    def flow_fn(task_id):
+        time.sleep(0.3)
+        yield make_test_task(fn=lambda: None, id_=task_id)
+
+    flows = [make_test_flow(fn=flow_fn, id_=f"flow_{e}", task_id=e) for e in "abcd"]
+    state = InMemoryExecutionState(ongoing_flows=flows, flow_prefetch_threads=4)
+    time_start = time.time()
+    assert sorted(e.id_ for e in state.get_task_batch()) == ["a", "b", "c", "d"]
+    assert time.time() - time_start < 0.9
+    state.close()
+    assert not any(e.name.startswith("mazepa_flow") for e in threading.enumerate())
+
+
+def test_flow_prefetch_stops_at_dependency():
+    # type: () -> None
+    advanced = []
+
+    def flow_fn():
+        yield make_test_task(fn=lambda: None, id_="a")
+        yield Dependency()
+        advanced.append("dep")
+        yield make_test_task(fn=lambda: None, id_="b")
+
+    flows = [make_test_flow(fn=flow_fn, id_="flow_0")]
+    state = InMemoryExecutionState(ongoing_flows=flows, flow_prefetch_threads=2)
+    assert [e.id_ for e in state.get_task_batch()] == ["a"]
+    time.sleep(0.1)
+    assert not advanced
+    state.update_with_task_outcomes({"a": TaskOutcome[Any](status=TaskStatus.SUCCEEDED)})
+    state.close()
+    # Flows are advanced synchronously once the state is closed
+    assert [e.id_ for e in state.get_task_batch()] == ["b"]
+    assert advanced == ["dep"]
+
+
+def test_flow_prefetch_exc():
+    # type: () -> None
+    def flow_fn():
+        raise RuntimeError()
+        yield  # pylint: disable=unreachable
+
+    flows = [make_test_flow(fn=flow_fn, id_="flow_0")]
+    state = InMemoryExecutionState(ongoing_flows=flows, flow_prefetch_threads=2)
+    with pytest.raises(RuntimeError):
+        state.get_task_batch()
+    state.close()
+
+
+def test_task_upstream_ids():
+    # type: () -> None
+    stage_a = [make_test_task(fn=lambda: None, id_=f"a{i}") for i in range(3)]
+    stage_b = [make_test_task(fn=lambda: None, id_=f"b{i}").depends_on(f"a{i}") for i in range(3)]
+    flows = [
+        make_test_flow(fn=dummy_iter, iterable=[stage_a], id_="flow_a"),
+        make_test_flow(fn=dummy_iter, iterable=[stage_b], id_="flow_b"),
+    ]
+    state = InMemoryExecutionState(ongoing_flows=flows)
+    assert [e.id_ for e in state.get_task_batch()] == ["a0", "a1", "a2"]
+    state.update_with_task_outcomes({"a1": TaskOutcome[Any](status=TaskStatus.SUCCEEDED)})
+    assert [e.id_ for e in state.get_task_batch()] == ["b1"]
+    state.update_with_task_outcomes(
+        {id_: TaskOutcome[Any](status=TaskStatus.SUCCEEDED) for id_ in ["a0", "a2", "b1"]}
+    )
+    assert sorted(e.id_ for e in state.get_task_batch()) == ["b0", "b2"]
+    state.update_with_task_outcomes(
+        {id_: TaskOutcome[Any](status=TaskStatus.SUCCEEDED) for id_ in ["b0", "b2"]}
+    )
+    state.get_task_batch()
+    assert not state.get_ongoing_flow_ids()
+
+
+def test_sibling_flow_dependency():
+    # type: () -> None
+    def flow_fn():
+        yield Dependency(["a"])
+        yield make_test_task(fn=lambda: None, id_="b")
+
+    flows = [
+        make_test_flow(
+            fn=dummy_iter, iterable=[make_test_task(fn=lambda: None, id_="a")], id_="f0"
+        ),
+        make_test_flow(fn=flow_fn, id_="f1"),
+    ]
+    state = InMemoryExecutionState(ongoing_flows=flows)
+    assert [e.id_ for e in state.get_task_batch()] == ["a"]
+    assert not state.get_task_batch()
+    state.update_with_task_outcomes({"a": TaskOutcome[Any](status=TaskStatus.SUCCEEDED)})
+    assert [e.id_ for e in state.get_task_batch()] == ["b"]
+
+
+def test_unknown_dependency_exc():
+    # type: () -> None
+    flows = [make_test_flow(fn=dummy_iter, iterable=[Dependency(["x"])], id_="f0")]
+    state = InMemoryExecutionState(ongoing_flows=flows)
+    with pytest.raises(ValueError):
+        state.get_task_batch()
+
+
+def test_inline_subflow_upstream_ids():
+    # type: () -> None
+    subflow = make_test_flow(
+        fn=dummy_iter, iterable=[make_test_task(fn=lambda: None, id_="c")], id_="sub"
+    )
+    subflow_task = SubflowTask(subflow=subflow).make_task().depends_on("a")
+    flows = [
+        make_test_flow(
+            fn=dummy_iter, iterable=[make_test_task(fn=lambda: None, id_="a")], id_="f0"
+        ),
+        make_test_flow(fn=dummy_iter, iterable=[subflow_task], id_="f1"),
+    ]
+    state = InMemoryExecutionState(ongoing_flows=flows)
+    assert [e.id_ for e in state.get_task_batch()] == ["a"]
+    assert subflow_task.id_ in state.get_ongoing_flow_ids()
+    assert not state.get_task_batch()
+    state.update_with_task_outcomes({"a": TaskOutcome[Any](status=TaskStatus.SUCCEEDED)})
+    assert [e.id_ for e in state.get_task_batch()] == ["c"]
+
+
+def test_external_task_retry():
+    # type: () -> None
+    task = ExternalTask(fn=lambda: None, id_="a")
+    flows = [make_test_flow(fn=dummy_iter, iterable=[task], id_="f0")]
+    state = InMemoryExecutionState(ongoing_flows=flows, max_resource_retries=1)
+    assert state.get_task_batch() == [task]
+    state.update_with_task_outcomes({"a": TaskOutcome[Any](status=TaskStatus.TIMED_OUT)})
+    assert state.get_task_batch() == [task]
+    state.update_with_task_outcomes({"a": TaskOutcome[Any](status=TaskStatus.SUCCEEDED)})
+    state.get_task_batch()
+    assert not state.get_ongoing_flow_ids()
@@ -65,3 +65,24 @@ def test_get_batch_env(mocker):
     with j.task_execution_env_ctx(env):
         result = j.get_next_batch()
         assert result[0].task_execution_env == env
+
+
+def test_streamed_batch_env():
+    env = TaskExecutionEnv()
+
+    def fn():
+        yield iter(
+            [
+                _FlowType(fn=lambda: None)(),
+                _FlowType(fn=lambda: None)(),
+                _FlowType(fn=lambda: None)(),
+            ]
+        )
+
+    j = _FlowType(fn=fn)()
+    with j.task_execution_env_ctx(env):
+        assert len(j.get_next_batch(2)) == 2
+        result = j.get_next_batch(2)
+        assert len(result) == 1
+        assert result[0].task_execution_env == env
+        assert j.get_next_batch(2) is None
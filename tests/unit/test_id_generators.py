@@ -0,0 +1,164 @@
+from __future__ import annotations
+
+import dataclasses
+import enum
+import functools
+import os
+import subprocess
+import sys
+import threading
+
+import attrs
+import pytest
+from mazepa import InMemoryExecutionState, flow_type, id_generators, task_factory
+
+
+def dummy_fn(x, _y=None):  # pragma: no cover
+    return x
+
+
+def other_fn(x, _y=None):  # pragma: no cover
+    return x
+
+
+class Color(enum.Enum):
+    RED = 1
+    BLUE = 2
+
+
+@attrs.frozen
+class Box:
+    start: tuple
+    end: tuple
+
+
+@dataclasses.dataclass
+class Span:
+    tags: frozenset
+    weights: dict
+
+
+class Config:
+    def __init__(self, names, span):
+        self.names = names
+        self.span = span
+        self.parent = self
+
+
+def _make_kwargs() -> dict:
+    span = Span(tags=frozenset(["a", "b", "c", "d"]), weights={"x": {1.5, 2.5}})
+    return {
+        "config": Config(names={"p", "q", "r", "s"}, span=span),
+        "fn": _make_adder(3),
+        "lam": lambda x: x in {"u", "v", "w"},
+        "partial": functools.partial(dummy_fn, _y={"m", "n"}),
+        "data": memoryview(b"abc").cast("B", (1, 3)),
+    }
+
+
+def test_content_id_deterministic() -> None:
+    kwargs_a = {"x": 1, "y": {"b": [1.5, "s"], "a": Box((0, 0), (1, 1)), "c": Color.RED}}
+    kwargs_b = {"y": {"c": Color.RED, "a": Box((0, 0), (1, 1)), "b": [1.5, "s"]}, "x": 1}
+    id_a = id_generators.get_content_id(dummy_fn, kwargs_a)
+    assert id_a == id_generators.get_content_id(dummy_fn, kwargs_b)
+    assert id_a.startswith("dummy_fn-")
+
+
+def test_content_id_distinct() -> None:
+    ids = {
+        id_generators.get_content_id(dummy_fn, {"x": 1}),
+        id_generators.get_content_id(dummy_fn, {"x": 1.0}),
+        id_generators.get_content_id(dummy_fn, {"x": True}),
+        id_generators.get_content_id(dummy_fn, {"x": "1"}),
+        id_generators.get_content_id(dummy_fn, {"x": [1]}),
+        id_generators.get_content_id(dummy_fn, {"x": (1,)}),
+        id_generators.get_content_id(dummy_fn, {"x": Color.BLUE}),
+        id_generators.get_content_id(dummy_fn, {"x": 1}, version="2"),
+        id_generators.get_content_id(other_fn, {"x": 1}),
+    }
+    assert len(ids) == 9
+
+
+def test_content_id_fallback() -> None:
+    partial = functools.partial(dummy_fn, _y=3)
+    assert id_generators.get_content_id(dummy_fn, {"x": partial}) == (
+        id_generators.get_content_id(dummy_fn, {"x": functools.partial(dummy_fn, _y=3)})
+    )
+    assert id_generators.get_content_id(dummy_fn, {"x": partial}) != (
+        id_generators.get_content_id(dummy_fn, {"x": functools.partial(dummy_fn, _y=4)})
+    )
+
+
+def _make_adder(n):
+    def _add(x):  # pragma: no cover
+        return x + n
+
+    return _add
+
+
+def test_content_id_local_callables() -> None:
+    assert id_generators.get_content_id(dummy_fn, {"x": _make_adder(1)}) != (
+        id_generators.get_content_id(dummy_fn, {"x": _make_adder(2)})
+    )
+    assert id_generators.get_content_id(dummy_fn, {"x": lambda x: x}) != (
+        id_generators.get_content_id(dummy_fn, {"x": lambda x: x + 1})
+    )
+    assert id_generators.get_content_id(dummy_fn, {"x": other_fn}) == (
+        id_generators.get_content_id(dummy_fn, {"x": other_fn})
+    )
+
+
+def test_content_ids_batch() -> None:
+    kwargs_list = [{"x": i} for i in range(5)]
+    assert id_generators.get_batch_id_fn(id_generators.get_content_id)(dummy_fn, kwargs_list) == [
+        id_generators.get_content_id(dummy_fn, e) for e in kwargs_list
+    ]
+
+
+def test_content_id_resume() -> None:
+    @task_factory(id_fn=id_generators.get_content_id)
+    def dummy_task(x: int) -> int:  # pragma: no cover
+        return x
+
+    @flow_type(id_fn=id_generators.get_content_id)
+    def dummy_flow(n: int):
+        yield [dummy_task.make_task(x=i) for i in range(n)]
+
+    first_ids = [e.id_ for e in InMemoryExecutionState([dummy_flow(n=4)]).get_task_batch()]
+    assert len(set(first_ids)) == 4
+
+    # A restarted run only gets the tasks that were not completed before
+    state = InMemoryExecutionState([dummy_flow(n=4)], completed_ids=set(first_ids[:3]))
+    assert [e.id_ for e in state.get_task_batch()] == first_ids[3:]
+
+
+def test_content_id_objects() -> None:
+    id_a = id_generators.get_content_id(dummy_fn, _make_kwargs())
+    assert id_a == id_generators.get_content_id(dummy_fn, _make_kwargs())
+    kwargs = _make_kwargs()
+    kwargs["config"].span.weights["x"].add(3.5)
+    assert id_a != id_generators.get_content_id(dummy_fn, kwargs)
+
+
+def test_content_id_across_processes() -> None:
+    code = (
+        f"from {__name__} import _make_kwargs, dummy_fn\n"
+        "from mazepa import id_generators\n"
+        "print(id_generators.get_content_id(dummy_fn, _make_kwargs()))"
+    )
+    ids = {
+        subprocess.run(
+            [sys.executable, "-c", code],
+            env={**os.environ, "PYTHONHASHSEED": seed, "PYTHONPATH": os.pathsep.join(sys.path)},
+            capture_output=True,
+            check=True,
+            text=True,
+        ).stdout.strip()
+        for seed in ["1", "2"]
+    }
+    assert ids == {id_generators.get_content_id(dummy_fn, _make_kwargs())}
+
+
+def test_content_id_unsupported_exc() -> None:
+    with pytest.raises(TypeError):
+        id_generators.get_content_id(dummy_fn, {"x": threading.Lock()})
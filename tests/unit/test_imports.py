@@ -0,0 +1,26 @@
+from __future__ import annotations
+
+import subprocess
+import sys
+
+import pytest
+import mazepa
+
+LAZY_MODULES = ["boto3", "taskqueue", "dill", "coolname", "mazepa.remote_execution_queues"]
+
+
+def test_lazy_imports() -> None:
+    code = (
+        "import sys, mazepa; " f"print(','.join(e for e in {LAZY_MODULES!r} if e in sys.modules))"
+    )
+    result = subprocess.run(
+        [sys.executable, "-c", code], capture_output=True, text=True, check=True
+    )
+    assert result.stdout.strip() == ""
+
+
+def test_lazy_attrs() -> None:
+    assert mazepa.SQSExecutionQueue is mazepa.remote_execution_queues.SQSExecutionQueue
+    assert "SQSExecutionQueue" in dir(mazepa)
+    with pytest.raises(AttributeError):
+        mazepa.DoesNotExist  # pylint: disable=pointless-statement
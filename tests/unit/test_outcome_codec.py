@@ -0,0 +1,85 @@
+from __future__ import annotations
+
+from typing import Any
+
+import pytest
+
+from mazepa import TaskOutcome, TaskStatus, serialization
+from mazepa.remote_execution_queues.outcome_codec import (
+    OutcomeReport,
+    RemoteTraceback,
+    decode_outcome_reports,
+    encode_outcome_reports,
+)
+
+
+def _raise_value_error():
+    raise ValueError("bad value")
+
+
+def test_success_round_trip() -> None:
+    report = OutcomeReport(
+        task_id="task-0",
+        outcome=TaskOutcome[Any](status=TaskStatus.SUCCEEDED, execution_secs=1.5, attempt=2),
+    )
+    body = encode_outcome_reports([report])
+    assert decode_outcome_reports(body) == [report]
+    assert len(body) * 2 < len(serialization.serialize(report))
+
+
+def test_full_round_trip() -> None:
+    with pytest.raises(ValueError) as exc_info:
+        _raise_value_error()
+    exception = exc_info.value
+    reports = [
+        OutcomeReport(
+            task_id=f"task-{i}",
+            outcome=TaskOutcome[Any](
+                status=TaskStatus.SUCCEEDED,
+                return_value={"x": i},
+                trace_stamps={"exec_start": 1.0, "worker": "w"},
+                metrics={"cpu_secs": 0.5, "factory": "f"},
+            ),
+        )
+        for i in range(20)
+    ] + [
+        OutcomeReport(
+            task_id="failed",
+            outcome=TaskOutcome[Any](status=TaskStatus.FAILED, exception=exception),
+        )
+    ]
+    result = decode_outcome_reports(encode_outcome_reports(reports))
+    assert result[:-1] == reports[:-1]
+    decoded_exc = result[-1].outcome.exception
+    assert isinstance(decoded_exc, ValueError)
+    assert str(decoded_exc) == "bad value"
+    assert isinstance(decoded_exc.__cause__, RemoteTraceback)
+    assert "_raise_value_error" in str(decoded_exc.__cause__)
+
+
+# Report with a successful outcome, pickled by workers that predate this wire format and
+# the ``trace_stamps``, ``metrics`` and ``attempt`` outcome fields
+LEGACY_REPORT = (
+    "eJxrYJk6nwECejRyE6tSCxL1ilJz80tS41MrUpNLSzLz8+ILS1NLU4v1iguLIcwpPbz+pSXJ+bmp\n"
+    "QakF+UUlUyZP0Wyc0sOYOKVHGGpGSWJxdnw+RNGUHu4QIBeqBaJYI4O1hwskGlySWFJaDBT0Zm6d\n"
+    "EjTFz93+B8Q5tUADK6Z4MxaXTElqm5KkBwA/D0BX\n"
+)
+
+
+def test_legacy_format() -> None:
+    result = decode_outcome_reports(LEGACY_REPORT)
+    assert result == [
+        OutcomeReport(
+            task_id="a",
+            outcome=TaskOutcome[Any](
+                status=TaskStatus.SUCCEEDED, execution_secs=1.5, return_value={"x": 1}
+            ),
+        )
+    ]
+    assert result[0].outcome.metrics is None
+    assert result[0].outcome.attempt == 0
+
+
+def test_unsupported_version() -> None:
+    with pytest.raises(ValueError):
+        decode_outcome_reports("~9AAAA")
@@ -0,0 +1,79 @@
+from __future__ import annotations
+
+import json
+from typing import Any, List
+
+from mazepa import (
+    Dependency,
+    JsonLinesProgressReporter,
+    ProgressSnapshot,
+    ProgressTracker,
+    StderrProgressReporter,
+    TaskExecutionEnv,
+    TaskOutcome,
+    TaskStatus,
+    execute,
+    flow_type,
+    task_factory,
+)
+
+
+@task_factory
+def dummy_task(x: int) -> int:
+    return x
+
+
+@flow_type
+def dummy_flow():
+    yield dummy_task.map(x=range(3))
+    yield Dependency()
+    yield dummy_task.make_task(x=3)
+
+
+def test_tracker() -> None:
+    snapshots = []  # type: List[ProgressSnapshot]
+    tracker = ProgressTracker(callbacks=[snapshots.append], report_interval_sec=1000)
+    tasks = dummy_task.map(x=range(4))
+    tasks[0].task_execution_env = TaskExecutionEnv(tags=["gpu"])
+    tracker.add_submitted(tasks, {e.id_: "flow_a" for e in tasks[:3]}.get)
+    tracker.add_outcomes(
+        {
+            tasks[0].id_: TaskOutcome[Any](status=TaskStatus.SUCCEEDED, execution_secs=2.0),
+            tasks[1].id_: TaskOutcome[Any](status=TaskStatus.FAILED),
+            "unknown": TaskOutcome[Any](status=TaskStatus.SUCCEEDED),
+        }
+    )
+    tracker.maybe_report()
+    tracker.maybe_report()
+    assert len(snapshots) == 1
+    snapshot = snapshots[0]
+    assert (snapshot.total.submitted, snapshot.total.completed) == (4, 1)
+    assert (snapshot.total.failed, snapshot.total.in_flight) == (1, 2)
+    assert snapshot.total.throughput > 0
+    assert snapshot.total.mean_execution_secs == 2.0
+    assert snapshot.total.eta_secs is not None
+    assert snapshot.by_flow["flow_a"].in_flight == 1
+    assert snapshot.by_tag["gpu"].in_flight == 0
+    assert snapshot.by_tag["gpu"].eta_secs == 0.0
+
+
+def test_execute_progress(tmp_path, capsys) -> None:
+    path = str(tmp_path / "progress.jsonl")
+    snapshots = []  # type: List[ProgressSnapshot]
+    execute(
+        dummy_flow(),
+        progress_callbacks=[
+            snapshots.append,
+            StderrProgressReporter(),
+            JsonLinesProgressReporter(path),
+        ],
+        progress_interval_sec=0,
+    )
+    assert snapshots[-1].total.completed == 4
+    assert snapshots[-1].total.in_flight == 0
+    assert list(snapshots[-1].by_flow.values())[0].completed == 4
+    assert "4/4 done" in capsys.readouterr().err
+    with open(path, encoding="utf-8") as f:
+        lines = [json.loads(e) for e in f]
+    assert len(lines) == len(snapshots)
+    assert lines[-1]["total"]["eta_secs"] == 0.0
@@ -0,0 +1,56 @@
+from __future__ import annotations
+import time
+from mazepa import ResourceCache
+
+
+def test_get_or_create():
+    cache = ResourceCache()
+    created = []
+
+    def factory():
+        created.append(1)
+        return len(created)
+
+    assert cache.get_or_create("a", factory) == 1
+    assert cache.get_or_create("a", factory) == 1
+    assert cache.get_or_create("b", factory) == 2
+    assert len(cache) == 2
+    assert "a" in cache
+
+
+def test_lru_eviction():
+    cleaned = []
+    cache = ResourceCache(max_size=3)
+    cache.get_or_create("a", lambda: "a", cleanup=cleaned.append)
+    cache.get_or_create("b", lambda: "b", cleanup=cleaned.append)
+    cache.get_or_create("a", lambda: "x")
+    cache.get_or_create("c", lambda: "c", size=2, cleanup=cleaned.append)
+    assert cleaned == ["b"]
+    assert "a" in cache and "c" in cache
+
+
+def test_ttl():
+    cleaned = []
+    cache = ResourceCache(ttl_sec=0.01)
+    cache.get_or_create("a", lambda: 1, cleanup=cleaned.append)
+    time.sleep(0.02)
+    assert cache.get_or_create("a", lambda: 2) == 2
+    assert cleaned == [1]
+    assert cache.get_or_create("b", lambda: 3, ttl_sec=100) == 3
+    time.sleep(0.02)
+    assert cache.get_or_create("b", lambda: 4) == 3
+
+
+def test_clear():
+    cleaned = []
+
+    def failing_cleanup(value):
+        raise RuntimeError()
+
+    cache = ResourceCache()
+    cache.get_or_create("a", lambda: 1, cleanup=failing_cleanup)
+    cache.get_or_create("b", lambda: 2, cleanup=cleaned.append)
+    cache.invalidate("c")
+    cache.clear()
+    assert cleaned == [2]
+    assert len(cache) == 0
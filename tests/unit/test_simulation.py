@@ -0,0 +1,79 @@
+from __future__ import annotations
+
+import json
+from typing import Any
+
+import pytest
+
+from mazepa import (
+    Dependency,
+    SampledDurations,
+    SimulatedExecutionQueue,
+    TaskOutcome,
+    TaskStatus,
+    flow_type,
+    simulate,
+    task_factory,
+)
+from mazepa.tasks import get_factory_key
+
+
+@task_factory
+def dummy_task(x: int) -> int:
+    return x
+
+
+@flow_type
+def barrier_flow(num_tasks: int, num_levels: int):
+    for _ in range(num_levels):
+        yield dummy_task.map(x=range(num_tasks))
+        yield Dependency()
+
+
+@flow_type
+def return_value_flow():
+    task = dummy_task.make_task(x=5)
+    yield task
+    yield Dependency()
+    yield dummy_task.make_task(x=task.outcome.return_value)
+
+
+def test_simulate_barriers() -> None:
+    report = simulate(barrier_flow(8, 3), num_workers=4)
+    assert report.num_tasks == 24
+    assert report.makespan_secs == pytest.approx(6.0)
+    assert report.utilization == pytest.approx(1.0)
+    assert report.num_stalls == 0
+
+    report = simulate(barrier_flow(6, 3), num_workers=4, queue_latency_sec=0.5)
+    assert report.makespan_secs == pytest.approx(3 * (2 + 2 * 0.5))
+    assert report.utilization == pytest.approx(18 / (4 * 9))
+    assert report.num_stalls == 4
+    assert report.stall_secs == pytest.approx(4 * 1.0 - 2 * 0.5)
+
+
+def test_simulate_run_tasks() -> None:
+    report = simulate(return_value_flow(), num_workers=2, run_tasks=True)
+    assert report.num_tasks == 2
+    assert report.makespan_secs == pytest.approx(2.0)
+    assert SimulatedExecutionQueue(num_workers=1).get_report().utilization == 0.0
+    with pytest.raises(ValueError):
+        SimulatedExecutionQueue(num_workers=0)
+
+
+def test_sampled_durations(tmp_path) -> None:
+    task = dummy_task.make_task(x=1)
+    durations = SampledDurations(default_secs=3.0)
+    assert durations(task) == 3.0
+    durations.observe(task, TaskOutcome[Any](status=TaskStatus.SUCCEEDED, execution_secs=2.0))
+    assert durations(task) == 2.0
+
+    path = str(tmp_path / "estimates.json")
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump({get_factory_key(task): 5.0}, f)
+    report = simulate(
+        barrier_flow(2, 2),
+        num_workers=2,
+        duration_fn=SampledDurations.from_duration_estimates(path),
+    )
+    assert report.makespan_secs == pytest.approx(10.0)
@@ -1,8 +1,10 @@
 # pylint: disable=redefined-outer-name,exec-used
+import threading
 import time
 import pytest
 import docker  # type: ignore
 import boto3  # type: ignore
+from moto import mock_sqs  # type: ignore
 from mazepa import SQSExecutionQueue, TaskStatus
 from mazepa.tasks import _TaskFactory, _Task
 
@@ -22,6 +24,26 @@ def test_pull_task_outcomes_exc(mocker):
         sqseq.pull_task_outcomes()
 
 
+def test_pull_wait_sec_exc(mocker):
+    mocker.patch("taskqueue.TaskQueue", lambda *args, **kwargs: mocker.MagicMock())
+    with pytest.raises(ValueError):
+        SQSExecutionQueue("q", pull_wait_sec=21)
+
+
+def test_release_tasks_exc(mocker):
+    mocker.patch("taskqueue.TaskQueue", lambda *args, **kwargs: mocker.MagicMock())
+    change_visibility = mocker.patch(
+        "mazepa.remote_execution_queues.sqs_utils.change_msg_visibility_by_receipt_handle",
+        side_effect=RuntimeError,
+    )
+    sqseq = SQSExecutionQueue("q", outcome_queue_name=None)
+    task = _Task(lambda: "outcome")
+    sqseq._leased_receipt_handles[task.id_] = "handle"  # pylint: disable=protected-access
+    sqseq.release_tasks([task])
+    change_visibility.assert_called_once()
+    assert not sqseq._leased_receipt_handles  # pylint: disable=protected-access
+
+
 @pytest.fixture(scope="session")
 def sqs_endpoint():
     """Ensure that SQS service is up and responsive."""
@@ -123,3 +145,110 @@ def test_polling_done(work_queue, outcome_queue):
     pulled_tasks[0]()
     pulled_tasks = queue.pull_tasks()
     assert len(pulled_tasks) == 0
+
+
+@mock_sqs
+def test_bundled_execution():
+    region_name = "us-east-1"
+    sqs = boto3.client("sqs", region_name=region_name)
+    sqs.create_queue(QueueName="work-queue")
+    sqs.create_queue(QueueName="outcome-queue")
+    queue = SQSExecutionQueue(
+        name="work-queue",
+        region_name=region_name,
+        outcome_queue_name="outcome-queue",
+        max_bundle_len=4,
+    )
+    tasks = [_TaskFactory(lambda: "Success").make_task() for _ in range(6)]
+    queue.push_tasks(tasks)
+    pulled_tasks = queue.pull_tasks(max_num=10)
+    assert len(pulled_tasks) == 2
+    for e in pulled_tasks:
+        e()
+    outcomes = queue.pull_task_outcomes()
+    assert set(outcomes.keys()) == {e.id_ for e in tasks}
+    assert all(e.return_value == "Success" for e in outcomes.values())
+
+
+@mock_sqs
+def test_shared_outcome_queue():
+    region_name = "us-east-1"
+    sqs = boto3.client("sqs", region_name=region_name)
+    sqs.create_queue(QueueName="work-queue")
+    sqs.create_queue(QueueName="outcome-queue")
+    queues = [
+        SQSExecutionQueue(
+            name="work-queue",
+            region_name=region_name,
+            outcome_queue_name="outcome-queue",
+            execution_id=execution_id,
+            foreign_outcome_visibility_sec=0,
+        )
+        for execution_id in ["a", "b"]
+    ]
+    tasks = [_TaskFactory(lambda: "Success").make_task() for _ in range(4)]
+    queues[0].push_tasks(tasks[:2])
+    queues[1].push_tasks(tasks[2:])
+    for e in queues[0].pull_tasks(max_num=10):
+        e()
+
+    outcomes = queues[0].pull_task_outcomes(max_time_sec=0)
+    assert set(outcomes.keys()) == {e.id_ for e in tasks[:2]}
+    outcomes = queues[1].pull_task_outcomes(max_time_sec=0)
+    assert set(outcomes.keys()) == {e.id_ for e in tasks[2:]}
+    assert len(queues[0].pull_task_outcomes(max_time_sec=0)) == 0
+
+    # Reports of other executions are hidden for a while once released
+    queues[0].foreign_outcome_visibility_sec = 60
+    queues[1].push_tasks(tasks[2:])
+    for e in queues[0].pull_tasks(max_num=10):
+        e()
+    assert len(queues[0].pull_task_outcomes(max_time_sec=0)) == 0
+    assert len(queues[1].pull_task_outcomes(max_time_sec=0)) == 0
+
+
+@mock_sqs
+def test_parallel_outcome_decoding():
+    region_name = "us-east-1"
+    sqs = boto3.client("sqs", region_name=region_name)
+    sqs.create_queue(QueueName="work-queue")
+    sqs.create_queue(QueueName="outcome-queue")
+    queue = SQSExecutionQueue(
+        name="work-queue",
+        region_name=region_name,
+        outcome_queue_name="outcome-queue",
+        outcome_decode_processes=2,
+        prefetch_outcomes=True,
+    )
+
+    def _fail():
+        raise ValueError("failed")
+
+    tasks = [_TaskFactory(lambda: "Success").make_task() for _ in range(6)]
+    tasks.append(_TaskFactory(_fail).make_task())
+    queue.push_tasks(tasks)
+    for e in queue.pull_tasks(max_num=10):
+        e()
+
+    outcomes = {}  # type: dict
+    for _ in range(10):
+        outcomes.update(queue.pull_task_outcomes(max_time_sec=0))
+        if len(outcomes) == len(tasks):
+            break
+    assert set(outcomes.keys()) == {e.id_ for e in tasks}
+    assert outcomes[tasks[0].id_].status == TaskStatus.SUCCEEDED
+    exc = outcomes[tasks[-1].id_].exception
+    assert isinstance(exc, ValueError)
+    assert "_fail" in exc.__cause__.formatted_tb
+
+    # Messages received in the background are released on close
+    queue._prefetched_msgs.result()  # pylint: disable=protected-access
+    queue.push_tasks(tasks[:1])
+    for e in queue.pull_tasks(max_num=10):
+        e()
+    # Returns the batch received before the report was sent, and receives the report
+    assert len(queue.pull_task_outcomes(max_time_sec=0)) == 0
+    queue._prefetched_msgs.result()  # pylint: disable=protected-access
+    queue.close()
+    assert not any(e.name.startswith("mazepa_outcomes") for e in threading.enumerate())
+    assert set(queue.pull_task_outcomes(max_time_sec=0).keys()) == {tasks[0].id_}
@@ -1,6 +1,9 @@
 from __future__ import annotations
+from typing import Any
 import attrs
-from mazepa import task_factory, Task, task_factory_cls, TaskFactory
+import pytest
+from mazepa import task_factory, Task, task_factory_cls, TaskFactory, TaskOutcome, TaskStatus
+from mazepa.task_outcome import is_preferred_outcome
 
 
 def test_make_task_factory_cls() -> None:
@@ -26,3 +29,62 @@ def test_make_task_factory() -> None:
     assert isinstance(dummy_task_fn, TaskFactory)
     task = dummy_task_fn.make_task()
     assert isinstance(task, Task)
+
+
+def test_make_tasks() -> None:
+    @task_factory
+    def dummy_task_fn(x: int, y: int) -> int:
+        return x + y
+
+    tasks = dummy_task_fn.make_tasks([{"x": 1, "y": 2}, {"x": 3, "y": 4}])
+    assert [e().return_value for e in tasks] == [3, 7]
+    assert len({e.id_ for e in tasks}) == 2
+    assert tasks[0].task_execution_env is tasks[1].task_execution_env
+
+
+def test_map() -> None:
+    @task_factory_cls
+    @attrs.mutable
+    class DummyTaskCls:
+        def __call__(self, x: int, y: int) -> int:
+            return x * y
+
+    tasks = DummyTaskCls().map(x=[1, 2, 3], y=[4, 5, 6])
+    assert [e().return_value for e in tasks] == [4, 10, 18]
+    assert DummyTaskCls().make_tasks([{"x": 2, "y": 2}])[0]().return_value == 4
+    with pytest.raises(ValueError):
+        DummyTaskCls().map(x=[1, 2, 3], y=[4, 5])
+
+
+def test_task_shared_defaults() -> None:
+    @task_factory
+    def dummy_task_fn():
+        return "result"
+
+    task_a, task_b = dummy_task_fn.make_tasks([{}, {}])
+    assert task_a.outcome is task_b.outcome
+    assert task_a.task_execution_env is task_b.task_execution_env
+    assert not hasattr(task_a, "__dict__")
+
+    called = []
+
+    def _callback(task):
+        called.append(task)
+
+    callbacks = task_a._mazepa_callbacks  # pylint: disable=protected-access
+    callbacks.append(_callback)
+    task_a()
+    task_b()
+    assert called == [task_a]
+    assert task_a.outcome.return_value == "result"
+    assert task_b.outcome.return_value == "result"
+    assert task_a.outcome is not task_b.outcome
+
+
+def test_is_preferred_outcome():
+    failed = TaskOutcome[Any](status=TaskStatus.FAILED, attempt=1)
+    succeeded = TaskOutcome[Any](status=TaskStatus.SUCCEEDED)
+    assert is_preferred_outcome(succeeded, failed)
+    assert not is_preferred_outcome(failed, succeeded)
+    assert is_preferred_outcome(failed, TaskOutcome[Any](status=TaskStatus.TIMED_OUT))
+    assert not is_preferred_outcome(succeeded, TaskOutcome[Any](status=TaskStatus.SUCCEEDED))
@@ -0,0 +1,72 @@
+from __future__ import annotations
+from typing import Any
+from mazepa import TaskBundle, TaskExecutionEnv, TaskOutcome, TaskStatus
+from mazepa.task_bundles import BundleSizer, make_task_bundles
+from .maker_utils import ExternalTask, make_test_task
+
+
+def _raise():
+    raise ValueError()
+
+
+def test_make_task_bundles():
+    env_a = TaskExecutionEnv(tags=["a"])
+    tasks = [
+        make_test_task(fn=lambda: None, id_=f"a_{i}", task_execution_env=env_a) for i in range(5)
+    ] + [make_test_task(fn=lambda: None, id_="b", task_execution_env=TaskExecutionEnv())]
+    result = make_task_bundles(tasks, max_bundle_len=2)
+    assert [[e.id_ for e in r.tasks] for r in result[:2]] == [["a_0", "a_1"], ["a_2", "a_3"]]
+    assert [e.id_ for e in result[2:]] == ["a_4", "b"]
+    assert result[0].task_execution_env == env_a
+
+
+def test_bundle_call():
+    callback_tasks = []
+
+    def _callback(task):
+        callback_tasks.append(task)
+
+    bundle = TaskBundle(
+        tasks=[make_test_task(fn=lambda: 1, id_="a"), make_test_task(fn=_raise, id_="b")],
+        mazepa_callbacks=[_callback],
+    )
+    outcome = bundle()
+    assert outcome.status == TaskStatus.SUCCEEDED
+    assert bundle.tasks[0].outcome.return_value == 1
+    assert bundle.tasks[1].outcome.status == TaskStatus.FAILED
+    assert outcome.return_value["b"] == bundle.tasks[1].outcome
+    assert callback_tasks == [bundle]
+
+
+def test_bundle_external_task():
+    bundle = TaskBundle(tasks=[ExternalTask(fn=lambda: 1, id_="a")])
+    outcome = bundle()
+    assert outcome.status == TaskStatus.SUCCEEDED
+    assert outcome.return_value["a"].return_value == 1
+    assert bundle.tasks[0].outcome == outcome.return_value["a"]
+
+
+def test_bundle_failure():
+    bundle = TaskBundle(tasks=[make_test_task(fn=lambda: 1, id_="a")])
+    bundle.set_outcome(TaskOutcome[Any](status=TaskStatus.TIMED_OUT))
+    assert bundle.tasks[0].outcome.status == TaskStatus.TIMED_OUT
+
+
+def test_bundle_split():
+    bundle = TaskBundle(
+        tasks=[make_test_task(fn=lambda: None, id_=str(i)) for i in range(3)],
+        mazepa_callbacks=[print],
+    )
+    first, second = bundle.split()
+    assert len(first.tasks) == 1 and len(second.tasks) == 2
+    assert first.id_ != second.id_
+    assert second._mazepa_callbacks == [print]  # pylint: disable=protected-access
+
+
+def test_bundle_sizer():
+    sizer = BundleSizer(max_bundle_len=100, target_bundle_secs=10.0, smoothing=0.5)
+    assert sizer.get_bundle_len() == 100
+    sizer.observe([TaskOutcome[Any](status=TaskStatus.SUCCEEDED, execution_secs=1.0)])
+    assert sizer.get_bundle_len() == 10
+    sizer.observe([TaskOutcome[Any](status=TaskStatus.SUCCEEDED, execution_secs=39.0)])
+    assert sizer.get_bundle_len() == 1
@@ -0,0 +1,105 @@
+from __future__ import annotations
+import multiprocessing
+import os
+import threading
+import time
+import pytest
+from mazepa import IsolatedTaskRunner, TaskStatus, TaskTimeoutError, TaskMemoryLimitError
+from .maker_utils import ExternalTask, make_test_task
+
+
+def _allocate(num_bytes: int) -> int:
+    data = bytearray(num_bytes)
+    time.sleep(1.0)
+    return len(data)
+
+
+def _raise():
+    raise ValueError()
+
+
+def test_success():
+    runner = IsolatedTaskRunner()
+    task = make_test_task(fn=os.getpid, id_="a")
+    outcome = runner(task)
+    runner.shutdown()
+    assert outcome.status == TaskStatus.SUCCEEDED
+    assert outcome.return_value != os.getpid()
+    assert task.outcome == outcome
+
+
+def test_external_task():
+    callbacks = []
+
+    def _callback(task):
+        callbacks.append((task.id_, os.getpid()))
+
+    runner = IsolatedTaskRunner()
+    task = ExternalTask(fn=os.getpid, id_="a", mazepa_callbacks=[_callback])
+    outcome = runner(task)
+    runner.shutdown()
+    assert outcome.status == TaskStatus.SUCCEEDED
+    assert outcome.return_value != os.getpid()
+    assert task.outcome == outcome
+    assert callbacks == [("a", os.getpid())]
+
+
+def test_exception():
+    runner = IsolatedTaskRunner()
+    outcome = runner(make_test_task(fn=_raise, id_="a"))
+    runner.shutdown()
+    assert outcome.status == TaskStatus.FAILED
+    assert isinstance(outcome.exception, ValueError)
+
+
+@pytest.mark.parametrize("max_tasks_per_child, expected_pid_num", [[None, 1], [1, 3]])
+def test_child_reuse(max_tasks_per_child, expected_pid_num):
+    runner = IsolatedTaskRunner(max_tasks_per_child=max_tasks_per_child)
+    pids = {runner(make_test_task(fn=os.getpid, id_=str(i))).return_value for i in range(3)}
+    runner.shutdown()
+    assert len(pids) == expected_pid_num
+
+
+def test_start_with_threads():
+    stop = threading.Event()
+    thread = threading.Thread(target=stop.wait)
+    thread.start()
+    runner = IsolatedTaskRunner()
+    try:
+        outcome = runner(make_test_task(fn=os.getpid, id_="a"))
+        process = runner._process  # pylint: disable=protected-access
+    finally:
+        runner.shutdown()
+        stop.set()
+        thread.join()
+    assert isinstance(process, multiprocessing.context.ForkServerProcess)
+    assert outcome.return_value == process.pid
+
+
+def test_timeout():
+    runner = IsolatedTaskRunner(timeout_sec=0.2, poll_interval_sec=0.01)
+    outcome = runner(make_test_task(fn=lambda: time.sleep(10), id_="a"))
+    assert outcome.status == TaskStatus.TIMED_OUT
+    assert isinstance(outcome.exception, TaskTimeoutError)
+    outcome = runner(make_test_task(fn=lambda: "ok", id_="b"))
+    runner.shutdown()
+    assert outcome.return_value == "ok"
+
+
+def test_cpu_limit():
+    def spin():
+        while True:
+            pass
+
+    runner = IsolatedTaskRunner(max_cpu_sec=0.5, poll_interval_sec=0.01)
+    outcome = runner(make_test_task(fn=spin, id_="a"))
+    runner.shutdown()
+    assert outcome.status == TaskStatus.TIMED_OUT
+
+
+def test_memory_limit():
+    runner = IsolatedTaskRunner(max_rss_bytes=200 * 2**20, poll_interval_sec=0.01)
+    outcome = runner(make_test_task(fn=lambda: _allocate(400 * 2**20), id_="a"))
+    runner.shutdown()
+    assert outcome.status == TaskStatus.OUT_OF_MEMORY
+    assert isinstance(outcome.exception, TaskMemoryLimitError)
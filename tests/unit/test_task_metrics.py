@@ -0,0 +1,61 @@
+from __future__ import annotations
+
+from typing import Any
+
+from mazepa import TaskOutcome, TaskStatus, execute, flow_type, task_factory
+from mazepa.task_metrics import MetricsSummary
+from mazepa.tasks import _Task
+
+
+@task_factory
+def busy_task(size: int) -> int:
+    data = bytearray(size)
+    return sum(data[:1000])
+
+
+@flow_type
+def dummy_flow():
+    yield busy_task.map(size=[2**20, 2**20])
+
+
+def test_task_metrics() -> None:
+    task = busy_task.make_task(size=64 * 2**20)
+    assert task().metrics is None
+
+    task = busy_task.make_task(size=64 * 2**20)
+    assert isinstance(task, _Task)
+    task.metrics = {"task_bytes": 100}
+    metrics = task().metrics
+    assert metrics is not None
+    assert metrics["task_bytes"] == 100
+    assert metrics["cpu_secs"] >= 0
+    assert metrics["peak_rss_delta_bytes"] >= 0
+    assert metrics["factory"].endswith("busy_task")
+
+
+def test_metrics_summary() -> None:
+    summary = MetricsSummary()
+    for secs in [1.0, 3.0]:
+        summary.add(
+            TaskOutcome[Any](
+                status=TaskStatus.SUCCEEDED,
+                execution_secs=secs,
+                metrics={"factory": "a", "cpu_secs": secs, "peak_rss_delta_bytes": secs * 2**20},
+            )
+        )
+    summary.add(TaskOutcome[Any](status=TaskStatus.SUCCEEDED))
+    assert summary.get_value("a", "execution_secs", "mean") == 2.0
+    assert summary.get_value("a", "peak_rss_delta_bytes", "max") == 3 * 2**20
+    assert summary.get_value("a", "read_bytes", "sum") is None
+    lines = summary.format_table().split("\n")
+    assert len(lines) == 2
+    assert lines[1].split()[:5] == ["a", "2", "2.000", "2.000", "3.000"]
+
+
+def test_execute_collect_metrics(mocker) -> None:
+    format_table = mocker.spy(MetricsSummary, "format_table")
+    add = mocker.spy(MetricsSummary, "add")
+    execute(dummy_flow(), collect_metrics=True)
+    format_table.assert_called_once()
+    assert add.call_count == 2
+    assert all(e.args[1].metrics is not None for e in add.call_args_list)
@@ -0,0 +1,65 @@
+from __future__ import annotations
+
+import json
+
+from mazepa import Dependency, execute, flow_type, task_factory, tracing
+from mazepa.remote_execution_queues import sqs_queue
+from .maker_utils import ExternalTask
+
+
+@task_factory
+def dummy_task(x: int) -> int:
+    return x
+
+
+@flow_type
+def dummy_flow():
+    tasks = dummy_task.map(x=range(3))
+    yield tasks
+    yield Dependency()
+    yield dummy_task.make_task(x=3)
+
+
+def test_execute_trace(tmp_path) -> None:
+    path = str(tmp_path / "trace.json")
+    execute(dummy_flow(), trace_path=path)
+    assert tracing.get_active_tracer() is None
+
+    with open(path, encoding="utf-8") as f:
+        events = json.load(f)["traceEvents"]
+    executor_spans = {e["name"] for e in events if e["ph"] == "X" and e["pid"] == 0}
+    assert {"get_task_batch", "push_tasks", "update_with_task_outcomes"} <= executor_spans
+    executions = [e for e in events if e["ph"] == "X" and e["pid"] > 1]
+    assert len(executions) == 4
+    assert all(e["name"].endswith("dummy_task") for e in executions)
+    lifecycle_spans = {e["name"] for e in events if e["ph"] == "b"}
+    assert lifecycle_spans == {"submission", "queue_wait", "execution", "state_update"}
+
+
+def test_untraced_outcome() -> None:
+    task = dummy_task.make_task(x=1)
+    assert task().trace_stamps is None
+
+
+def test_outcome_sent_stamp(mocker) -> None:
+    send_msg = mocker.patch("mazepa.remote_execution_queues.sqs_utils.send_msg")
+    task = dummy_task.make_task(x=1)
+    tracing.Tracer().stamp(task, "generated")
+    task()
+    sqs_queue._send_outcome_report(  # pylint: disable=protected-access
+        task, queue_name="outcomes", region_name="us-east-1"
+    )
+    send_msg.assert_called_once()
+    assert task.outcome.trace_stamps is not None
+    assert {"exec_start", "exec_end", "outcome_sent", "worker"} <= set(task.outcome.trace_stamps)
+
+
+def test_external_task_stamps():
+    tracer = tracing.Tracer()
+    task = ExternalTask(fn=lambda: 1, id_="a")
+    tracer.stamp(task, "generated", flow_id="f")
+    tracer.stamp(task, "pushed")
+    tracer.record(task, task(), state_updated=1.0)
+    assert tracer.task_records[0]["flow_id"] == "f"
+    assert {"generated", "pushed", "state_updated"} <= set(tracer.task_records[0])
+    assert not hasattr(task, "trace_stamps")
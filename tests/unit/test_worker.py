@@ -0,0 +1,152 @@
+# pylint: disable=redefined-outer-name
+from __future__ import annotations
+import os
+import time
+from typing import Any
+import pytest
+from mazepa import CompletionMarkers, TaskBundle, TaskOutcome, TaskStatus
+from mazepa.worker import IdleBackoff, TaskPrefetcher, run_worker
+from .maker_utils import make_test_task
+
+
+@pytest.fixture
+def task_queue(mocker):
+    tasks = [make_test_task(fn=lambda: None, id_=f"task_{i}") for i in range(5)]
+
+    def pull_tasks(max_num: int = 1):
+        result = tasks[:max_num]
+        del tasks[:max_num]
+        return result
+
+    queue = mocker.MagicMock()
+    queue.pull_tasks = mocker.MagicMock(side_effect=pull_tasks)
+    return queue
+
+
+def test_prefetcher_order(task_queue):
+    prefetcher = TaskPrefetcher(
+        task_queue, depth=2, max_pull_num=2, backoff=IdleBackoff(min_sec=0.01, max_sec=0.01)
+    )
+    prefetcher.start()
+    result = [prefetcher.get(timeout=1.0) for _ in range(5)]
+    assert [e.id_ for e in result] == [f"task_{i}" for i in range(5)]
+    assert prefetcher.get(timeout=0.05) is None
+    prefetcher.stop()
+    task_queue.release_tasks.assert_not_called()
+
+
+def test_prefetcher_depth(task_queue):
+    prefetcher = TaskPrefetcher(
+        task_queue, depth=2, max_pull_num=10, backoff=IdleBackoff(min_sec=0.01, max_sec=0.01)
+    )
+    prefetcher.start()
+    time.sleep(0.1)
+    prefetcher.stop()
+    released = task_queue.release_tasks.call_args[0][0]
+    assert [e.id_ for e in released] == ["task_0", "task_1"]
+
+
+def test_prefetcher_max_age(task_queue):
+    prefetcher = TaskPrefetcher(
+        task_queue, depth=1, backoff=IdleBackoff(min_sec=0.01, max_sec=0.01), max_age_sec=0.05
+    )
+    prefetcher.start()
+    time.sleep(0.1)
+    task = prefetcher.get(timeout=1.0)
+    prefetcher.stop()
+    assert task is not None
+    assert task.id_ != "task_0"
+    released = task_queue.release_tasks.call_args_list[0][0][0]
+    assert [e.id_ for e in released] == ["task_0"]
+
+
+def test_prefetcher_exc(mocker):
+    queue = mocker.MagicMock()
+    queue.pull_tasks = mocker.MagicMock(side_effect=RuntimeError)
+    prefetcher = TaskPrefetcher(queue, depth=1)
+    prefetcher.start()
+    with pytest.raises(RuntimeError):
+        prefetcher.get(timeout=1.0)
+    prefetcher.stop()
+
+
+def test_idle_backoff():
+    backoff = IdleBackoff(min_sec=1.0, max_sec=4.0)
+    sleeps = [backoff.next_sleep_sec() for _ in range(5)]
+    assert 0.5 <= sleeps[0] <= 1.0
+    assert 1.0 <= sleeps[1] <= 2.0
+    assert all(2.0 <= e <= 4.0 for e in sleeps[3:])
+    backoff.reset()
+    assert backoff.next_sleep_sec() <= 1.0
+
+
+@pytest.mark.parametrize("prefetch_depth", [0, 2])
+def test_run_worker_idle_exit(task_queue, prefetch_depth):
+    run_worker(
+        task_queue,
+        sleep_sec=0.01,
+        min_sleep_sec=0.01,
+        max_pull_num=2,
+        prefetch_depth=prefetch_depth,
+        prefetch_max_age_sec=10.0,
+        idle_exit_sec=0.1,
+    )
+    assert task_queue.pull_tasks() == []
+
+
+def test_run_worker_completion_markers(tmp_path, mocker):
+    calls = []
+    tasks = [
+        make_test_task(fn=lambda: calls.append(1) or len(calls), id_=f"task_{i % 2}")
+        for i in range(3)
+    ]
+    queue = mocker.MagicMock()
+    queue.pull_tasks = mocker.MagicMock(
+        side_effect=lambda max_num=1: [tasks.pop(0)] if tasks else []
+    )
+    markers = CompletionMarkers(str(tmp_path / "markers"))
+    pulled = list(tasks)
+    run_worker(
+        queue, sleep_sec=0.01, min_sleep_sec=0.01, idle_exit_sec=0.05, completion_markers=markers
+    )
+    assert len(calls) == 2
+    assert pulled[2].outcome.return_value == 1
+    marker = markers.get("task_0")
+    assert marker is not None and marker.return_value == 1
+    assert markers.get("task_2") is None
+
+
+def test_run_worker_bundle_completion_markers(tmp_path, mocker):
+    calls = []
+
+    def _make_task(id_):
+        return make_test_task(fn=lambda: calls.append(id_) or id_, id_=id_)
+
+    bundles = [
+        TaskBundle(tasks=[_make_task("task_0"), _make_task("task_1")]),
+        TaskBundle(tasks=[_make_task("task_0"), _make_task("task_2")]),
+        TaskBundle(tasks=[_make_task("task_1"), _make_task("task_2")]),
+    ]
+    pulled = list(bundles)
+    queue = mocker.MagicMock()
+    queue.pull_tasks = mocker.MagicMock(
+        side_effect=lambda max_num=1: [bundles.pop(0)] if bundles else []
+    )
+    markers = CompletionMarkers(str(tmp_path / "markers"))
+    run_worker(
+        queue, sleep_sec=0.01, min_sleep_sec=0.01, idle_exit_sec=0.05, completion_markers=markers
+    )
+    assert calls == ["task_0", "task_1", "task_2"]
+    for bundle in pulled:
+        assert bundle.outcome.status == TaskStatus.SUCCEEDED
+        assert [e.outcome.return_value for e in bundle.tasks] == [e.id_ for e in bundle.tasks]
+
+
+def test_completion_markers_path_ids(tmp_path):
+    markers = CompletionMarkers(str(tmp_path / "markers"))
+    outcome = TaskOutcome[Any](status=TaskStatus.SUCCEEDED, return_value=1)
+    for task_id in ["a/b", "../c", "x" * 1000]:
+        assert markers.get(task_id) is None
+        markers.set(task_id, outcome)
+        assert markers.get(task_id) == outcome
+    assert len(os.listdir(tmp_path / "markers")) == 3